@@ -1,21 +1,94 @@
 from __future__ import annotations
 
+import asyncio
+import copy
 import logging
+import time
+from collections import OrderedDict, deque
+from itertools import count
 from typing import Optional
 from urllib.parse import parse_qs
 
+import jwt
 from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
 
-from .views_common import _actor_from_token, _safe_user_from_db
+from .events import parse_topic
+from .order_patches import apply_patch, from_channel, load_order_snapshot
+from .views_common import _actor_from_claims, _safe_user_from_db
 
 logger = logging.getLogger(__name__)
 
+MAX_TOPICS_PER_CONNECTION = 64
+_SEEN_EVENT_IDS = 256
+SLOW_CONSUMER_CLOSE_CODE = 4429
 
-async def _resolve_actor(token: str):
+# Events that carry the full current state of one entity. Once a client is
+# behind (outbox at WS_OUTBOX_HIGH_WATER), a queued one is replaced when a
+# newer event for the same entity arrives; until then every event is sent.
+SUPERSEDABLE_EVENTS = {
+    "order.status_changed",
+    "order.auto_flow",
+    "order.item_state_changed",
+    "inventory.updated",
+    "inventory.stock_adjusted",
+}
+
+# Live consumers in this process, for queue-depth metrics
+_connections: dict[str, "EventStreamConsumer"] = {}
+_queue_keys = count()
+
+
+# user id -> (expires at, role, profile) from recent handshakes
+_actor_cache: "OrderedDict[str, tuple[float, str, Optional[dict]]]" = OrderedDict()
+MAX_CACHED_ACTORS = 5000
+
+
+def _token_claims(token: Optional[str]) -> Optional[dict]:
     if not token:
         return None
-    return await sync_to_async(_actor_from_token, thread_sensitive=True)(token)
+    try:
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except Exception:
+        return None
+
+
+async def _resolve_actor(token: str):
+    """Handshake actor taken from the signed JWT claims; no database access."""
+    claims = _token_claims(token)
+    if not claims or not claims.get("sub"):
+        return None
+    return {
+        "id": str(claims["sub"]),
+        "email": claims.get("email"),
+        "role": (claims.get("role") or "staff").lower(),
+        "claims": claims,
+    }
+
+
+def _load_actor(claims: dict):
+    """Full actor and its public profile; runs in a worker thread."""
+    actor = _actor_from_claims(claims)
+    profile = _safe_user_from_db(actor) if actor is not None and hasattr(actor, "id") else None
+    return actor, profile
+
+
+def _cached_actor(user_id: Optional[str]):
+    entry = _actor_cache.get(user_id) if user_id else None
+    if entry and entry[0] > time.monotonic():
+        return entry
+    return None
+
+
+def _remember_actor(user_id: str, role: str, profile: Optional[dict]):
+    ttl = float(getattr(settings, "WS_ACTOR_CACHE_SECONDS", 60))
+    if ttl <= 0:
+        return
+    _actor_cache.pop(user_id, None)
+    _actor_cache[user_id] = (time.monotonic() + ttl, role, profile)
+    while len(_actor_cache) > MAX_CACHED_ACTORS:
+        _actor_cache.popitem(last=False)
 
 
 def _role_group(role: str) -> str:
@@ -28,6 +101,62 @@ def _user_group(user_id: Optional[str]) -> Optional[str]:
     return f"user_{user_id}"
 
 
+def _outbox_settings() -> dict:
+    from django.conf import settings
+
+    return {
+        "interval": float(getattr(settings, "WS_BATCH_INTERVAL_MS", 50)) / 1000.0,
+        "batch": max(1, int(getattr(settings, "WS_BATCH_MAX_EVENTS", 100))),
+        "high_water": int(getattr(settings, "WS_OUTBOX_HIGH_WATER", 200)),
+        "limit": int(getattr(settings, "WS_OUTBOX_LIMIT", 1000)),
+        "slow_seconds": float(getattr(settings, "WS_SLOW_CONSUMER_SECONDS", 15)),
+    }
+
+
+def _entity_key(event_type: Optional[str], payload) -> Optional[tuple]:
+    if event_type not in SUPERSEDABLE_EVENTS or not isinstance(payload, dict):
+        return None
+    if event_type.startswith("order."):
+        order = payload.get("order") if isinstance(payload.get("order"), dict) else {}
+        order_id = payload.get("orderId") or order.get("id")
+        if not order_id:
+            return None
+        if event_type == "order.item_state_changed":
+            item_id = (payload.get("item") or {}).get("id")
+            return (event_type, str(order_id), str(item_id)) if item_id else None
+        return (event_type, str(order_id))
+    item_id = (payload.get("item") or {}).get("id")
+    return (event_type, str(item_id)) if item_id else None
+
+
+def _merge_order_patch(old: dict, new: dict) -> Optional[dict]:
+    """Fold two consecutive order patches into one, or None if they do not chain."""
+    if "snapshot" in new:
+        return new
+    if old.get("version") != new.get("baseVersion"):
+        return None
+    if "snapshot" in old:
+        snapshot = apply_patch(copy.deepcopy(old["snapshot"]), new.get("ops") or [])
+        return {"id": new.get("id"), "version": new.get("version"), "snapshot": snapshot}
+    return {
+        "id": new.get("id"),
+        "version": new.get("version"),
+        "baseVersion": old.get("baseVersion"),
+        "ops": list(old.get("ops") or []) + list(new.get("ops") or []),
+    }
+
+
+def connection_metrics() -> dict:
+    """Outbound queue stats for every websocket served by this process."""
+    rows = [consumer.queue_stats() for consumer in list(_connections.values())]
+    return {
+        "connections": len(rows),
+        "queued": sum(r["depth"] for r in rows),
+        "lagging": sum(1 for r in rows if r["laggingSeconds"]),
+        "items": sorted(rows, key=lambda r: r["depth"], reverse=True),
+    }
+
+
 def _sanitize_group(name: str) -> str:
     allowed = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_."
     safe = "".join(ch if ch in allowed else "_" for ch in name)
@@ -39,6 +168,15 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
 
     actor = None
     groups_joined: set[str]
+    # Firehose groups (broadcast + role) are left once a socket subscribes to
+    # topics and rejoined when its last topic is dropped.
+    firehose_groups: set[str]
+    topic_groups: dict[str, str]
+    # Outbound events are queued and flushed once per tick so a slow client
+    # never stalls the channel-layer inbox; see _flush_loop.
+    _outbox: Optional[OrderedDict] = None
+    _flusher: Optional[asyncio.Task] = None
+    _profile_task: Optional[asyncio.Task] = None
 
     async def connect(self):
         token = self._extract_token()
@@ -50,20 +188,17 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
         self.actor = actor
         self.groups_joined = {"broadcast"}
 
-        user_id = None
-        role = "staff"
-        try:
-            if hasattr(actor, "id"):
-                user_id = str(actor.id)
-                role = (getattr(actor, "role", "staff") or "staff").lower()
-            else:
-                user_id = str(actor.get("id")) if actor.get("id") is not None else None
-                role = (actor.get("role") or "staff").lower()
-        except Exception:  # pragma: no cover - defensive only
-            logger.exception("Failed to derive websocket groups for actor")
+        user_id = str(actor.get("id")) if actor.get("id") is not None else None
+        # A recent handshake for the same user already knows its current role and profile
+        cached = _cached_actor(user_id)
+        role = cached[1] if cached else (actor.get("role") or "staff").lower()
 
         role_group = _sanitize_group(_role_group(role))
         self.groups_joined.add(role_group)
+        self.firehose_groups = {"broadcast", role_group}
+        self.topic_groups = {}
+        self.order_patches = self._query_flag("patches")
+        self._seen_ids = deque(maxlen=_SEEN_EVENT_IDS)
 
         user_group = _user_group(user_id)
         if user_group:
@@ -73,24 +208,60 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_add(group, self.channel_name)
 
         await self.accept()
-        safe_actor = None
-        try:
-            if hasattr(actor, "id"):
-                safe_actor = _safe_user_from_db(actor)
-        except Exception:
-            safe_actor = None
+        self._start_outbox()
         payload = {
             "userId": user_id,
             "role": role,
-            "user": safe_actor,
+            "user": cached[2] if cached else None,
         }
         await self.send_json({
             "type": "connection.ack",
             "event": "connection.established",
             "payload": payload,
         })
+        if not cached and actor.get("claims"):
+            self._profile_task = asyncio.ensure_future(self._load_profile(actor["claims"], role))
+
+    async def _load_profile(self, claims: dict, role: str):
+        """Confirm the user still exists and send its profile after the handshake."""
+        try:
+            actor, profile = await sync_to_async(_load_actor, thread_sensitive=False)(claims)
+        except Exception:
+            logger.exception("Failed to load websocket actor profile")
+            return
+        if actor is None:
+            await self.close(code=4401)
+            return
+        if isinstance(actor, dict):
+            user_id, current = actor.get("id"), actor.get("role")
+        else:
+            user_id, current = actor.id, getattr(actor, "role", None)
+        current = (current or "staff").lower()
+        if user_id is not None:
+            _remember_actor(str(user_id), current, profile)
+        self.actor = actor
+        if current != role:
+            await self._switch_role_group(role, current)
+        await self.send_json({
+            "type": "connection.ack",
+            "event": "connection.profile",
+            "payload": {"userId": str(user_id) if user_id is not None else None, "role": current, "user": profile},
+        })
+
+    async def _switch_role_group(self, old_role: str, new_role: str):
+        old_group = _sanitize_group(_role_group(old_role))
+        new_group = _sanitize_group(_role_group(new_role))
+        self.firehose_groups = (self.firehose_groups - {old_group}) | {new_group}
+        if old_group in self.groups_joined:
+            await self._leave_groups({old_group})
+            await self.channel_layer.group_add(new_group, self.channel_name)
+            self.groups_joined.add(new_group)
 
     async def disconnect(self, code):
+        self._stop_outbox()
+        task = self._profile_task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            task.cancel()
         if getattr(self, "groups_joined", None):
             for group in self.groups_joined:
                 try:
@@ -99,6 +270,7 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
                     continue
         self.actor = None
         self.groups_joined = set()
+        self.topic_groups = {}
 
     async def receive_json(self, content, **kwargs):
         action = (content or {}).get("action")
@@ -109,10 +281,34 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
                 "payload": {"message": "pong"},
             })
         elif action == "subscribe":
+            accepted, rejected = await self._subscribe(_topic_list(content))
             await self.send_json({
                 "type": "connection.ack",
                 "event": "subscribe",
-                "payload": {"status": "ok"},
+                "payload": {
+                    "status": "ok",
+                    "topics": sorted(self.topic_groups),
+                    "accepted": accepted,
+                    "rejected": rejected,
+                },
+            })
+        elif action == "options":
+            if "orderPatches" in (content or {}):
+                self.order_patches = bool(content.get("orderPatches"))
+            await self.send_json({
+                "type": "connection.ack",
+                "event": "options",
+                "payload": {"status": "ok", "orderPatches": self.order_patches},
+            })
+        elif action == "snapshot":
+            await self._send_order_snapshot((content or {}).get("orderId"))
+        elif action == "unsubscribe":
+            topics = _topic_list(content)
+            await self._unsubscribe(topics or list(self.topic_groups))
+            await self.send_json({
+                "type": "connection.ack",
+                "event": "unsubscribe",
+                "payload": {"status": "ok", "topics": sorted(self.topic_groups)},
             })
         else:
             await self.send_json({
@@ -121,12 +317,203 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
                 "payload": {"message": "Unsupported action"},
             })
 
+    async def _subscribe(self, topics):
+        accepted, rejected = [], []
+        for spec in topics:
+            group = parse_topic(spec)
+            if not group or (spec not in self.topic_groups and len(self.topic_groups) >= MAX_TOPICS_PER_CONNECTION):
+                rejected.append(spec)
+                continue
+            accepted.append(spec)
+            if spec in self.topic_groups:
+                continue
+            self.topic_groups[spec] = group
+            if group not in self.groups_joined:
+                await self.channel_layer.group_add(group, self.channel_name)
+                self.groups_joined.add(group)
+        if self.topic_groups:
+            await self._leave_groups(self.firehose_groups)
+        return accepted, rejected
+
+    async def _unsubscribe(self, topics):
+        for spec in topics:
+            group = self.topic_groups.pop(spec, None)
+            if group and group not in self.topic_groups.values():
+                await self._leave_groups({group})
+        if not self.topic_groups:
+            for group in self.firehose_groups - self.groups_joined:
+                await self.channel_layer.group_add(group, self.channel_name)
+                self.groups_joined.add(group)
+
+    async def _leave_groups(self, groups):
+        for group in groups & self.groups_joined:
+            try:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            except Exception:
+                continue
+            self.groups_joined.discard(group)
+
+    def _is_duplicate(self, event) -> bool:
+        event_id = event.get("eventId")
+        if not event_id:
+            return False
+        if event_id in self._seen_ids:
+            return True
+        self._seen_ids.append(event_id)
+        return False
+
+    async def _send_order_snapshot(self, order_id):
+        snapshot = None
+        if order_id:
+            try:
+                snapshot = await sync_to_async(load_order_snapshot, thread_sensitive=False)(str(order_id), self.actor)
+            except Exception:
+                logger.exception("Failed to load order snapshot")
+        if not snapshot:
+            await self.send_json({
+                "type": "connection.error",
+                "event": "snapshot",
+                "payload": {"orderId": order_id, "message": "Order not found"},
+            })
+            return
+        await self.send_json({"type": "event", "event": "order.snapshot", "payload": snapshot})
+
+    def _outgoing_payload(self, event):
+        payload = event.get("payload")
+        patch = event.get("orderPatch")
+        if not (self.order_patches and patch and isinstance(payload, dict)):
+            return payload
+        compact = {k: v for k, v in payload.items() if k != "order"}
+        compact["orderPatch"] = patch
+        return compact
+
     async def event_message(self, event):
-        await self.send_json({
+        if self._is_duplicate(event):
+            return
+        patch = event.get("orderPatch")
+        if self.order_patches and patch:
+            payload = event.get("payload")
+            event = {**event, "orderPatch": from_channel(patch, payload.get("order") if isinstance(payload, dict) else None)}
+        if self._outbox is None:
+            await self.send_json(self._frame(event))
+            return
+        self._enqueue(event)
+        if len(self._outbox) > self._limits["limit"]:
+            await self._drop_slow_consumer("outbox limit exceeded")
+            return
+        self._wake.set()
+
+    def _frame(self, event) -> dict:
+        return {
             "type": "event",
             "event": event.get("event"),
-            "payload": event.get("payload"),
-        })
+            "payload": self._outgoing_payload(event),
+        }
+
+    def _start_outbox(self):
+        self._limits = _outbox_settings()
+        self._stats = {"sent": 0, "batches": 0, "coalesced": 0, "maxDepth": 0}
+        self._lagging_since = None
+        if self._limits["interval"] <= 0:
+            return  # batching disabled: send each event as it arrives
+        self._outbox = OrderedDict()
+        self._wake = asyncio.Event()
+        self._flusher = asyncio.ensure_future(self._flush_loop())
+        _connections[self.channel_name] = self
+
+    def _stop_outbox(self):
+        _connections.pop(getattr(self, "channel_name", None), None)
+        if self._flusher is not None and self._flusher is not asyncio.current_task():
+            self._flusher.cancel()
+        self._flusher = None
+        self._outbox = None
+
+    def _enqueue(self, event):
+        # A client that keeps up sees every transition; collapse only when it is behind
+        behind = len(self._outbox) >= self._limits["high_water"]
+        key = _entity_key(event.get("event"), event.get("payload")) if behind else None
+        queued = self._outbox.get(key) if key else None
+        if queued is not None:
+            merged = self._supersede(queued, event)
+            if merged is not None:
+                # Drop the stale update; the newer one goes to the back of the queue
+                del self._outbox[key]
+                self._outbox[key] = merged
+                self._stats["coalesced"] += 1
+                return
+            key = None
+        self._outbox[key or ("seq", next(_queue_keys))] = event
+        self._stats["maxDepth"] = max(self._stats["maxDepth"], len(self._outbox))
+
+    def _supersede(self, old, new) -> Optional[dict]:
+        old_patch, new_patch = old.get("orderPatch"), new.get("orderPatch")
+        if not (self.order_patches and old_patch):
+            return new
+        if not new_patch:
+            return None
+        merged = _merge_order_patch(old_patch, new_patch)
+        return {**new, "orderPatch": merged} if merged else None
+
+    async def _flush_loop(self):
+        try:
+            while self._outbox is not None:
+                await self._wake.wait()
+                self._wake.clear()
+                # Let events arriving within one tick share a frame
+                await asyncio.sleep(self._limits["interval"])
+                await self._flush()
+                if self._outbox:
+                    self._wake.set()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Websocket outbox flush failed")
+
+    async def _flush(self):
+        outbox = self._outbox
+        if not outbox:
+            return
+        events = []
+        while outbox and len(events) < self._limits["batch"]:
+            events.append(outbox.popitem(last=False)[1])
+        frames = [self._frame(event) for event in events]
+        if len(frames) == 1:
+            await self.send_json(frames[0])
+        else:
+            await self.send_json({"type": "event.batch", "events": frames})
+        self._stats["sent"] += len(frames)
+        self._stats["batches"] += 1
+
+        # Whatever piled up while the send was in flight measures how far behind we are
+        if len(outbox) < self._limits["high_water"]:
+            self._lagging_since = None
+        elif self._lagging_since is None:
+            self._lagging_since = time.monotonic()
+        elif time.monotonic() - self._lagging_since > self._limits["slow_seconds"]:
+            await self._drop_slow_consumer("persistently behind")
+
+    async def _drop_slow_consumer(self, reason: str):
+        stats = self.queue_stats()
+        logger.warning(f"Closing slow websocket consumer {self.channel_name}: {reason} (depth={stats['depth']})")
+        self._stop_outbox()
+        await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+    def queue_stats(self) -> dict:
+        actor = self.actor
+        user_id = getattr(actor, "id", None) if not isinstance(actor, dict) else actor.get("id")
+        lagging = time.monotonic() - self._lagging_since if self._lagging_since else 0
+        return {
+            "channel": self.channel_name,
+            "userId": str(user_id) if user_id is not None else None,
+            "depth": len(self._outbox or ()),
+            "laggingSeconds": round(lagging, 1),
+            **self._stats,
+        }
+
+    def _query_flag(self, name: str) -> bool:
+        query = self.scope.get("query_string", b"") or b""
+        values = parse_qs(query.decode("utf-8")).get(name) if query else None
+        return bool(values) and values[0].lower() in {"1", "true", "yes", "on"}
 
     def _extract_token(self) -> Optional[str]:
         query = self.scope.get("query_string", b"") or b""
@@ -147,3 +534,14 @@ class EventStreamConsumer(AsyncJsonWebsocketConsumer):
         cookies = self.scope.get("cookies") or {}
         token = cookies.get("authToken")
         return token
+
+
+def _topic_list(content) -> list[str]:
+    topics = (content or {}).get("topics")
+    if topics is None:
+        topics = (content or {}).get("topic")
+    if isinstance(topics, str):
+        topics = [topics]
+    if not isinstance(topics, list):
+        return []
+    return [t for t in topics if isinstance(t, str) and t.strip()]
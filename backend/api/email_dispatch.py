@@ -0,0 +1,324 @@
+"""Asynchronous transactional email delivery.
+
+Messages are persisted to ``EmailOutbox`` and handed to a background sender so
+request handlers (login OTP, password reset, verification uploads) return
+without waiting on SMTP. ``settings.EMAIL_DISPATCH_MODE`` selects the sender:
+
+- ``celery``: ``api.tasks.deliver_email_batch`` on a Celery worker (default),
+  falling back to the thread pool when the broker cannot be reached
+- ``thread``: bounded in-process thread pool (no worker required)
+- ``sync``: deliver inline (tests and debugging)
+
+Each batch reuses one backend connection. Failed sends are retried with
+exponential backoff up to ``EMAIL_DISPATCH_MAX_ATTEMPTS``; the periodic
+``process_email_outbox`` task picks up anything an interrupted process left.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_RETRY_DELAY_SECONDS = 3600
+# Rows left in "sending" longer than this are assumed orphaned by a dead worker
+STALE_SENDING_SECONDS = 600
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_queued_ids: deque = deque()
+
+
+def _get_outbox_model():
+    from .models import EmailOutbox
+    return EmailOutbox
+
+
+def _mode() -> str:
+    mode = (getattr(settings, "EMAIL_DISPATCH_MODE", "celery") or "celery").lower()
+    return mode if mode in {"thread", "celery", "sync"} else "celery"
+
+
+def _max_attempts() -> int:
+    return max(1, int(getattr(settings, "EMAIL_DISPATCH_MAX_ATTEMPTS", 5) or 5))
+
+
+def retry_delay_seconds(attempts: int) -> int:
+    """Backoff before the next attempt: base, 2x base, 4x base, ... capped."""
+    base = max(1, int(getattr(settings, "EMAIL_DISPATCH_RETRY_BASE_SECONDS", 30) or 30))
+    return min(MAX_RETRY_DELAY_SECONDS, base * (2 ** max(0, attempts - 1)))
+
+
+def render_email_template(template_name: str, context: dict) -> str | None:
+    """Render an email template, returning None when rendering fails."""
+    try:
+        return render_to_string(template_name, context)
+    except Exception:
+        return None
+
+
+def queue_email(
+    subject: str,
+    message: str,
+    recipient_list: Iterable[str],
+    *,
+    html_message: str | None = None,
+    from_email: str | None = None,
+    kind: str = "",
+) -> str | None:
+    """Persist an email and schedule delivery once the current transaction commits.
+
+    Returns the outbox id (usable with ``get_email_status``) or None when
+    nothing was queued.
+    """
+    recipients = [r for r in (recipient_list or []) if r]
+    if not recipients:
+        return None
+    sender = from_email or settings.DEFAULT_FROM_EMAIL
+    try:
+        row = _get_outbox_model().objects.create(
+            kind=kind or "",
+            to_emails=recipients,
+            from_email=sender,
+            subject=(subject or "")[:255],
+            body=message or "",
+            html_body=html_message or "",
+        )
+    except Exception as exc:
+        # Outbox unavailable (e.g. table missing); still send off the request thread
+        logger.warning(f"Email outbox unavailable, sending without tracking: {exc}")
+        _get_executor().submit(_send_untracked, subject, message, sender, recipients, html_message)
+        return None
+    email_id = str(row.id)
+    transaction.on_commit(lambda: dispatch([email_id]))
+    return email_id
+
+
+def dispatch(email_ids: Iterable[str], countdown: int = 0) -> None:
+    """Hand queued outbox ids to the configured sender."""
+    ids = [str(i) for i in (email_ids or []) if i]
+    if not ids:
+        return
+    mode = _mode()
+    if mode == "sync":
+        # Retries are left for the periodic sweeper rather than blocking the caller
+        if countdown <= 0:
+            deliver_batch(ids)
+        return
+    if mode == "celery":
+        try:
+            from .tasks import deliver_email_batch, CELERY_AVAILABLE
+
+            if CELERY_AVAILABLE:
+                deliver_email_batch.apply_async(args=[ids], countdown=max(0, int(countdown)))
+                return
+        except Exception as exc:
+            logger.warning(f"Celery email dispatch failed, using thread pool: {exc}")
+    _submit_threaded(ids, countdown)
+
+
+def deliver_batch(email_ids: Iterable[str]) -> dict:
+    """Send the given outbox rows over a single backend connection.
+
+    Only rows this call manages to claim (pending -> sending) are sent, so
+    overlapping workers never deliver the same message twice.
+    Returns ``{"sent", "failed", "retry", "retryIn"}``.
+    """
+    EmailOutbox = _get_outbox_model()
+    result = {"sent": 0, "failed": 0, "retry": [], "retryIn": 0}
+    now = timezone.now()
+    claimed = []
+    for email_id in [str(i) for i in (email_ids or []) if i]:
+        won = EmailOutbox.objects.filter(id=email_id, status=EmailOutbox.STATUS_PENDING).update(
+            status=EmailOutbox.STATUS_SENDING, updated_at=now
+        )
+        if won:
+            claimed.append(email_id)
+    if not claimed:
+        return result
+    rows = list(EmailOutbox.objects.filter(id__in=claimed).order_by("created_at"))
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.error(f"Email connection failed for {len(rows)} message(s): {exc}")
+        for row in rows:
+            _record_failure(row, exc, result)
+        return result
+
+    try:
+        for row in rows:
+            msg = EmailMultiAlternatives(
+                subject=row.subject,
+                body=row.body,
+                from_email=row.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=list(row.to_emails or []),
+                connection=connection,
+            )
+            if row.html_body:
+                msg.attach_alternative(row.html_body, "text/html")
+            try:
+                connection.send_messages([msg])
+            except Exception as exc:
+                logger.error(f"Failed to send email {row.id} ({row.kind}): {exc}")
+                _record_failure(row, exc, result)
+                continue
+            row.attempts += 1
+            row.status = EmailOutbox.STATUS_SENT
+            row.sent_at = timezone.now()
+            row.next_attempt_at = None
+            row.last_error = ""
+            # Bodies may carry one-time codes; keep only the envelope once delivered
+            row.body = ""
+            row.html_body = ""
+            row.save(
+                update_fields=[
+                    "attempts", "status", "sent_at", "next_attempt_at",
+                    "last_error", "body", "html_body", "updated_at",
+                ]
+            )
+            result["sent"] += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return result
+
+
+def _record_failure(row, exc: Exception, result: dict) -> None:
+    EmailOutbox = _get_outbox_model()
+    row.attempts += 1
+    row.last_error = str(exc)[:2000]
+    if row.attempts >= _max_attempts():
+        row.status = EmailOutbox.STATUS_FAILED
+        row.next_attempt_at = None
+        result["failed"] += 1
+    else:
+        delay = retry_delay_seconds(row.attempts)
+        row.status = EmailOutbox.STATUS_PENDING
+        row.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        result["retry"].append(str(row.id))
+        result["retryIn"] = max(result["retryIn"], delay)
+    row.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "updated_at"])
+
+
+def process_pending(limit: int = 100) -> int:
+    """Deliver due outbox rows; used by the periodic sweeper. Returns sent count."""
+    EmailOutbox = _get_outbox_model()
+    now = timezone.now()
+    EmailOutbox.objects.filter(
+        status=EmailOutbox.STATUS_SENDING,
+        updated_at__lt=now - timedelta(seconds=STALE_SENDING_SECONDS),
+    ).update(status=EmailOutbox.STATUS_PENDING, updated_at=now)
+    due = list(
+        EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING)
+        .exclude(next_attempt_at__gt=now)
+        .order_by("created_at")
+        .values_list("id", flat=True)[: max(1, int(limit or 100))]
+    )
+    sent = 0
+    for start in range(0, len(due), BATCH_SIZE):
+        sent += deliver_batch([str(i) for i in due[start:start + BATCH_SIZE]])["sent"]
+    return sent
+
+
+def get_email_status(email_id: str) -> dict | None:
+    """Return delivery status for an outbox entry, or None if unknown."""
+    try:
+        row = _get_outbox_model().objects.filter(id=email_id).first()
+    except Exception:
+        return None
+    if not row:
+        return None
+    return {
+        "id": str(row.id),
+        "kind": row.kind,
+        "status": row.status,
+        "attempts": row.attempts,
+        "lastError": row.last_error or None,
+        "nextAttemptAt": row.next_attempt_at.isoformat() if row.next_attempt_at else None,
+        "sentAt": row.sent_at.isoformat() if row.sent_at else None,
+        "createdAt": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+# -----------------------------
+# Thread-pool sender
+# -----------------------------
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, int(getattr(settings, "EMAIL_DISPATCH_WORKERS", 2) or 2))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-dispatch")
+    return _executor
+
+
+def _submit_threaded(ids: list[str], countdown: int = 0) -> None:
+    if countdown > 0:
+        timer = threading.Timer(countdown, _submit_threaded, args=(ids, 0))
+        timer.daemon = True
+        timer.start()
+        return
+    _queued_ids.extend(ids)
+    _get_executor().submit(_drain_queue)
+
+
+def _drain_queue() -> None:
+    # Whatever has accumulated since the last run goes out as one batch
+    ids = []
+    while len(ids) < BATCH_SIZE:
+        try:
+            ids.append(_queued_ids.popleft())
+        except IndexError:
+            break
+    if not ids:
+        return
+    close_old_connections()
+    try:
+        result = deliver_batch(ids)
+        if result["retry"]:
+            _submit_threaded(result["retry"], result["retryIn"])
+    except Exception as exc:
+        logger.error(f"Email batch delivery failed: {exc}")
+    finally:
+        close_old_connections()
+        if _queued_ids:
+            _get_executor().submit(_drain_queue)
+
+
+def _send_untracked(subject, message, from_email, recipients, html_message=None) -> None:
+    try:
+        msg = EmailMultiAlternatives(subject=subject, body=message, from_email=from_email, to=recipients)
+        if html_message:
+            msg.attach_alternative(html_message, "text/html")
+        msg.send(fail_silently=True)
+    except Exception as exc:
+        logger.error(f"Untracked email send failed: {exc}")
+
+
+__all__ = [
+    "queue_email",
+    "dispatch",
+    "deliver_batch",
+    "process_pending",
+    "get_email_status",
+    "render_email_template",
+    "retry_delay_seconds",
+]
@@ -1,18 +1,32 @@
+"""Transactional emails.
+
+Helpers build the message and hand it to ``email_dispatch.queue_email`` so the
+calling request never waits on SMTP; delivery happens in the background.
+"""
+
 from django.conf import settings
-from django.core.mail import send_mail, mail_admins
-from django.template.loader import render_to_string
 
+from .email_dispatch import queue_email, render_email_template
 
-def _safe_send(func, *args, **kwargs):
+
+def _safe_send(subject, message, recipients, html_message=None, kind="", from_email=None):
     try:
-        func(*args, **kwargs)
+        return queue_email(
+            subject,
+            message,
+            recipients,
+            html_message=html_message,
+            from_email=from_email,
+            kind=kind,
+        )
     except Exception as e:
-        # Log in debug to aid troubleshooting (e.g., SMTP misconfig)
+        # Log in debug to aid troubleshooting (e.g., outbox misconfig)
         try:
             if getattr(settings, "DEBUG", False):
-                print(f"[email] send failed: {e}")
+                print(f"[email] queue failed: {e}")
         except Exception:
             pass
+        return None
 
 
 def notify_admins_verification_submitted(app_user, access_request=None):
@@ -24,7 +38,14 @@ def notify_admins_verification_submitted(app_user, access_request=None):
         f"Status: {app_user.status}\n"
         f"Role: {app_user.role}\n"
     )
-    _safe_send(mail_admins, subject, message, fail_silently=True)
+    admins = [addr for _name, addr in (getattr(settings, "ADMINS", None) or [])]
+    return _safe_send(
+        f"{getattr(settings, 'EMAIL_SUBJECT_PREFIX', '')}{subject}",
+        message,
+        admins,
+        kind="admin_verification_submitted",
+        from_email=getattr(settings, "SERVER_EMAIL", None),
+    )
 
 
 def email_user_verification_received(app_user):
@@ -37,13 +58,11 @@ def email_user_verification_received(app_user):
         "An administrator will review it shortly. You will be notified once approved or if we need more information.\n\n"
         "Thank you."
     )
-    _safe_send(
-        send_mail,
+    return _safe_send(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [app_user.email],
-        fail_silently=True,
+        kind="verification_received",
     )
 
 
@@ -56,13 +75,11 @@ def email_user_approved(app_user):
         "Your account has been approved. You can now sign in and access the system.\n\n"
         "Thank you."
     )
-    _safe_send(
-        send_mail,
+    return _safe_send(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [app_user.email],
-        fail_silently=True,
+        kind="access_approved",
     )
 
 
@@ -76,13 +93,11 @@ def email_user_rejected(app_user, note: str = ""):
         "Your access request was not approved at this time." + body_note + "\n\n"
         "You may contact support for more information or resubmit if applicable."
     )
-    _safe_send(
-        send_mail,
+    return _safe_send(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [app_user.email],
-        fail_silently=True,
+        kind="access_rejected",
     )
 
 
@@ -103,26 +118,21 @@ def email_user_password_reset(email: str, reset_link: str, code: str | None = No
         + "If the link doesn't work on this device, open the app and choose 'I have a code'.\n"
     )
     # HTML body via template
-    try:
-        html = render_to_string(
-            "email/password_reset.html",
-            {
-                "reset_link": reset_link,
-                "expires_minutes": expires_minutes,
-                "code": code,
-                "brand": getattr(settings, "EMAIL_SUBJECT_PREFIX", ""),
-            },
-        )
-    except Exception:
-        html = None
-    _safe_send(
-        send_mail,
+    html = render_email_template(
+        "email/password_reset.html",
+        {
+            "reset_link": reset_link,
+            "expires_minutes": expires_minutes,
+            "code": code,
+            "brand": getattr(settings, "EMAIL_SUBJECT_PREFIX", ""),
+        },
+    )
+    return _safe_send(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [email],
-        fail_silently=True,
         html_message=html,
+        kind="password_reset",
     )
 
 def email_user_login_otp(app_user, code: str, expires_minutes: int = 5):
@@ -141,26 +151,21 @@ def email_user_login_otp(app_user, code: str, expires_minutes: int = 5):
         f"This code expires in approximately {expires_minutes} minutes.\n\n"
         "If you didn't try to sign in, you can ignore this email."
     )
-    try:
-        html = render_to_string(
-            "email/login_otp.html",
-            {
-                "code": code,
-                "expires_minutes": expires_minutes,
-                "brand": getattr(settings, "EMAIL_SUBJECT_PREFIX", ""),
-                "user": app_user,
-            },
-        )
-    except Exception:
-        html = None
-    _safe_send(
-        send_mail,
+    html = render_email_template(
+        "email/login_otp.html",
+        {
+            "code": code,
+            "expires_minutes": expires_minutes,
+            "brand": getattr(settings, "EMAIL_SUBJECT_PREFIX", ""),
+            "user": app_user,
+        },
+    )
+    return _safe_send(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [email],
-        fail_silently=True,
         html_message=html,
+        kind="login_otp",
     )
 
 
@@ -175,22 +180,17 @@ def email_user_email_verification(email: str, verify_link: str):
         f"Verify link: {verify_link}\n\n"
         "If you did not create an account, you can ignore this email."
     )
-    try:
-        html = render_to_string(
-            "email/verify_email.html",
-            {
-                "verify_link": verify_link,
-                "brand": getattr(settings, "EMAIL_SUBJECT_PREFIX", ""),
-            },
-        )
-    except Exception:
-        html = None
-    _safe_send(
-        send_mail,
+    html = render_email_template(
+        "email/verify_email.html",
+        {
+            "verify_link": verify_link,
+            "brand": getattr(settings, "EMAIL_SUBJECT_PREFIX", ""),
+        },
+    )
+    return _safe_send(
         subject,
         message,
-        settings.DEFAULT_FROM_EMAIL,
         [email],
-        fail_silently=True,
         html_message=html,
+        kind="email_verification",
     )
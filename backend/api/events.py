@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from typing import Iterable, Optional
+from uuid import uuid4
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
@@ -16,19 +17,80 @@ def _normalize_group(name: str) -> str:
     return safe[:_MAX_GROUP_LENGTH] or "broadcast"
 
 
-def publish_event(
+# Topic groups let a socket opt into a narrow slice of the stream instead of
+# the role/broadcast firehose: "station:<code>", "order:<id>",
+# "event:<type>", "catering" and "inventory".
+TOPIC_PREFIX = "topic."
+PARAM_TOPICS = {"station", "order", "event"}
+DOMAIN_TOPICS = {"catering", "inventory"}
+
+
+def topic_group(kind: str, value: Optional[str] = None) -> str:
+    name = f"{TOPIC_PREFIX}{kind}" if value is None else f"{TOPIC_PREFIX}{kind}.{value}"
+    return _normalize_group(name.lower())
+
+
+def parse_topic(spec: str) -> Optional[str]:
+    """Map a client topic spec (e.g. ``station:grill``) to its group name."""
+    if not isinstance(spec, str):
+        return None
+    kind, _, value = spec.strip().partition(":")
+    kind = kind.lower()
+    value = value.strip()
+    if kind in DOMAIN_TOPICS and not value:
+        return topic_group(kind)
+    if kind in PARAM_TOPICS and value:
+        return topic_group(kind, value)
+    return None
+
+
+def _order_ids(payload: dict) -> set[str]:
+    ids = set()
+    if payload.get("orderId"):
+        ids.add(str(payload["orderId"]))
+    order = payload.get("order")
+    if isinstance(order, dict) and order.get("id"):
+        ids.add(str(order["id"]))
+    return ids
+
+
+def _station_codes(payload: dict) -> set[str]:
+    codes = set()
+    items = []
+    if isinstance(payload.get("item"), dict):
+        items.append(payload["item"])
+    order = payload.get("order")
+    if isinstance(order, dict):
+        items.extend(i for i in (order.get("items") or []) if isinstance(i, dict))
+    for item in items:
+        if item.get("stationCode"):
+            codes.add(str(item["stationCode"]))
+    if payload.get("stationCode"):
+        codes.add(str(payload["stationCode"]))
+    return codes
+
+
+def topic_groups_for_event(event_type: str, payload: dict) -> set[str]:
+    """Topic groups an event is routed to, derived from its type and payload."""
+    groups = {topic_group("event", event_type)}
+    domain = (event_type or "").split(".", 1)[0].lower()
+    if domain in DOMAIN_TOPICS:
+        groups.add(topic_group(domain))
+    if isinstance(payload, dict):
+        groups.update(topic_group("order", oid) for oid in _order_ids(payload))
+        groups.update(topic_group("station", code) for code in _station_codes(payload))
+    return groups
+
+
+def event_groups(
     event_type: str,
     payload: dict,
     *,
     audience: Optional[Iterable[str]] = None,
     user_ids: Optional[Iterable[str]] = None,
     roles: Optional[Iterable[str]] = None,
-) -> None:
-    """Broadcast an event to interested websocket subscribers."""
-    layer = get_channel_layer()
-    if not layer:
-        return
-
+) -> set[str]:
+    """Channel-layer groups an event is sent to."""
     groups = {"broadcast"}
     if audience:
         groups.update(audience)
@@ -38,12 +100,43 @@ def publish_event(
         groups.update({f"role_{role.lower()}" for role in roles})
 
     normalized = {_normalize_group(group) for group in groups}
+    normalized.update(topic_groups_for_event(event_type, payload))
+    return normalized
+
+
+def publish_event(
+    event_type: str,
+    payload: dict,
+    *,
+    audience: Optional[Iterable[str]] = None,
+    user_ids: Optional[Iterable[str]] = None,
+    roles: Optional[Iterable[str]] = None,
+) -> None:
+    """Broadcast an event to interested websocket subscribers."""
+    layer = get_channel_layer()
+    if not layer:
+        return
+
+    normalized = event_groups(event_type, payload, audience=audience, user_ids=user_ids, roles=roles)
 
     message = {
         "type": "event.message",
+        # Lets a socket reached through several groups drop the duplicates
+        "eventId": uuid4().hex,
         "event": event_type,
         "payload": payload,
     }
+    order = payload.get("order") if isinstance(payload, dict) else None
+    if isinstance(order, dict) and order.get("id"):
+        # Compact versioned form for sockets that opted into order patches
+        try:
+            from .order_patches import build_order_patch, to_channel
+
+            patch = build_order_patch(order)
+            if patch:
+                message["orderPatch"] = to_channel(patch)
+        except Exception:
+            pass
 
     for group in normalized:
         try:
@@ -52,4 +145,4 @@ def publish_event(
             continue
 
 
-__all__ = ["publish_event"]
+__all__ = ["publish_event", "event_groups", "parse_topic", "topic_group", "topic_groups_for_event"]
@@ -0,0 +1,142 @@
+"""Periodic stock checkpoints for historical (``as_of``) inventory queries.
+
+A checkpoint at ``taken_at`` stores the stock of every (item, location, batch)
+from the movements that satisfy ``effective_at <= taken_at`` and were recorded
+by the checkpoint's ``cutoff_at``. Stock as of any later time is
+
+    checkpoint lines + movements with effective_at <= as_of that are not in it
+
+where "not in it" means ``effective_at > taken_at`` or
+``recorded_at > cutoff_at``. That second half catches back-dated movements
+entered after the checkpoint was built. ``cutoff_at`` trails the build by
+``INVENTORY_CHECKPOINT_SAFETY_SECONDS``, so movements still being committed
+are left for the query to add.
+
+``build_checkpoint`` is incremental: it starts from the previous checkpoint
+and adds only the movements since (``api.tasks.build_ledger_checkpoint``,
+daily after local midnight).
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import LedgerCheckpoint, LedgerCheckpointLine, StockMovement
+from .report_buckets import local_midnight
+from .utils_dbtime import db_now
+
+DEC0 = Decimal("0")
+
+
+def not_in_checkpoint(checkpoint) -> Q:
+    """Movements a checkpoint does not include."""
+    return Q(effective_at__gt=checkpoint.taken_at) | Q(recorded_at__gt=checkpoint.cutoff_at)
+
+
+def checkpoint_before(as_of: datetime):
+    """Latest checkpoint taken at or before ``as_of``, or None."""
+    return LedgerCheckpoint.objects.filter(taken_at__lte=as_of).order_by("-taken_at").first()
+
+
+def stock_as_of(
+    as_of: datetime,
+    group_by: str,
+    item_ids=None,
+    location_id: Optional[str] = None,
+) -> Dict[str, Decimal]:
+    """Stock as of a time, summed per ``item_id`` or ``batch_id``, from checkpoint plus tail."""
+    checkpoint = checkpoint_before(as_of)
+    tail = StockMovement.objects.filter(effective_at__lte=as_of)
+    lines = LedgerCheckpointLine.objects.filter(checkpoint=checkpoint) if checkpoint else None
+    if checkpoint:
+        tail = tail.filter(not_in_checkpoint(checkpoint))
+    if item_ids:
+        tail = tail.filter(item_id__in=list(item_ids))
+        lines = lines.filter(item_id__in=list(item_ids)) if lines is not None else None
+    if location_id:
+        tail = tail.filter(location_id=location_id)
+        lines = lines.filter(location_id=location_id) if lines is not None else None
+
+    out: Dict[str, Decimal] = defaultdict(lambda: DEC0)
+    sources = [tail] if lines is None else [lines, tail]
+    for qs in sources:
+        for row in qs.values(group_by).annotate(total=Sum("qty")).order_by():
+            if row[group_by] is None:
+                continue
+            out[str(row[group_by])] += Decimal(row["total"] or 0)
+    return dict(out)
+
+
+def _safety() -> timedelta:
+    return timedelta(seconds=max(0, int(getattr(settings, "INVENTORY_CHECKPOINT_SAFETY_SECONDS", 300))))
+
+
+def build_checkpoint(taken_at: Optional[datetime] = None):
+    """Create the checkpoint at ``taken_at`` (default: the latest local midnight).
+
+    Returns the new checkpoint, or the existing one if it is already built.
+    """
+    cutoff = db_now() - _safety()
+    taken_at = taken_at or local_midnight(cutoff)
+    if taken_at > cutoff:
+        raise ValueError("Checkpoint time must be earlier than the safety cutoff")
+    existing = LedgerCheckpoint.objects.filter(taken_at=taken_at).first()
+    if existing:
+        return existing
+
+    base = checkpoint_before(taken_at)
+    totals: Dict[Tuple[str, str, str], Decimal] = defaultdict(lambda: DEC0)
+    batch_ids: Dict[Tuple[str, str, str], Optional[str]] = {}
+    if base:
+        for line in LedgerCheckpointLine.objects.filter(checkpoint=base).values(
+            "item_id", "location_id", "batch_id", "batch_key", "qty"
+        ).iterator(chunk_size=2000):
+            key = (str(line["item_id"]), str(line["location_id"]), line["batch_key"])
+            totals[key] += line["qty"]
+            batch_ids[key] = line["batch_id"]
+    delta = StockMovement.objects.filter(effective_at__lte=taken_at, recorded_at__lte=cutoff)
+    if base:
+        delta = delta.filter(not_in_checkpoint(base))
+    for row in delta.values("item_id", "location_id", "batch_id").annotate(total=Sum("qty")).order_by():
+        key = (str(row["item_id"]), str(row["location_id"]), str(row["batch_id"]) if row["batch_id"] else "")
+        totals[key] += Decimal(row["total"] or 0)
+        batch_ids[key] = row["batch_id"]
+
+    with transaction.atomic():
+        checkpoint = LedgerCheckpoint.objects.create(taken_at=taken_at, cutoff_at=cutoff)
+        lines = [
+            LedgerCheckpointLine(
+                checkpoint=checkpoint,
+                item_id=item_id,
+                location_id=location_id,
+                batch_id=batch_ids.get((item_id, location_id, batch_key)),
+                batch_key=batch_key,
+                qty=qty,
+            )
+            for (item_id, location_id, batch_key), qty in totals.items()
+            if qty != DEC0
+        ]
+        LedgerCheckpointLine.objects.bulk_create(lines, batch_size=1000)
+        checkpoint.line_count = len(lines)
+        checkpoint.save(update_fields=["line_count"])
+    return checkpoint
+
+
+def prune_checkpoints(keep: Optional[int] = None) -> int:
+    """Delete all but the newest ``INVENTORY_CHECKPOINT_KEEP`` checkpoints."""
+    keep = int(keep if keep is not None else getattr(settings, "INVENTORY_CHECKPOINT_KEEP", 400))
+    old = list(LedgerCheckpoint.objects.order_by("-taken_at").values_list("id", flat=True)[max(1, keep):])
+    if not old:
+        return 0
+    LedgerCheckpoint.objects.filter(id__in=old).delete()
+    return len(old)
+
+
+__all__ = ["build_checkpoint", "checkpoint_before", "not_in_checkpoint", "prune_checkpoints", "stock_as_of"]
@@ -0,0 +1,108 @@
+"""Recent inventory activity: stock movements and item edits in one feed.
+
+Entries are ordered newest first by ``(timestamp, source, id)``, where the
+timestamp is ``StockMovement.recorded_at`` or ``InventoryActivity.created_at``.
+Each source reads at most ``limit + 1`` rows after the cursor, in the order
+of its ``recorded_at`` / ``(action, created_at)`` index. ``heapq.merge``
+interleaves them lazily, so a deep page costs the same as the first. The
+extra row only says whether a next page exists.
+"""
+
+from __future__ import annotations
+
+import base64
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+from typing import List, Optional, Sequence, Tuple
+
+from django.db.models import Q
+
+from .models import InventoryActivity, StockMovement
+
+SOURCE_UPDATE = 0
+SOURCE_MOVEMENT = 1
+ITEM_UPDATE = "ITEM_UPDATE"
+
+FeedKey = Tuple[datetime, int, str]
+
+
+def encode_cursor(key: FeedKey) -> str:
+    raw = json.dumps([key[0].isoformat(), key[1], key[2]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> FeedKey:
+    """Parse a cursor from ``encode_cursor``; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        ts, source, pk = json.loads(raw)
+        return datetime.fromisoformat(ts), int(source), str(pk)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _older_than(key: Optional[FeedKey], source: int, ts_field: str) -> Q:
+    """Rows of ``source`` that sort after ``key`` in newest-first order."""
+    if key is None:
+        return Q()
+    ts, key_source, pk = key
+    older = Q(**{f"{ts_field}__lt": ts})
+    if source < key_source:
+        return older | Q(**{ts_field: ts})
+    if source == key_source:
+        return older | Q(**{ts_field: ts, "id__lt": pk})
+    return older
+
+
+def activity_feed(
+    *,
+    item_id: Optional[str] = None,
+    location_id: Optional[str] = None,
+    types: Optional[Sequence[str]] = None,
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Tuple[int, object]], Optional[str]]:
+    """One page of ``(source, row)`` entries, newest first, and the next cursor (or None).
+
+    ``types`` filters movement types; ``ITEM_UPDATE`` selects item edits.
+    Item edits have no location and are left out when ``location_id`` is given.
+    """
+    key = decode_cursor(cursor) if cursor else None
+    wanted = {t.upper() for t in types or []}
+    sources = []
+
+    movement_types = wanted - {ITEM_UPDATE}
+    if not wanted or movement_types:
+        movements = StockMovement.objects.select_related("item", "location", "batch", "actor")
+        if item_id:
+            movements = movements.filter(item_id=item_id)
+        if location_id:
+            movements = movements.filter(location_id=location_id)
+        if movement_types:
+            movements = movements.filter(movement_type__in=sorted(movement_types))
+        if since:
+            movements = movements.filter(recorded_at__gte=since)
+        movements = movements.filter(_older_than(key, SOURCE_MOVEMENT, "recorded_at"))
+        rows = movements.order_by("-recorded_at", "-id")[: limit + 1]
+        sources.append(((m.recorded_at, SOURCE_MOVEMENT, str(m.id)), m) for m in rows)
+
+    if (not wanted or ITEM_UPDATE in wanted) and not location_id:
+        updates = InventoryActivity.objects.select_related("item", "actor").filter(action=InventoryActivity.ACTION_UPDATE)
+        if item_id:
+            updates = updates.filter(item_id=item_id)
+        if since:
+            updates = updates.filter(created_at__gte=since)
+        updates = updates.filter(_older_than(key, SOURCE_UPDATE, "created_at"))
+        rows = updates.order_by("-created_at", "-id")[: limit + 1]
+        sources.append(((a.created_at, SOURCE_UPDATE, str(a.id)), a) for a in rows)
+
+    merged = list(islice(heapq.merge(*sources, key=lambda entry: entry[0], reverse=True), limit + 1))
+    page = merged[:limit]
+    next_cursor = encode_cursor(page[-1][0]) if len(merged) > limit else None
+    return [(entry_key[1], row) for entry_key, row in page], next_cursor
+
+
+__all__ = ["ITEM_UPDATE", "SOURCE_MOVEMENT", "SOURCE_UPDATE", "activity_feed", "decode_cursor", "encode_cursor"]
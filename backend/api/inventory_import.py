@@ -0,0 +1,384 @@
+"""Bulk goods receipts and stock adjustments from CSV or JSON.
+
+A delivery note or count sheet becomes one import. ``parse_lines`` reads the
+file and ``validate_lines`` checks every line: item, quantity, dates and
+location. It reports all the errors at once with their line numbers, so
+nothing is half-imported. ``import_stock`` then writes the import in one
+transaction, in these steps:
+
+- lock the balance rows of adjusted items and check negative adjustments
+  against them, in line order;
+- ``bulk_create`` the batches (receipt lines with lot, expiry, cost or
+  supplier) and the movements;
+- apply the balances once per (item, location, batch) and refresh each
+  item's cached quantity once;
+- publish a single ``inventory.import_recorded`` event after commit.
+
+Recognised columns (CSV headers or JSON keys; case, spaces and underscores
+are ignored): itemId, itemName, qty/quantity/delta, type (receipt or
+adjustment, default receipt), location, lotCode, expiryDate, unitCost,
+supplier, reason, effectiveAt.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone as dj_tz
+
+from .inventory_services import (
+    DEC0,
+    _apply_to_balances,
+    _lock_balances,
+    _locked_available,
+    _maybe_notify_low_stock,
+    _replayed,
+    _slice_key,
+    _sync_item_quantities,
+    get_db_now,
+)
+from .locations import DEFAULT_LOCATION_CODE, get_location
+
+logger = logging.getLogger(__name__)
+
+TYPE_RECEIPT = "receipt"
+TYPE_ADJUSTMENT = "adjustment"
+
+_COLUMNS = {
+    "itemid": "item_id",
+    "item": "item_name",
+    "itemname": "item_name",
+    "name": "item_name",
+    "qty": "qty",
+    "quantity": "qty",
+    "delta": "qty",
+    "type": "type",
+    "kind": "type",
+    "location": "location",
+    "locationcode": "location",
+    "lot": "lot_code",
+    "lotcode": "lot_code",
+    "expiry": "expiry_date",
+    "expirydate": "expiry_date",
+    "unitcost": "unit_cost",
+    "cost": "unit_cost",
+    "supplier": "supplier",
+    "reason": "reason",
+    "effectiveat": "effective_at",
+}
+
+
+class ImportValidationError(ValueError):
+    """Raised with every line error of an import; ``errors`` is ``[{"line", "message"}]``."""
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} import line(s) have errors")
+        self.errors = errors
+
+
+@dataclass
+class ImportLine:
+    number: int
+    type: str
+    item: object
+    qty: Decimal
+    location_code: str
+    lot_code: str = ""
+    expiry_date: Optional[date] = None
+    unit_cost: Optional[Decimal] = None
+    supplier: str = ""
+    reason: str = ""
+    effective_at: Optional[datetime] = None
+    location: object = field(default=None, repr=False)
+
+    @property
+    def has_batch(self) -> bool:
+        return bool(self.lot_code or self.expiry_date or self.unit_cost is not None or self.supplier)
+
+
+def _max_lines() -> int:
+    return max(1, int(getattr(settings, "INVENTORY_IMPORT_MAX_LINES", 2000)))
+
+
+def _normalize(row: dict) -> dict:
+    out = {}
+    for key, value in (row or {}).items():
+        name = _COLUMNS.get(str(key or "").strip().lower().replace(" ", "").replace("_", ""))
+        if name and value not in (None, ""):
+            out[name] = value.strip() if isinstance(value, str) else value
+    return out
+
+
+def parse_lines(content, fmt: str = "csv") -> List[dict]:
+    """Rows of a CSV document or JSON list (or ``{"lines": [...]}``), with normalized keys."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    if fmt == "json":
+        data = json.loads(content) if isinstance(content, str) else content
+        rows = data.get("lines") if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise ValueError("Expected a list of lines")
+    else:
+        rows = list(csv.DictReader(io.StringIO(content)))
+    return [_normalize(row) if isinstance(row, dict) else {} for row in rows]
+
+
+def _decimal(value) -> Optional[Decimal]:
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return number if number.is_finite() else None
+
+
+def validate_lines(
+    rows: Sequence[dict],
+    *,
+    location: Optional[str] = None,
+    supplier: str = "",
+) -> List[ImportLine]:
+    """Check every row; return ``ImportLine``s or raise ``ImportValidationError``.
+
+    ``location`` and ``supplier`` fill lines that do not name their own.
+    """
+    from .models import InventoryItem
+
+    if not rows:
+        raise ImportValidationError([{"line": 0, "message": "No lines to import"}])
+    if len(rows) > _max_lines():
+        raise ImportValidationError([{"line": 0, "message": f"At most {_max_lines()} lines per import"}])
+
+    ids, names = set(), set()
+    for row in rows:
+        if row.get("item_id"):
+            try:
+                ids.add(str(UUID(str(row["item_id"]))))
+            except ValueError:
+                pass
+        elif row.get("item_name"):
+            names.add(str(row["item_name"]).lower())
+    by_id = {str(i.id): i for i in InventoryItem.objects.filter(id__in=ids)} if ids else {}
+    by_name: Dict[str, List[object]] = defaultdict(list)
+    if names:
+        for item in InventoryItem.objects.annotate(_lname=Lower("name")).filter(_lname__in=sorted(names)):
+            by_name[item.name.lower()].append(item)
+
+    errors: List[dict] = []
+    lines: List[ImportLine] = []
+    for number, row in enumerate(rows, start=1):
+        problems = []
+        kind = str(row.get("type") or TYPE_RECEIPT).lower()
+        if kind not in {TYPE_RECEIPT, TYPE_ADJUSTMENT}:
+            problems.append(f"Unknown type '{kind}'")
+
+        item = None
+        if row.get("item_id"):
+            try:
+                item = by_id.get(str(UUID(str(row["item_id"]))))
+            except ValueError:
+                pass
+            if item is None:
+                problems.append("Item not found")
+        elif row.get("item_name"):
+            matches = by_name.get(str(row["item_name"]).lower(), [])
+            if len(matches) == 1:
+                item = matches[0]
+            else:
+                problems.append("Item not found" if not matches else "Item name is ambiguous; use itemId")
+        else:
+            problems.append("itemId or itemName is required")
+
+        qty = _decimal(row.get("qty"))
+        if qty is None:
+            problems.append("qty must be a number")
+        elif kind == TYPE_RECEIPT and qty <= DEC0:
+            problems.append("qty must be positive for receipt")
+        elif qty == DEC0:
+            problems.append("delta cannot be zero")
+
+        expiry = None
+        if row.get("expiry_date"):
+            try:
+                expiry = date.fromisoformat(str(row["expiry_date"])[:10])
+            except ValueError:
+                problems.append("expiryDate must be YYYY-MM-DD")
+        unit_cost = None
+        if row.get("unit_cost") is not None:
+            unit_cost = _decimal(row["unit_cost"])
+            if unit_cost is None or unit_cost < DEC0:
+                problems.append("unitCost must be a non-negative number")
+        effective_at = None
+        if row.get("effective_at"):
+            try:
+                effective_at = datetime.fromisoformat(str(row["effective_at"]))
+                if dj_tz.is_naive(effective_at):
+                    effective_at = dj_tz.make_aware(effective_at)
+            except ValueError:
+                problems.append("effectiveAt must be an ISO date-time")
+        code = str(row.get("location") or location or DEFAULT_LOCATION_CODE).strip()
+        if len(code) > 32:
+            problems.append("location code is too long")
+
+        if problems:
+            errors.extend({"line": number, "message": message} for message in problems)
+            continue
+        line = ImportLine(
+            number=number,
+            type=kind,
+            item=item,
+            qty=qty,
+            location_code=code,
+            effective_at=effective_at,
+            reason=str(row.get("reason") or ""),
+        )
+        if kind == TYPE_RECEIPT:
+            line.lot_code = str(row.get("lot_code") or "")[:64]
+            line.expiry_date = expiry
+            line.unit_cost = unit_cost
+            line.supplier = str(row.get("supplier") or supplier or "")[:255]
+        lines.append(line)
+    if errors:
+        raise ImportValidationError(errors)
+    return lines
+
+
+def _check_adjustments(lines: Sequence[ImportLine]) -> None:
+    """Lock adjusted items' balances and reject lines that would go negative."""
+    adjusted: Dict[str, set] = defaultdict(set)
+    for line in lines:
+        if line.type == TYPE_ADJUSTMENT:
+            adjusted[str(line.location.id)].add(str(line.item.id))
+    running: Dict[Tuple[str, str], Decimal] = {}
+    for location_id in sorted(adjusted):
+        locked = _lock_balances(sorted(adjusted[location_id]), location_id)
+        for item_id in adjusted[location_id]:
+            running[(item_id, location_id)] = _locked_available(locked, item_id)
+    errors = []
+    for line in lines:
+        key = (str(line.item.id), str(line.location.id))
+        if key not in running:
+            continue
+        # Receipts count too: a receipt earlier in the file covers a later adjustment
+        running[key] += line.qty
+        if line.type == TYPE_ADJUSTMENT and running[key] < DEC0:
+            errors.append({"line": line.number, "message": "Adjustment would result in negative stock"})
+    if errors:
+        raise ImportValidationError(errors)
+
+
+@transaction.atomic
+def import_stock(
+    lines: Sequence[ImportLine],
+    *,
+    actor=None,
+    reference: str = "",
+    idempotency_key: Optional[str] = None,
+) -> dict:
+    """Write validated lines; returns a summary. Replays return the earlier import's summary."""
+    from .models import Batch, StockMovement
+
+    replayed = _replayed(idempotency_key)
+    if replayed is not None:
+        return _summary(replayed, reference, replayed=True)
+    for line in lines:
+        line.location = get_location(line.location_code)
+    _check_adjustments(lines)
+
+    now = get_db_now()
+    batches: List[Batch] = []
+    movements: List[StockMovement] = []
+    for index, line in enumerate(lines):
+        batch = None
+        if line.type == TYPE_RECEIPT and line.has_batch:
+            batch = Batch(
+                item=line.item,
+                lot_code=line.lot_code,
+                expiry_date=line.expiry_date,
+                received_at=now,
+                supplier=line.supplier,
+                unit_cost=line.unit_cost,
+            )
+            batches.append(batch)
+        receipt = line.type == TYPE_RECEIPT
+        movements.append(StockMovement(
+            item=line.item,
+            location=line.location,
+            batch=batch,
+            movement_type=StockMovement.TYPE_RECEIPT if receipt else StockMovement.TYPE_ADJUSTMENT,
+            qty=line.qty,
+            effective_at=line.effective_at or now,
+            recorded_at=now,
+            actor=actor if hasattr(actor, "id") else None,
+            reference_type="goods_receipt" if receipt else "adjustment",
+            reference_id=str(reference or "")[:64],
+            reason="" if receipt else (line.reason or "Bulk adjustment")[:255],
+            idempotency_key=_slice_key(idempotency_key, index),
+        ))
+    Batch.objects.bulk_create(batches, batch_size=500)
+    StockMovement.objects.bulk_create(movements, batch_size=500)
+    _apply_to_balances(movements)
+
+    received = {str(m.item_id) for m in movements if m.movement_type == StockMovement.TYPE_RECEIPT}
+    adjusted = {str(m.item_id) for m in movements} - received
+    try:
+        if received:
+            _sync_item_quantities(received, last_restocked=now)
+        if adjusted:
+            _sync_item_quantities(adjusted)
+        _maybe_notify_low_stock(sorted(received | adjusted))
+    except Exception:
+        logger.exception("Failed to refresh item quantities after stock import")
+
+    summary = _summary(movements, reference, batches=len(batches))
+    transaction.on_commit(lambda: _publish(summary))
+    return summary
+
+
+def _summary(movements, reference: str, batches: Optional[int] = None, replayed: bool = False) -> dict:
+    from .models import Location, StockMovement
+
+    codes = dict(Location.objects.filter(id__in={m.location_id for m in movements}).values_list("id", "code"))
+    return {
+        "reference": reference or "",
+        "lines": len(movements),
+        "receipts": sum(1 for m in movements if m.movement_type == StockMovement.TYPE_RECEIPT),
+        "adjustments": sum(1 for m in movements if m.movement_type == StockMovement.TYPE_ADJUSTMENT),
+        "batches": batches if batches is not None else len({m.batch_id for m in movements if m.batch_id}),
+        "itemIds": sorted({str(m.item_id) for m in movements}),
+        "locations": sorted({codes.get(m.location_id, "") for m in movements}),
+        "movementIds": [str(m.id) for m in movements],
+        "replayed": replayed,
+    }
+
+
+def _publish(summary: dict) -> None:
+    try:
+        from .events import publish_event
+
+        payload = {k: v for k, v in summary.items() if k != "movementIds"}
+        publish_event("inventory.import_recorded", payload, roles={"admin", "manager", "staff"})
+    except Exception:
+        logger.exception("Failed to publish stock import event")
+
+
+__all__ = [
+    "ImportLine",
+    "ImportValidationError",
+    "TYPE_ADJUSTMENT",
+    "TYPE_RECEIPT",
+    "import_stock",
+    "parse_lines",
+    "validate_lines",
+]
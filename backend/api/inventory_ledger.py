@@ -0,0 +1,134 @@
+"""Stock ledger reads: keyset pages and streaming export.
+
+Movements are ordered by ``(effective_at, recorded_at, id)``. A page cursor
+encodes that key for the last row returned, and the next page starts strictly
+after it. Unlike an offset, a cursor page does not shift when new movements
+arrive, and it does not rescan skipped rows. With an item and a location the
+scan follows the ``(item, location, effective_at)`` index.
+
+Every row carries ``balance``: the item's stock (at the location, when one is
+given) after that movement. The opening balance of a page comes from the
+ledger checkpoints (see ``inventory_checkpoints``). Later balances are
+accumulated while reading, so an export needs no second pass.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from django.db.models import Q, Sum
+
+from .inventory_checkpoints import stock_as_of
+from .models import StockMovement
+
+DEC0 = Decimal("0")
+_TICK = timedelta(microseconds=1)
+
+LedgerKey = Tuple[datetime, datetime, UUID]
+
+
+def encode_cursor(movement) -> str:
+    raw = json.dumps([movement.effective_at.isoformat(), movement.recorded_at.isoformat(), str(movement.id)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> LedgerKey:
+    """Parse a cursor from ``encode_cursor``; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        effective, recorded, pk = json.loads(raw)
+        return datetime.fromisoformat(effective), datetime.fromisoformat(recorded), UUID(pk)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _movements(item_id: str, date_from=None, date_to=None, location_id=None):
+    qs = StockMovement.objects.filter(item_id=item_id)
+    if date_from:
+        qs = qs.filter(effective_at__gte=date_from)
+    if date_to:
+        qs = qs.filter(effective_at__lte=date_to)
+    if location_id:
+        qs = qs.filter(location_id=location_id)
+    return qs.order_by("effective_at", "recorded_at", "id")
+
+
+def _after(key: LedgerKey) -> Q:
+    effective, recorded, pk = key
+    return (
+        Q(effective_at__gt=effective)
+        | Q(effective_at=effective, recorded_at__gt=recorded)
+        | Q(effective_at=effective, recorded_at=recorded, id__gt=pk)
+    )
+
+
+def _balance_before(item_id: str, location_id: Optional[str], date_from=None, key: Optional[LedgerKey] = None) -> Decimal:
+    """Stock just before the first row of a page."""
+    if key is None:
+        if not date_from:
+            return DEC0
+        return stock_as_of(date_from - _TICK, "item_id", [item_id], location_id).get(str(item_id), DEC0)
+    effective, recorded, pk = key
+    before = stock_as_of(effective - _TICK, "item_id", [item_id], location_id).get(str(item_id), DEC0)
+    # Rows sharing the cursor's effective_at, up to and including the cursor row
+    ties = _movements(item_id, location_id=location_id).filter(effective_at=effective).filter(
+        Q(recorded_at__lt=recorded) | Q(recorded_at=recorded, id__lte=pk)
+    )
+    return before + (ties.aggregate(total=Sum("qty"))["total"] or DEC0)
+
+
+def ledger_page(
+    item_id: str,
+    *,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    location_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 500,
+) -> Tuple[List[Tuple[object, Decimal]], Optional[str]]:
+    """One page of ``(movement, balance)`` rows and the cursor of the next page (or None)."""
+    key = decode_cursor(cursor) if cursor else None
+    qs = _movements(item_id, date_from, date_to, location_id)
+    if key is not None:
+        qs = qs.filter(_after(key))
+    rows = list(qs[: limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    balance = _balance_before(item_id, location_id, date_from, key)
+    page = []
+    for mv in rows:
+        balance += mv.qty
+        page.append((mv, balance))
+    return page, (encode_cursor(rows[-1]) if more else None)
+
+
+def iter_ledger(
+    item_id: str,
+    *,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    location_id: Optional[str] = None,
+    chunk_size: int = 1000,
+) -> Iterator[Tuple[object, Decimal]]:
+    """Yield every ``(movement, balance)`` in range, reading ``chunk_size`` rows per query."""
+    base = _movements(item_id, date_from, date_to, location_id)
+    balance = _balance_before(item_id, location_id, date_from)
+    key: Optional[LedgerKey] = None
+    while True:
+        qs = base.filter(_after(key)) if key is not None else base
+        rows = list(qs[:chunk_size])
+        for mv in rows:
+            balance += mv.qty
+            yield mv, balance
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+        key = (last.effective_at, last.recorded_at, last.id)
+
+
+__all__ = ["decode_cursor", "encode_cursor", "iter_ledger", "ledger_page"]
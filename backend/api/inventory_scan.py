@@ -0,0 +1,181 @@
+"""Incremental scan for low stock and expiring batches (``inventory_scan``).
+
+Each run re-checks low stock only for items with movements, or changed
+reorder settings, since the previous run's watermark. The first run, and a
+``full`` run, checks every reorder setting. Batches are checked for expiry
+on every run, but only batches that still hold stock.
+
+``InventoryAlert`` keeps the last state reported per subject. Managers are
+notified when a subject enters a state that needs attention (``low``,
+``expiring``, ``expired``), not again while it stays there. A low-stock
+subject that recovers is marked ``ok`` and is reported again the next time
+it runs low.
+
+Notifications and alert states are written together in chunks of
+``INVENTORY_SCAN_CHUNK``, each in its own transaction. The watermark moves only
+after every chunk is written, so an interrupted run is redone by the next
+one, and the alert states keep it from notifying twice.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone as dj_tz
+
+from .inventory_services import low_stock_settings
+from .models import (
+    AppUser,
+    Batch,
+    InventoryAlert,
+    InventoryScanState,
+    Notification,
+    ReorderSetting,
+    StockBalance,
+    StockMovement,
+)
+from .utils_dbtime import db_now
+
+logger = logging.getLogger(__name__)
+
+SCAN_NAME = "inventory_scan"
+STATE_OK = "ok"
+STATE_LOW = "low"
+STATE_EXPIRING = "expiring"
+STATE_EXPIRED = "expired"
+
+
+def _changed_item_ids(since: datetime) -> Set[str]:
+    moved = StockMovement.objects.filter(recorded_at__gt=since).values_list("item_id", flat=True).distinct()
+    edited = ReorderSetting.objects.filter(updated_at__gt=since).values_list("item_id", flat=True)
+    return {str(i) for i in moved} | {str(i) for i in edited}
+
+
+def _current_states(kind: str, subjects) -> Dict[str, str]:
+    return dict(InventoryAlert.objects.filter(kind=kind, subject__in=list(subjects)).values_list("subject", "state"))
+
+
+def _low_stock_changes(item_ids: Optional[Set[str]]) -> List[Tuple[str, str, object]]:
+    """``(subject, new_state, setting)`` for reorder settings whose state changed."""
+    if item_ids is not None and not item_ids:
+        return []
+    pairs = ReorderSetting.objects.all()
+    if item_ids is not None:
+        pairs = pairs.filter(item_id__in=list(item_ids))
+    subjects = {f"{item_id}:{location_id}" for item_id, location_id in pairs.values_list("item_id", "location_id")}
+    if not subjects:
+        return []
+    low = {f"{rs.item_id}:{rs.location_id}": rs for rs in low_stock_settings(list(item_ids) if item_ids else None)}
+    current = _current_states(InventoryAlert.KIND_LOW_STOCK, subjects)
+    changes = []
+    for subject in sorted(subjects):
+        state = STATE_LOW if subject in low else STATE_OK
+        # A subject never reported counts as ok
+        if current.get(subject, STATE_OK) != state:
+            changes.append((subject, state, low.get(subject)))
+    return changes
+
+
+def _expiry_changes(days: int, today) -> List[Tuple[str, str, object]]:
+    """``(batch_id, new_state, batch)`` for stocked batches expiring within ``days``."""
+    stocked = StockBalance.objects.filter(batch__isnull=False, qty__gt=0).values("batch_id")
+    batches = list(
+        Batch.objects.select_related("item")
+        .filter(expiry_date__isnull=False, expiry_date__lte=today + timedelta(days=days), id__in=stocked)
+        .order_by("expiry_date", "created_at")
+    )
+    current = _current_states(InventoryAlert.KIND_EXPIRY, (str(b.id) for b in batches))
+    changes = []
+    for batch in batches:
+        state = STATE_EXPIRED if batch.expiry_date < today else STATE_EXPIRING
+        if current.get(str(batch.id)) != state:
+            changes.append((str(batch.id), state, batch))
+    return changes
+
+
+def _low_stock_notifications(rs, managers) -> list:
+    qty = rs.on_hand or 0
+    return [
+        Notification(
+            user=u,
+            title=f"Low stock: {rs.item.name}",
+            message=f"Current stock at {rs.location.name} is {qty}. Reorder point may be reached.",
+            type=Notification.TYPE_WARNING,
+            meta={"itemId": str(rs.item_id), "locationId": str(rs.location_id), "qty": float(qty)},
+        )
+        for u in managers
+    ]
+
+
+def _expiry_notifications(batch, state, managers) -> list:
+    name = getattr(batch.item, "name", "")
+    title = f"Expired: {name}" if state == STATE_EXPIRED else f"Expiring soon: {name}"
+    verb = "expired on" if state == STATE_EXPIRED else "expires on"
+    return [
+        Notification(
+            user=u,
+            title=title,
+            message=f"Batch {batch.lot_code or batch.id} {verb} {batch.expiry_date}",
+            type=Notification.TYPE_WARNING,
+            meta={"batchId": str(batch.id), "expiryDate": batch.expiry_date.isoformat()},
+        )
+        for u in managers
+    ]
+
+
+def _write_chunk(kind: str, chunk, managers, now: datetime) -> int:
+    notes = []
+    for subject, state, obj in chunk:
+        if state == STATE_LOW:
+            notes.extend(_low_stock_notifications(obj, managers))
+        elif state in {STATE_EXPIRING, STATE_EXPIRED}:
+            notes.extend(_expiry_notifications(obj, state, managers))
+    alerts = [InventoryAlert(kind=kind, subject=subject, state=state, changed_at=now) for subject, state, _ in chunk]
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target; (kind, subject) is its only unique key
+    target = ["kind", "subject"] if connection.features.supports_update_conflicts_with_target else None
+    with transaction.atomic():
+        Notification.objects.bulk_create(notes, batch_size=500)
+        InventoryAlert.objects.bulk_create(
+            alerts,
+            update_conflicts=True,
+            unique_fields=target,
+            update_fields=["state", "changed_at"],
+        )
+    return len(notes)
+
+
+def run_scan(days: int = 7, full: bool = False) -> dict:
+    """Run one scan; returns counts of changed subjects and notifications written."""
+    now = db_now()
+    safety = timedelta(seconds=max(0, int(getattr(settings, "INVENTORY_SCAN_SAFETY_SECONDS", 60))))
+    chunk_size = max(1, int(getattr(settings, "INVENTORY_SCAN_CHUNK", 200)))
+    state, _ = InventoryScanState.objects.get_or_create(name=SCAN_NAME)
+
+    item_ids = None if full or state.watermark is None else _changed_item_ids(state.watermark)
+    low_changes = _low_stock_changes(item_ids)
+    expiry_changes = _expiry_changes(int(days), dj_tz.localtime(now).date())
+    managers = list(AppUser.objects.filter(role__in=["manager", "admin"]))
+
+    written = 0
+    for kind, changes in ((InventoryAlert.KIND_LOW_STOCK, low_changes), (InventoryAlert.KIND_EXPIRY, expiry_changes)):
+        for start in range(0, len(changes), chunk_size):
+            written += _write_chunk(kind, changes[start:start + chunk_size], managers, now)
+
+    # Leave a margin for movements stamped before the scan but committed after it read
+    InventoryScanState.objects.filter(pk=state.pk).update(watermark=now - safety)
+    result = {
+        "itemsChecked": None if item_ids is None else len(item_ids),
+        "lowStock": sum(1 for _, s, _ in low_changes if s == STATE_LOW),
+        "recovered": sum(1 for _, s, _ in low_changes if s == STATE_OK),
+        "expiring": len(expiry_changes),
+        "notifications": written,
+    }
+    logger.info(f"Inventory scan: {result}")
+    return result
+
+
+__all__ = ["run_scan", "SCAN_NAME"]
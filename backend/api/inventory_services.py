@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import hashlib
+from collections import defaultdict
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Iterable, List, Optional, Sequence, Tuple, Dict
 
-from django.db import transaction
-from django.db.models import Sum, Q, F
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone as dj_tz
 
 from .models import (
@@ -15,8 +18,11 @@ from .models import (
     Batch,
     Location,
     ReorderSetting,
+    StockBalance,
     AppUser,
 )
+from .inventory_checkpoints import stock_as_of
+from .inventory_ledger import iter_ledger
 from .utils_dbtime import db_now
 
 
@@ -44,6 +50,63 @@ def _q2(val) -> Decimal:
         return DEC0
 
 
+def _batch_key(batch_id) -> str:
+    return str(batch_id) if batch_id else ""
+
+
+def _lock_balances(item_ids: Iterable[str], location_id: str) -> Dict[Tuple[str, str], StockBalance]:
+    """Lock the balance rows of items at a location; ``{(item_id, batch_key): row}``.
+
+    Availability checks read these rows so concurrent consumers of the same
+    stock queue up behind each other instead of both passing the check.
+    """
+    rows = (
+        StockBalance.objects.select_for_update()
+        .filter(item_id__in=list(item_ids), location_id=location_id)
+        .order_by("id")
+    )
+    return {(str(r.item_id), r.batch_key): r for r in rows}
+
+
+def _locked_available(locked: Dict[Tuple[str, str], StockBalance], item_id: str) -> Decimal:
+    return sum((r.qty for (iid, _), r in locked.items() if iid == str(item_id)), DEC0)
+
+
+def _apply_to_balances(movements: Iterable[StockMovement]) -> None:
+    """Add movements to their (item, location, batch) balance rows.
+
+    Called inside the transaction that created the movements. Rows are touched
+    in key order so two writers cannot lock the same rows in opposite order.
+    """
+    deltas: Dict[Tuple[str, str, str], Decimal] = defaultdict(lambda: DEC0)
+    batch_ids: Dict[Tuple[str, str, str], Optional[str]] = {}
+    for mv in movements:
+        key = (str(mv.item_id), str(mv.location_id), _batch_key(mv.batch_id))
+        deltas[key] += _as_decimal(mv.qty)
+        batch_ids[key] = mv.batch_id
+    now = dj_tz.now()
+    for key in sorted(deltas):
+        item_id, location_id, batch_key = key
+        delta = deltas[key]
+        lookup = {"item_id": item_id, "location_id": location_id, "batch_key": batch_key}
+        if StockBalance.objects.filter(**lookup).update(qty=F("qty") + delta, updated_at=now):
+            continue
+        try:
+            with transaction.atomic():
+                StockBalance.objects.create(**lookup, batch_id=batch_ids[key], qty=delta)
+        except IntegrityError:
+            # Created concurrently; the unique key makes the update land on it
+            StockBalance.objects.filter(**lookup).update(qty=F("qty") + delta, updated_at=now)
+
+
+def _sync_item_quantities(item_ids: Iterable[str], **extra) -> None:
+    """Refresh the cached ``InventoryItem.quantity`` from the balance table."""
+    ids = list(item_ids)
+    totals = get_current_stock(ids)
+    for iid in ids:
+        InventoryItem.objects.filter(id=iid).update(quantity=_q2(totals.get(iid, DEC0)), **extra)
+
+
 def _maybe_notify_low_stock(item_ids: Sequence[str]):
     """If any items are below configured low_stock_threshold, notify managers/admins.
 
@@ -53,23 +116,15 @@ def _maybe_notify_low_stock(item_ids: Sequence[str]):
         ids = list(item_ids or [])
         if not ids:
             return
-        # Load thresholds
-        settings = {str(r.item_id): r.low_stock_threshold for r in ReorderSetting.objects.filter(item_id__in=ids)}
-        if not settings:
-            return
-        totals = get_current_stock(list(settings.keys()))
-        low = [iid for iid, thr in settings.items() if _as_decimal(totals.get(iid, DEC0)) <= _as_decimal(thr)]
+        low = low_stock_settings(ids, threshold="low_stock_threshold")
         if not low:
             return
-        from .models import InventoryItem, AppUser, Notification
-        items = {str(x.id): x for x in InventoryItem.objects.filter(id__in=low)}
+        from .models import AppUser, Notification
         managers = list(AppUser.objects.filter(role__in=["manager", "admin"]))
-        for iid in low:
-            it = items.get(iid)
-            if not it:
-                continue
+        for rs in low:
+            it = rs.item
             title = f"Low stock: {it.name}"
-            msg = f"Item '{it.name}' is at or below threshold. Current: {float(totals.get(iid, DEC0) or 0)}"
+            msg = f"Item '{it.name}' is at or below threshold at {rs.location.name}. Current: {float(rs.on_hand or 0)}"
             for u in managers:
                 try:
                     n = Notification.objects.create(user=u, title=title, message=msg, type="warning")
@@ -87,17 +142,19 @@ def get_current_stock(
 ) -> Dict[str, Decimal]:
     """Return current stock per item as a dict {item_id: qty}.
 
-    - Sums StockMovement.qty filtered by item/location/effective_at<=as_of.
+    - Without as_of, reads the StockBalance rows of the items.
+    - With as_of, starts from the latest ledger checkpoint before it and adds
+      the movements it does not include (see inventory_checkpoints).
     - If location_id is None, sums across all locations.
     """
-    qs = StockMovement.objects.all()
+    if as_of:
+        return stock_as_of(as_of, "item_id", item_ids, location_id)
+    qs = StockBalance.objects.all()
     if item_ids:
         qs = qs.filter(item_id__in=list(item_ids))
     if location_id:
         qs = qs.filter(location_id=location_id)
-    if as_of:
-        qs = qs.filter(effective_at__lte=as_of)
-    agg = qs.values("item_id").annotate(total=Sum("qty"))
+    agg = qs.values("item_id").annotate(total=Sum("qty")).order_by()
     out: Dict[str, Decimal] = {}
     for row in agg:
         out[str(row["item_id"])] = _as_decimal(row["total"]) or DEC0
@@ -113,12 +170,12 @@ def get_batch_stock_by_location(
 
     Returns {batch_id: qty} considering movements until as_of.
     """
-    qs = StockMovement.objects.filter(item_id=item_id)
+    if as_of:
+        return stock_as_of(as_of, "batch_id", [item_id], location_id)
+    qs = StockBalance.objects.filter(item_id=item_id)
     if location_id:
         qs = qs.filter(location_id=location_id)
-    if as_of:
-        qs = qs.filter(effective_at__lte=as_of)
-    agg = qs.values("batch_id").annotate(total=Sum("qty"))
+    agg = qs.values("batch_id").annotate(total=Sum("qty")).order_by()
     res: Dict[str, Decimal] = {}
     for row in agg:
         bid = row["batch_id"]
@@ -141,13 +198,9 @@ def get_expiring_batches(
         qs = qs.filter(item_id__in=list(item_ids))
     # If location provided, keep batches that still have stock at location
     if location_id:
-        batch_ids_with_stock = (
-            StockMovement.objects.filter(location_id=location_id)
-            .values("batch_id")
-            .annotate(total=Sum("qty"))
-            .filter(total__gt=0)
-            .values_list("batch_id", flat=True)
-        )
+        batch_ids_with_stock = StockBalance.objects.filter(
+            location_id=location_id, batch__isnull=False, qty__gt=0
+        ).values_list("batch_id", flat=True)
         qs = qs.filter(id__in=batch_ids_with_stock)
     return list(qs.order_by("expiry_date", "created_at")[:500])
 
@@ -159,34 +212,46 @@ def get_stock_ledger(
     location_id: Optional[str] = None,
     include_batches: bool = True,
 ) -> List[StockMovement]:
-    qs = StockMovement.objects.filter(item_id=item_id)
-    if date_from:
-        qs = qs.filter(effective_at__gte=date_from)
-    if date_to:
-        qs = qs.filter(effective_at__lte=date_to)
-    if location_id:
-        qs = qs.filter(location_id=location_id)
-    # For performance limit; callers should paginate
-    qs = qs.order_by("effective_at", "recorded_at", "id")
-    return list(qs[:1000])
+    """All movements of an item in range, oldest first.
 
+    Loads the whole range; use ``inventory_ledger.ledger_page`` or
+    ``iter_ledger`` for long ranges.
+    """
+    return [mv for mv, _ in iter_ledger(item_id, date_from=date_from, date_to=date_to, location_id=location_id)]
 
-def get_low_stock(item_ids: Optional[Sequence[str]] = None) -> List[Tuple[InventoryItem, Decimal]]:
-    settings_qs = ReorderSetting.objects.select_related("item", "location").all()
+
+def low_stock_settings(
+    item_ids: Optional[Sequence[str]] = None,
+    threshold: str = "reorder_point",
+) -> List[ReorderSetting]:
+    """Reorder settings whose (item, location) stock is at or below ``threshold``.
+
+    One query: each setting is annotated with ``on_hand``, the sum of its
+    balance rows, and compared in SQL. ``threshold`` is ``reorder_point`` or
+    ``low_stock_threshold``.
+    """
+    if threshold not in {"reorder_point", "low_stock_threshold"}:
+        raise ValueError("Unknown threshold field")
+    on_hand = (
+        StockBalance.objects.filter(item_id=OuterRef("item_id"), location_id=OuterRef("location_id"))
+        .values("item_id")
+        .annotate(total=Sum("qty"))
+        .values("total")
+    )
+    qty_field = DecimalField(max_digits=14, decimal_places=4)
+    qs = (
+        ReorderSetting.objects.select_related("item", "location")
+        .annotate(on_hand=Coalesce(Subquery(on_hand, output_field=qty_field), Value(DEC0), output_field=qty_field))
+        .filter(on_hand__lte=F(threshold))
+    )
     if item_ids:
-        settings_qs = settings_qs.filter(item_id__in=list(item_ids))
-    # Aggregate current stock per (item, location)
-    pairs = list(settings_qs.values_list("item_id", "location_id", "reorder_point"))
-    by_item_loc: Dict[Tuple[str, str], Decimal] = {}
-    for item_id, location_id, _ in pairs:
-        stock_map = get_current_stock([item_id], location_id)
-        by_item_loc[(str(item_id), str(location_id))] = stock_map.get(str(item_id), DEC0)
-    low = []
-    for rs in settings_qs:
-        qty = by_item_loc.get((str(rs.item_id), str(rs.location_id)), DEC0)
-        if qty <= _as_decimal(rs.reorder_point):
-            low.append((rs.item, qty))
-    return low
+        qs = qs.filter(item_id__in=list(item_ids))
+    return list(qs.order_by("item__name", "location__code"))
+
+
+def get_low_stock(item_ids: Optional[Sequence[str]] = None) -> List[Tuple[InventoryItem, Decimal]]:
+    """``(item, stock at the setting's location)`` for every setting at or below its reorder point."""
+    return [(rs.item, _as_decimal(rs.on_hand)) for rs in low_stock_settings(item_ids)]
 
 
 def get_last_stock_update(item_id: str, location_id: Optional[str] = None) -> Optional[Tuple[datetime, datetime]]:
@@ -243,109 +308,194 @@ def record_receipt(
         reason="",
         idempotency_key=idempotency_key,
     )
+    _apply_to_balances([mv])
     # Update cached item quantity and last_restocked
     try:
-        total_map = get_current_stock([str(item.id)], location_id=None, as_of=None)
-        total = _q2(total_map.get(str(item.id), DEC0))
-        InventoryItem.objects.filter(id=item.id).update(quantity=total, last_restocked=now)
+        _sync_item_quantities([str(item.id)], last_restocked=now)
     except Exception:
         pass
     return mv
 
 
-def _fefo_batches_with_available(item_id: str, location_id: str) -> List[Tuple[Batch, Decimal]]:
-    # Compute available per batch at location
-    per_batch = get_batch_stock_by_location(item_id=item_id, location_id=location_id)
-    if not per_batch:
-        return []
-    batches = Batch.objects.filter(id__in=list(per_batch.keys())).all()
-    # Sort FEFO: expiry asc, then received_at asc, then id asc
-    annotated = []
-    for b in batches:
-        annotated.append((b, per_batch.get(str(b.id), DEC0)))
-    annotated.sort(key=lambda t: (
-        t[0].expiry_date or datetime.max.date(),
-        t[0].received_at or datetime.max.replace(tzinfo=dj_tz.utc),
-        str(t[0].id),
+@dataclass
+class OrderConsumption:
+    """Components one order takes from stock, for ``consume_for_orders``."""
+
+    order_id: str
+    components: Sequence[Tuple[InventoryItem, Decimal]]
+    idempotency_key: Optional[str] = None
+
+
+def _slice_key(idempotency_key: Optional[str], index: int) -> Optional[str]:
+    """Idempotency key of the ``index``-th movement written for one request."""
+    if not idempotency_key:
+        return None
+    digest = hashlib.sha1(idempotency_key.encode("utf-8")).hexdigest()
+    return f"{digest}#{index}"
+
+
+def _replayed(idempotency_key: Optional[str]) -> Optional[List[StockMovement]]:
+    """Movements already written for a key, in write order, or None."""
+    first = _slice_key(idempotency_key, 0)
+    if not first:
+        return None
+    prefix = first[:-1]
+    found = list(StockMovement.objects.filter(idempotency_key__startswith=prefix))
+    if not found:
+        return None
+    return sorted(found, key=lambda mv: int(mv.idempotency_key.rsplit("#", 1)[1]))
+
+
+def _fefo_order(batches: Iterable[Batch]) -> List[Batch]:
+    # Expiry asc, then received_at asc, then id asc
+    return sorted(batches, key=lambda b: (
+        b.expiry_date or datetime.max.date(),
+        b.received_at or datetime.max.replace(tzinfo=dt_timezone.utc),
+        str(b.id),
     ))
-    return annotated
+
+
+def _plan_fefo(
+    demands: Sequence[Tuple[InventoryItem, Decimal]],
+    locked: Dict[Tuple[str, str], StockBalance],
+    *,
+    fefo: bool = True,
+    shortage: str = "Insufficient stock for item {name}: need {need}, have {have}",
+) -> List[List[Tuple[Optional[Batch], Decimal]]]:
+    """Split each demand into ``(batch, qty)`` slices from locked balance rows.
+
+    Demands are planned in order against the same rows, so a later demand for
+    an item sees what earlier ones took. Batches are used FEFO; whatever they
+    cannot cover comes from unbatched stock. Raises ValueError (formatted from
+    ``shortage``) when an item's total at the location is too low.
+    """
+    batch_keys = {key for (_, key), row in locked.items() if key and row.qty > DEC0}
+    batches_by_item: Dict[str, List[Batch]] = defaultdict(list)
+    if fefo and batch_keys:
+        for batch in _fefo_order(Batch.objects.filter(id__in=list(batch_keys))):
+            batches_by_item[str(batch.item_id)].append(batch)
+
+    plans: List[List[Tuple[Optional[Batch], Decimal]]] = []
+    for item, req_qty in demands:
+        item_id = str(item.id)
+        remaining = _as_decimal(req_qty)
+        slices: List[Tuple[Optional[Batch], Decimal]] = []
+        plans.append(slices)
+        if remaining <= DEC0:
+            continue
+        avail_total = _locked_available(locked, item_id)
+        if remaining > avail_total:
+            raise ValueError(shortage.format(name=item.name, need=remaining, have=avail_total))
+        for batch in batches_by_item.get(item_id, []):
+            if remaining <= DEC0:
+                break
+            row = locked[(item_id, str(batch.id))]
+            take = min(remaining, row.qty)
+            if take <= DEC0:
+                continue
+            slices.append((batch, take))
+            row.qty -= take
+            remaining -= take
+        if remaining > DEC0:
+            # Not covered by batches: take it from unbatched stock
+            slices.append((None, remaining))
+            unbatched = locked.get((item_id, ""))
+            if unbatched is not None:
+                unbatched.qty -= remaining
+    return plans
+
+
+def _after_stock_change(item_ids: Iterable[str]) -> None:
+    # Refresh cached quantities and notify managers if any cross the low stock threshold
+    try:
+        ids = list(item_ids)
+        if ids:
+            _sync_item_quantities(ids)
+            _maybe_notify_low_stock(ids)
+    except Exception:
+        pass
 
 
 @transaction.atomic
-def consume_for_order(
+def consume_for_orders(
+    orders: Sequence[OrderConsumption],
     *,
-    order_id: str,
-    components: Sequence[Tuple[InventoryItem, Decimal]],
     location: Location,
     actor: Optional[AppUser] = None,
     effective_at: Optional[datetime] = None,
     fefo: bool = True,
-    idempotency_key: Optional[str] = None,
-) -> List[StockMovement]:
+) -> Dict[str, List[StockMovement]]:
+    """Consume the components of several orders at one location in one pass.
+
+    The balance rows of every item involved are locked and read once, FEFO
+    slices are planned in memory, and all movements are written with one
+    ``bulk_create``. If any order is short of stock nothing is written. An
+    order whose ``idempotency_key`` was already used returns its earlier
+    movements instead of consuming again.
+
+    Returns ``{order_id: [movements]}``.
+    """
     now = get_db_now()
     effective = effective_at or now
+    item_ids = sorted({str(item.id) for order in orders for item, _ in order.components})
+    locked = _lock_balances(item_ids, str(location.id))
+
+    result: Dict[str, List[StockMovement]] = {}
+    pending: List[OrderConsumption] = []
+    for order in orders:
+        replayed = _replayed(order.idempotency_key)
+        if replayed is not None:
+            result[str(order.order_id)] = replayed
+        else:
+            pending.append(order)
+
+    demands = [(order, item, qty) for order in pending for item, qty in order.components]
+    plans = _plan_fefo([(item, qty) for _, item, qty in demands], locked, fefo=fefo)
+
     movements: List[StockMovement] = []
+    written: Dict[str, int] = defaultdict(int)
     affected_ids = set()
-    for item, req_qty in components:
-        # Prevent over-consumption: ensure sufficient stock at location
-        avail_total = get_current_stock([str(item.id)], location_id=str(location.id)).get(str(item.id), DEC0)
-        remaining = _as_decimal(req_qty)
-        if remaining <= DEC0:
-            continue
-        if remaining > avail_total:
-            raise ValueError(f"Insufficient stock for item {item.name}: need {remaining}, have {avail_total}")
-        if fefo:
-            for batch, avail in _fefo_batches_with_available(str(item.id), str(location.id)):
-                if remaining <= DEC0:
-                    break
-                take = min(remaining, avail)
-                if take <= DEC0:
-                    continue
-                mv = StockMovement.objects.create(
-                    item=item,
-                    location=location,
-                    batch=batch,
-                    movement_type=StockMovement.TYPE_SALE,
-                    qty=-take,
-                    effective_at=effective,
-                    recorded_at=now,
-                    actor=actor,
-                    reference_type="order",
-                    reference_id=str(order_id),
-                    reason="Consumption for order",
-                )
-                movements.append(mv)
-                remaining -= take
-        # If still remaining (due to no batches), do not over-consume
-        if remaining > DEC0:
-            # At this point, since avail_total was enough, this path should be rare (unbatched stock)
-            mv = StockMovement.objects.create(
+    for (order, item, _), slices in zip(demands, plans):
+        order_movements = result.setdefault(str(order.order_id), [])
+        for batch, take in slices:
+            mv = StockMovement(
                 item=item,
                 location=location,
-                batch=None,
+                batch=batch,
                 movement_type=StockMovement.TYPE_SALE,
-                qty=-remaining,
+                qty=-take,
                 effective_at=effective,
                 recorded_at=now,
                 actor=actor,
                 reference_type="order",
-                reference_id=str(order_id),
-                reason="Consumption for order (unbatched)",
+                reference_id=str(order.order_id),
+                reason="Consumption for order" if batch else "Consumption for order (unbatched)",
+                idempotency_key=_slice_key(order.idempotency_key, written[str(order.order_id)]),
             )
+            written[str(order.order_id)] += 1
             movements.append(mv)
-        affected_ids.add(str(item.id))
-    # Update cached quantities for affected items
-    try:
-        if affected_ids:
-            smap = get_current_stock(list(affected_ids), location_id=None, as_of=None)
-            for iid in affected_ids:
-                total = _q2(smap.get(iid, DEC0))
-                InventoryItem.objects.filter(id=iid).update(quantity=total)
-            # Notify managers if any cross the low stock threshold
-            _maybe_notify_low_stock(list(affected_ids))
-    except Exception:
-        pass
-    return movements
+            order_movements.append(mv)
+        if slices:
+            affected_ids.add(str(item.id))
+    StockMovement.objects.bulk_create(movements, batch_size=500)
+    _apply_to_balances(movements)
+    _after_stock_change(affected_ids)
+    return result
+
+
+def consume_for_order(
+    *,
+    order_id: str,
+    components: Sequence[Tuple[InventoryItem, Decimal]],
+    location: Location,
+    actor: Optional[AppUser] = None,
+    effective_at: Optional[datetime] = None,
+    fefo: bool = True,
+    idempotency_key: Optional[str] = None,
+) -> List[StockMovement]:
+    order = OrderConsumption(order_id=str(order_id), components=components, idempotency_key=idempotency_key)
+    result = consume_for_orders([order], location=location, actor=actor, effective_at=effective_at, fefo=fefo)
+    return result.get(str(order_id), [])
 
 
 @transaction.atomic
@@ -363,7 +513,7 @@ def adjust_stock(
     if delta == DEC0:
         raise ValueError("delta_qty cannot be zero")
     # Prevent negative stock if adjustment would make it negative
-    current = get_current_stock([str(item.id)], str(location.id)).get(str(item.id), DEC0)
+    current = _locked_available(_lock_balances([str(item.id)], str(location.id)), str(item.id))
     if current + delta < DEC0:
         raise ValueError("Adjustment would result in negative stock")
     now = get_db_now()
@@ -381,11 +531,10 @@ def adjust_stock(
         reason=reason or "Manual adjustment",
         idempotency_key=idempotency_key,
     )
+    _apply_to_balances([mv])
     # Update cached item quantity (do not touch last_restocked for adjustments)
     try:
-        total_map = get_current_stock([str(item.id)], location_id=None, as_of=None)
-        total = _q2(total_map.get(str(item.id), DEC0))
-        InventoryItem.objects.filter(id=item.id).update(quantity=total)
+        _sync_item_quantities([str(item.id)])
         _maybe_notify_low_stock([str(item.id)])
     except Exception:
         pass
@@ -407,91 +556,97 @@ def transfer_stock(
     amount = _as_decimal(qty)
     if amount <= DEC0:
         raise ValueError("qty must be positive to transfer")
-    # Prevent over-transfer
-    avail_total = get_current_stock([str(item.id)], location_id=str(from_location.id)).get(str(item.id), DEC0)
-    if amount > avail_total:
-        raise ValueError(f"Insufficient stock to transfer: need {amount}, have {avail_total}")
+    locked = _lock_balances([str(item.id)], str(from_location.id))
+    replayed = _replayed(idempotency_key)
+    if replayed is not None:
+        return replayed
+    # Prevent over-transfer; batches leave the source FEFO
+    (slices,) = _plan_fefo(
+        [(item, amount)],
+        locked,
+        fefo=fefo,
+        shortage="Insufficient stock to transfer: need {need}, have {have}",
+    )
     now = get_db_now()
     effective = effective_at or now
+    reference_id = f"{from_location.id}->{to_location.id}"
     movements: List[StockMovement] = []
-    remaining = amount
-    # Transfer by batches using FEFO from source
-    for batch, avail in _fefo_batches_with_available(str(item.id), str(from_location.id)):
-        if remaining <= DEC0:
-            break
-        take = min(remaining, avail)
-        if take <= DEC0:
-            continue
-        # Out from source
-        mv_out = StockMovement.objects.create(
-            item=item,
-            location=from_location,
-            batch=batch,
-            movement_type=StockMovement.TYPE_TRANSFER_OUT,
-            qty=-take,
-            effective_at=effective,
-            recorded_at=now,
-            actor=actor,
-            reference_type="transfer",
-            reference_id=f"{from_location.id}->{to_location.id}",
-            reason="Transfer out",
-        )
-        # In to destination
-        mv_in = StockMovement.objects.create(
-            item=item,
-            location=to_location,
-            batch=batch,
-            movement_type=StockMovement.TYPE_TRANSFER_IN,
-            qty=take,
-            effective_at=effective,
-            recorded_at=now,
-            actor=actor,
-            reference_type="transfer",
-            reference_id=f"{from_location.id}->{to_location.id}",
-            reason="Transfer in",
-        )
-        movements.extend([mv_out, mv_in])
-        remaining -= take
-    # If still remaining, transfer unbatched
-    if remaining > DEC0:
-        mv_out = StockMovement.objects.create(
-            item=item,
-            location=from_location,
-            batch=None,
-            movement_type=StockMovement.TYPE_TRANSFER_OUT,
-            qty=-remaining,
-            effective_at=effective,
-            recorded_at=now,
-            actor=actor,
-            reference_type="transfer",
-            reference_id=f"{from_location.id}->{to_location.id}",
-            reason="Transfer out (unbatched)",
-        )
-        mv_in = StockMovement.objects.create(
-            item=item,
-            location=to_location,
-            batch=None,
-            movement_type=StockMovement.TYPE_TRANSFER_IN,
-            qty=remaining,
-            effective_at=effective,
-            recorded_at=now,
-            actor=actor,
-            reference_type="transfer",
-            reference_id=f"{from_location.id}->{to_location.id}",
-            reason="Transfer in (unbatched)",
-        )
-        movements.extend([mv_out, mv_in])
-    # Update cached item quantity (net stays the same globally, but ensure sync)
-    try:
-        total_map = get_current_stock([str(item.id)], location_id=None, as_of=None)
-        total = _q2(total_map.get(str(item.id), DEC0))
-        InventoryItem.objects.filter(id=item.id).update(quantity=total)
-        _maybe_notify_low_stock([str(item.id)])
-    except Exception:
-        pass
+    for batch, take in slices:
+        suffix = "" if batch else " (unbatched)"
+        for location, movement_type, signed, reason in (
+            (from_location, StockMovement.TYPE_TRANSFER_OUT, -take, "Transfer out"),
+            (to_location, StockMovement.TYPE_TRANSFER_IN, take, "Transfer in"),
+        ):
+            movements.append(StockMovement(
+                item=item,
+                location=location,
+                batch=batch,
+                movement_type=movement_type,
+                qty=signed,
+                effective_at=effective,
+                recorded_at=now,
+                actor=actor,
+                reference_type="transfer",
+                reference_id=reference_id,
+                reason=reason + suffix,
+                idempotency_key=_slice_key(idempotency_key, len(movements)),
+            ))
+    StockMovement.objects.bulk_create(movements)
+    _apply_to_balances(movements)
+    # Net stock is unchanged globally, but keep the cached quantity in sync
+    _after_stock_change([str(item.id)])
     return movements
 
 
+def verify_balances(item_ids: Optional[Sequence[str]] = None, fix: bool = False) -> List[dict]:
+    """Compare StockBalance with the ledger; return the rows that drifted.
+
+    With ``fix`` the balance rows (and cached item quantities) are rewritten
+    from the ledger under row locks.
+    """
+    ledger = StockMovement.objects.all()
+    balances = StockBalance.objects.all()
+    if item_ids:
+        ledger = ledger.filter(item_id__in=list(item_ids))
+        balances = balances.filter(item_id__in=list(item_ids))
+    expected: Dict[Tuple[str, str, str], Decimal] = defaultdict(lambda: DEC0)
+    batch_ids: Dict[Tuple[str, str, str], Optional[str]] = {}
+    rows = ledger.values("item_id", "location_id", "batch_id").annotate(total=Sum("qty")).order_by()
+    for row in rows.iterator(chunk_size=1000):
+        key = (str(row["item_id"]), str(row["location_id"]), _batch_key(row["batch_id"]))
+        expected[key] += _as_decimal(row["total"])
+        batch_ids[key] = row["batch_id"]
+    actual = {
+        (str(r["item_id"]), str(r["location_id"]), r["batch_key"]): _as_decimal(r["qty"])
+        for r in balances.values("item_id", "location_id", "batch_key", "qty").iterator(chunk_size=1000)
+    }
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        want, have = expected.get(key, DEC0), actual.get(key, DEC0)
+        if want != have:
+            drift.append({
+                "itemId": key[0],
+                "locationId": key[1],
+                "batchId": key[2] or None,
+                "ledger": want,
+                "balance": have,
+                "diff": have - want,
+            })
+    if fix and drift:
+        with transaction.atomic():
+            for row in drift:
+                key = (row["itemId"], row["locationId"], row["batchId"] or "")
+                lookup = {"item_id": key[0], "location_id": key[1], "batch_key": key[2]}
+                balance = StockBalance.objects.select_for_update().filter(**lookup).first()
+                if balance is None:
+                    StockBalance.objects.create(**lookup, batch_id=batch_ids.get(key), qty=row["ledger"])
+                else:
+                    balance.qty = row["ledger"]
+                    balance.save(update_fields=["qty", "updated_at"])
+            _sync_item_quantities({row["itemId"] for row in drift})
+    return drift
+
+
 __all__ = [
     "get_db_now",
     "get_current_stock",
@@ -499,11 +654,15 @@ __all__ = [
     "get_expiring_batches",
     "get_stock_ledger",
     "get_low_stock",
+    "low_stock_settings",
     "get_last_stock_update",
     "record_receipt",
+    "OrderConsumption",
     "consume_for_order",
+    "consume_for_orders",
     "adjust_stock",
     "transfer_stock",
+    "verify_balances",
 ]
 
 
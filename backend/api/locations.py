@@ -0,0 +1,66 @@
+"""Inventory locations by code, cached per process.
+
+Stock endpoints resolve a location code on every call. ``get_location``
+answers from a process-local cache, and on a miss it uses ``get_or_create``
+on the unique ``code``. Concurrent first requests for a new code therefore
+end up with the same row, not duplicates.
+
+A location enters the cache only once the transaction that read or created
+it commits, so a rolled-back create is never served. ``Location.save`` and
+``delete`` drop the entry in this process. Other processes pick up changes
+after ``LOCATION_CACHE_SECONDS`` (default 300). Queryset ``update()`` bypasses
+``save``; call ``forget_location`` after one.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+DEFAULT_LOCATION_CODE = "MAIN"
+
+_cache: Dict[str, Tuple[object, float]] = {}
+_lock = threading.Lock()
+
+
+def _ttl() -> float:
+    return max(0.0, float(getattr(settings, "LOCATION_CACHE_SECONDS", 300)))
+
+
+def _remember(location) -> None:
+    with _lock:
+        _cache[location.code] = (location, time.monotonic() + _ttl())
+
+
+def get_location(code: Optional[str] = None, name: Optional[str] = None):
+    """The location with ``code`` (default MAIN), creating it if needed."""
+    from .models import Location
+
+    code = (code or "").strip() or DEFAULT_LOCATION_CODE
+    hit = _cache.get(code)
+    if hit is not None and hit[1] > time.monotonic():
+        return hit[0]
+    location, _ = Location.objects.get_or_create(
+        code=code,
+        defaults={"name": name or ("Main" if code == DEFAULT_LOCATION_CODE else code.title())},
+    )
+    transaction.on_commit(lambda: _remember(location))
+    return location
+
+
+def forget_location(code: Optional[str] = None, location_id=None) -> None:
+    """Drop cached entries by code and/or id (all entries when neither is given)."""
+    with _lock:
+        if code is None and location_id is None:
+            _cache.clear()
+            return
+        for key, (location, _) in list(_cache.items()):
+            if key == code or (location_id is not None and str(location.id) == str(location_id)):
+                _cache.pop(key, None)
+
+
+__all__ = ["DEFAULT_LOCATION_CODE", "forget_location", "get_location"]
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.realtime_bench import run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark websocket event delivery with simulated KDS/POS clients on one process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=100, help="Simulated websocket clients (default: 100)")
+        parser.add_argument("--rate", type=float, default=200.0, help="Published events per second (default: 200)")
+        parser.add_argument("--events", type=int, default=2000, help="Total events to publish (default: 2000)")
+        parser.add_argument("--layer", choices=["memory", "redis"], default="memory", help="Channel layer backend")
+        parser.add_argument("--redis-url", default=None, help="Redis URL for --layer redis (default: redis://127.0.0.1:6379/15)")
+        parser.add_argument("--capacity", type=int, default=100, help="Channel layer per-channel capacity (default: 100)")
+        parser.add_argument("--topics", action="store_true", help="Each client subscribes to one station instead of the firehose")
+        parser.add_argument("--batch-ms", type=int, default=None, help="Override WS_BATCH_INTERVAL_MS (0 disables batching)")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            report = run_benchmark(
+                clients=options["clients"],
+                rate=options["rate"],
+                events=options["events"],
+                layer=options["layer"],
+                redis_url=options.get("redis_url"),
+                capacity=options["capacity"],
+                topics=options["topics"],
+                batch_ms=options.get("batch_ms"),
+            )
+        except Exception as exc:
+            raise CommandError(f"Benchmark failed: {exc}")
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        lat = report["latencyMs"]
+        self.stdout.write(
+            f"{report['clients']} clients on {report['layer']} layer, "
+            f"{report['events']} events at {report['achievedRate']}/s (target {report['targetRate']}/s)"
+        )
+        self.stdout.write(
+            f"Deliveries: {report['delivered']}/{report['deliveriesExpected']} "
+            f"(coalesced {report['coalesced']}, dropped {report['dropped']}, slow closes {report['slowClosed']}, "
+            f"max queue depth {report['maxQueueDepth']})"
+        )
+        self.stdout.write(f"Latency ms: p50={lat['p50']} p90={lat['p90']} p99={lat['p99']} max={lat['max']}")
+        self.stdout.write(
+            f"CPU: {report['cpuMsPer1kEvents']} ms per 1k events, {report['cpuMsPer1kDeliveries']} ms per 1k deliveries"
+        )
+        style = self.style.SUCCESS if report["dropped"] == 0 else self.style.WARNING
+        self.stdout.write(style("No messages dropped" if report["dropped"] == 0 else f"{report['dropped']} messages dropped"))
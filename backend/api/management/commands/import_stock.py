@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.inventory_import import ImportValidationError, import_stock, parse_lines, validate_lines
+
+
+class Command(BaseCommand):
+    help = "Import goods receipts and stock adjustments from a CSV or JSON file in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file of import lines")
+        parser.add_argument("--format", choices=["csv", "json"], help="File format (default: from the extension)")
+        parser.add_argument("--location", help="Location code for lines without one (default: MAIN)")
+        parser.add_argument("--supplier", default="", help="Supplier for receipt lines without one")
+        parser.add_argument("--reference", default="", help="Goods receipt / document reference")
+        parser.add_argument("--idempotency-key", dest="idempotency_key", help="Skip the import if this key was already used")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without writing anything")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"No such file: {path}")
+        fmt = options.get("format") or ("json" if path.suffix.lower() == ".json" else "csv")
+        try:
+            rows = parse_lines(path.read_bytes(), fmt)
+            lines = validate_lines(rows, location=options.get("location"), supplier=options.get("supplier") or "")
+        except ImportValidationError as exc:
+            for error in exc.errors:
+                self.stderr.write(f"line {error['line']}: {error['message']}")
+            raise CommandError(str(exc))
+        except ValueError as exc:
+            raise CommandError(f"Could not read {path}: {exc}")
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"{len(lines)} lines are valid"))
+            return
+        try:
+            summary = import_stock(lines, reference=options["reference"], idempotency_key=options.get("idempotency_key"))
+        except ImportValidationError as exc:
+            for error in exc.errors:
+                self.stderr.write(f"line {error['line']}: {error['message']}")
+            raise CommandError(str(exc))
+        verb = "Already imported" if summary["replayed"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['lines']} lines: {summary['receipts']} receipts, {summary['adjustments']} adjustments, "
+            f"{summary['batches']} batches across {len(summary['itemIds'])} items"
+        ))
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.report_rollups import rebuild, rebuild_customers
+
+
+class Command(BaseCommand):
+    help = "Rebuild hourly/daily sales rollups from orders and payments for a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="First local date to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="date_to", help="Last local date to rebuild, inclusive (default: today)")
+        parser.add_argument("--days", type=int, default=None, help="Rebuild the last N days instead of --from")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows per batch (default: 500)")
+        parser.add_argument("--customers", action="store_true", help="Also regenerate the customer summary table")
+
+    def handle(self, *args, **options):
+        if options["customers"]:
+            count = rebuild_customers(chunk_size=max(1, options["chunk_size"]))
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt customer summary: {count} customers"))
+            if not (options.get("date_from") or options.get("days")):
+                return
+        tz = timezone.get_current_timezone()
+        try:
+            last = datetime.strptime(options["date_to"], "%Y-%m-%d").date() if options.get("date_to") else timezone.localdate()
+            if options.get("days"):
+                first = last - timedelta(days=max(1, options["days"]) - 1)
+            elif options.get("date_from"):
+                first = datetime.strptime(options["date_from"], "%Y-%m-%d").date()
+            else:
+                raise CommandError("Pass --from YYYY-MM-DD, --days N or --customers")
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+        if first > last:
+            raise CommandError("--from must not be after --to")
+
+        # Rebuild one day at a time so each transaction stays small
+        totals = {"orders": 0, "payments": 0, "rows": 0}
+        day = first
+        while day <= last:
+            start = timezone.make_aware(datetime.combine(day, datetime.min.time()), tz)
+            result = rebuild(start, start + timedelta(days=1), chunk_size=max(1, options["chunk_size"]))
+            for key in totals:
+                totals[key] += result[key]
+            self.stdout.write(f"{day}: {result['orders']} orders, {result['payments']} payments, {result['rows']} rows")
+            day += timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {first}..{last}: {totals['orders']} orders, {totals['payments']} payments, {totals['rows']} rollup rows"
+        ))
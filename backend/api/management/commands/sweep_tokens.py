@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.utils_token_sweep import DEFAULT_CHUNK_SIZE, sweep_expired_credentials
+
+
+class Command(BaseCommand):
+    help = "Delete expired, consumed or revoked refresh/reset tokens and OTP codes in small chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows deleted per statement")
+        parser.add_argument("--max-chunks", type=int, default=None, help="Max chunks per table (default: until clean)")
+
+    def handle(self, *args, **options):
+        counts = sweep_expired_credentials(
+            chunk_size=int(options.get("chunk_size") or DEFAULT_CHUNK_SIZE),
+            max_chunks=options.get("max_chunks"),
+        )
+        for table, n in counts.items():
+            self.stdout.write(f"{table}: {n} deleted")
+        self.stdout.write(self.style.SUCCESS(f"Swept {sum(counts.values())} credential rows"))
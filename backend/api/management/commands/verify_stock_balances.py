@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.inventory_services import verify_balances
+
+
+class Command(BaseCommand):
+    help = "Recompute stock balances from the movement ledger and report (or fix) any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--item", action="append", dest="items", help="Only check this item id (repeatable)")
+        parser.add_argument("--fix", action="store_true", help="Rewrite drifted balance rows from the ledger")
+
+    def handle(self, *args, **options):
+        drift = verify_balances(item_ids=options.get("items"), fix=options["fix"])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Stock balances match the ledger"))
+            return
+        for row in drift:
+            self.stdout.write(
+                f"item={row['itemId']} location={row['locationId']} batch={row['batchId'] or '-'} "
+                f"ledger={row['ledger']} balance={row['balance']} diff={row['diff']}"
+            )
+        if options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted balance rows"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} balance rows drifted; rerun with --fix to repair"))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0052_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginotp',
+            index=models.Index(fields=['expires_at'], name='login_otp_expires_0ba92f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['user', 'code_hash'], name='password_re_user_id_589fca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['expires_at'], name='password_re_expires_b19f45_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refreshtoken',
+            index=models.Index(fields=['expires_at'], name='refresh_tok_expires_3ecf55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resettoken',
+            index=models.Index(fields=['user', 'code_hash'], name='reset_token_user_id_55f684_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resettoken',
+            index=models.Index(fields=['expires_at'], name='reset_token_expires_35daa8_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0054_order_event_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRollupEntry',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup_entry', serialize=False, to='api.order')),
+                ('bucket_time', models.DateTimeField()),
+                ('lines', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'order_rollup_entry',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(max_length=8)),
+                ('bucket', models.DateTimeField()),
+                ('dimension', models.CharField(max_length=24)),
+                ('key', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'sales_rollup',
+                'constraints': [models.UniqueConstraint(fields=('grain', 'dimension', 'bucket', 'key'), name='sales_rollup_unique_bucket_key')],
+            },
+        ),
+    ]
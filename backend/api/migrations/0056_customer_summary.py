@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce, Lower, Trim
+
+
+def backfill_customers(apps, schema_editor):
+    PaymentTransaction = apps.get_model('api', 'PaymentTransaction')
+    CustomerSummary = apps.get_model('api', 'CustomerSummary')
+    zero = Decimal('0')
+    completed = Q(status='completed')
+    # Refunds of payments that were completed (or refunded before the prior status was kept)
+    refunded = Q(status='refunded') & (Q(meta__refundedFrom='completed') | Q(meta__refundedFrom__isnull=True))
+    rows = (
+        PaymentTransaction.objects.filter(completed | refunded)
+        .exclude(customer='')
+        .annotate(_key=Lower(Trim('customer')))
+        .exclude(_key='')
+        .values('_key')
+        .annotate(
+            name=Max('customer'),
+            total_spent=Coalesce(Sum('amount', filter=completed), zero),
+            payment_count=Count('id', filter=completed),
+            refunded_amount=Coalesce(Sum('amount', filter=refunded), zero),
+            refund_count=Count('id', filter=refunded),
+            first_visit=Min('created_at'),
+            last_visit=Max('created_at'),
+        )
+        .order_by()
+    )
+    CustomerSummary.objects.bulk_create(
+        [
+            CustomerSummary(
+                key=row['_key'][:255],
+                name=(row['name'] or '').strip()[:255],
+                total_spent=row['total_spent'],
+                payment_count=row['payment_count'],
+                refunded_amount=row['refunded_amount'],
+                refund_count=row['refund_count'],
+                first_visit=row['first_visit'],
+                last_visit=row['last_visit'],
+            )
+            for row in rows.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0055_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refund_count', models.IntegerField(default=0)),
+                ('first_visit', models.DateTimeField(blank=True, null=True)),
+                ('last_visit', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'customer_summary',
+                'indexes': [models.Index(fields=['total_spent'], name='customer_summary_total_idx'), models.Index(fields=['last_visit'], name='customer_summary_last_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_customers, migrations.RunPython.noop),
+    ]
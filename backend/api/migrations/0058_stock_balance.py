@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_balances(apps, schema_editor):
+    StockMovement = apps.get_model('api', 'StockMovement')
+    StockBalance = apps.get_model('api', 'StockBalance')
+    rows = (
+        StockMovement.objects.values('item_id', 'location_id', 'batch_id')
+        .annotate(total=Sum('qty'))
+        .order_by()
+    )
+    StockBalance.objects.bulk_create(
+        [
+            StockBalance(
+                item_id=row['item_id'],
+                location_id=row['location_id'],
+                batch_id=row['batch_id'],
+                batch_key=str(row['batch_id']) if row['batch_id'] else '',
+                qty=row['total'] or 0,
+            )
+            for row in rows.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0057_report_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_key', models.CharField(blank=True, default='', max_length=36)),
+                ('qty', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='balances', to='api.batch')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='api.inventoryitem')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='api.location')),
+            ],
+            options={
+                'db_table': 'inv_stock_balance',
+                'constraints': [models.UniqueConstraint(fields=('item', 'location', 'batch_key'), name='uniq_stock_balance_key')],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0058_stock_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+                ('cutoff_at', models.DateTimeField()),
+                ('line_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'inv_ledger_checkpoint',
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerCheckpointLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_key', models.CharField(blank=True, default='', max_length=36)),
+                ('qty', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.batch')),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='api.ledgercheckpoint')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.inventoryitem')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.location')),
+            ],
+            options={
+                'db_table': 'inv_ledger_checkpoint_line',
+                'constraints': [models.UniqueConstraint(fields=('checkpoint', 'item', 'location', 'batch_key'), name='uniq_checkpoint_line_key')],
+            },
+        ),
+    ]
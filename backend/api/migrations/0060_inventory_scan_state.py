@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0059_ledger_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryScanState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'inv_scan_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('subject', models.CharField(max_length=80)),
+                ('state', models.CharField(max_length=16)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'inv_alert',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'subject'), name='uniq_inventory_alert_subject')],
+            },
+        ),
+    ]
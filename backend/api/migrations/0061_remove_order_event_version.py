@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0060_inventory_scan_state'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='event_version',
+        ),
+    ]
@@ -162,6 +162,7 @@ class RefreshToken(models.Model):
         db_table = "refresh_token"
         indexes = [
             models.Index(fields=["user", "expires_at"]),
+            models.Index(fields=["expires_at"]),
         ]
 
     @property
@@ -190,6 +191,8 @@ class ResetToken(models.Model):
         db_table = "reset_token"
         indexes = [
             models.Index(fields=["user", "expires_at"]),
+            models.Index(fields=["user", "code_hash"]),
+            models.Index(fields=["expires_at"]),
         ]
 
     @property
@@ -218,6 +221,8 @@ class PasswordResetCode(models.Model):
         db_table = "password_reset_code"
         indexes = [
             models.Index(fields=["user", "expires_at", "used"]),
+            models.Index(fields=["user", "code_hash"]),
+            models.Index(fields=["expires_at"]),
         ]
 
     @property
@@ -245,6 +250,7 @@ class LoginOTP(models.Model):
         db_table = "login_otp"
         indexes = [
             models.Index(fields=["user", "expires_at", "consumed_at"]),
+            models.Index(fields=["expires_at"]),
         ]
 
     @property
@@ -526,6 +532,39 @@ class NotificationOutbox(models.Model):
         ]
 
 
+class EmailOutbox(models.Model):
+    """Queued transactional email with delivery status.
+
+    Bodies are cleared once delivered since they may carry one-time codes.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    kind = models.CharField(max_length=64, blank=True)
+    to_emails = models.JSONField(default=list, blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=16, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "email_outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+
 # -----------------------------
 # Payments
 # -----------------------------
@@ -743,6 +782,17 @@ class Location(models.Model):
     def __str__(self) -> str:
         return f"{self.code}: {self.name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .locations import forget_location
+        # By id too: the code itself may have changed
+        forget_location(self.code, self.id)
+
+    def delete(self, *args, **kwargs):
+        from .locations import forget_location
+        forget_location(self.code, self.id)
+        return super().delete(*args, **kwargs)
+
 
 class Batch(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
@@ -809,6 +859,64 @@ class StockMovement(models.Model):
         ]
 
 
+class StockBalance(models.Model):
+    """Running stock per (item, location, batch), kept in step with ``StockMovement``.
+
+    Every movement updates its row in the same transaction, so current stock is
+    a keyed lookup instead of a ledger sum. ``batch_key`` is the batch id, or
+    "" for unbatched stock, so the unique key also holds for unbatched rows
+    (MySQL never treats NULLs as equal). ``verify_stock_balances`` checks the
+    table against the ledger.
+    """
+
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="balances")
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="balances")
+    batch = models.ForeignKey(Batch, on_delete=models.SET_NULL, null=True, blank=True, related_name="balances")
+    batch_key = models.CharField(max_length=36, blank=True, default="")
+    qty = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "inv_stock_balance"
+        constraints = [
+            models.UniqueConstraint(fields=["item", "location", "batch_key"], name="uniq_stock_balance_key"),
+        ]
+
+
+class LedgerCheckpoint(models.Model):
+    """Stock per (item, location, batch) as of ``taken_at`` (see ``api.inventory_checkpoints``).
+
+    A checkpoint holds the movements with ``effective_at <= taken_at`` that were
+    recorded by ``cutoff_at``. Historical reads add the remaining movements on
+    top of the latest checkpoint instead of summing the whole ledger.
+    """
+
+    taken_at = models.DateTimeField(unique=True)
+    cutoff_at = models.DateTimeField()
+    line_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "inv_ledger_checkpoint"
+
+
+class LedgerCheckpointLine(models.Model):
+    checkpoint = models.ForeignKey(LedgerCheckpoint, on_delete=models.CASCADE, related_name="lines")
+    item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="+")
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="+")
+    batch = models.ForeignKey(Batch, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    batch_key = models.CharField(max_length=36, blank=True, default="")
+    qty = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+
+    class Meta:
+        db_table = "inv_ledger_checkpoint_line"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checkpoint", "item", "location", "batch_key"], name="uniq_checkpoint_line_key"
+            ),
+        ]
+
+
 class ReorderSetting(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name="reorder_settings")
@@ -827,6 +935,40 @@ class ReorderSetting(models.Model):
         ]
 
 
+class InventoryScanState(models.Model):
+    """Watermark of the last ``inventory_scan`` run (one row per scan name)."""
+
+    name = models.CharField(max_length=64, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "inv_scan_state"
+
+
+class InventoryAlert(models.Model):
+    """Last state the inventory scan reported for a subject.
+
+    ``subject`` is ``"<item_id>:<location_id>"`` for low stock and the batch id
+    for expiry. Managers are notified only when ``state`` changes to one that
+    needs attention.
+    """
+
+    KIND_LOW_STOCK = "low_stock"
+    KIND_EXPIRY = "expiry"
+
+    kind = models.CharField(max_length=16)
+    subject = models.CharField(max_length=80)
+    state = models.CharField(max_length=16)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "inv_alert"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "subject"], name="uniq_inventory_alert_subject"),
+        ]
+
+
 # -----------------------------
 # Menu Management
 # -----------------------------
@@ -1237,3 +1379,121 @@ class CashEntry(models.Model):
     class Meta:
         db_table = "cash_entry"
         indexes = [models.Index(fields=["session", "created_at"]) ]
+
+
+# -----------------------------
+# Reporting rollups
+# -----------------------------
+
+
+class SalesRollup(models.Model):
+    """Pre-aggregated sales per hour or local day, maintained incrementally.
+
+    Order dimensions (channel, category, menu item) count completed orders in
+    the bucket of ``Order.created_at``. Payment dimensions count payments in
+    the bucket of ``PaymentTransaction.created_at``; a refund moves its amount
+    from ``payment_method`` to ``refund_method``.
+    """
+
+    GRAIN_HOUR = "hour"
+    GRAIN_DAY = "day"
+    DIM_CHANNEL = "channel"
+    DIM_CATEGORY = "category"
+    DIM_MENU_ITEM = "menu_item"
+    DIM_PAYMENT_METHOD = "payment_method"
+    DIM_REFUND_METHOD = "refund_method"
+
+    grain = models.CharField(max_length=8)
+    bucket = models.DateTimeField()
+    dimension = models.CharField(max_length=24)
+    key = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "sales_rollup"
+        constraints = [
+            models.UniqueConstraint(fields=["grain", "dimension", "bucket", "key"], name="sales_rollup_unique_bucket_key"),
+        ]
+
+
+class OrderRollupEntry(models.Model):
+    """What a completed order added to the rollups, so it can be reverted exactly."""
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name="rollup_entry")
+    bucket_time = models.DateTimeField()
+    lines = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "order_rollup_entry"
+
+
+class CustomerSummary(models.Model):
+    """Lifetime payment totals per customer name, kept current by the payment path.
+
+    ``key`` is the trimmed, lower-cased ``PaymentTransaction.customer``.
+    Refunding a completed payment moves it from ``total_spent`` to
+    ``refunded_amount``. ``rebuild_rollups --customers`` regenerates the table.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refund_count = models.IntegerField(default=0)
+    first_visit = models.DateTimeField(null=True, blank=True)
+    last_visit = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "customer_summary"
+        indexes = [
+            models.Index(fields=["total_spent"], name="customer_summary_total_idx"),
+            models.Index(fields=["last_visit"], name="customer_summary_last_idx"),
+        ]
+
+
+class ReportJob(models.Model):
+    """A long report computed off the request path (see ``api.report_jobs``).
+
+    ``spec_hash`` identifies the normalized spec, so concurrent submissions of
+    the same report share one row. Results are kept until ``expires_at``.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict, blank=True)
+    spec_hash = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress_done = models.IntegerField(default=0)
+    progress_total = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(AppUser, on_delete=models.SET_NULL, null=True, blank=True, related_name="report_jobs")
+    # Everyone who submitted this spec while it was pending; told over websocket when it finishes
+    notify_user_ids = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "report_job"
+        indexes = [
+            models.Index(fields=["expires_at"], name="report_job_expires_idx"),
+        ]
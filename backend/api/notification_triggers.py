@@ -526,24 +526,18 @@ def trigger_daily_sales_summary():
     Should be run daily via Celery beat at end of day.
     """
     try:
-        from .models import Order
-        from django.db.models import Sum, Count
-
-        today = timezone.now().date()
-        today_start = timezone.datetime.combine(today, timezone.datetime.min.time())
-        today_end = timezone.datetime.combine(today, timezone.datetime.max.time())
-
-        # Get today's stats
-        stats = Order.objects.filter(
-            created_at__range=(today_start, today_end),
-            status='completed'
-        ).aggregate(
-            total_sales=Sum('total_amount'),
-            order_count=Count('id')
-        )
-
-        total_sales = stats['total_sales'] or 0
-        order_count = stats['order_count'] or 0
+        from .models import SalesRollup
+        from .report_buckets import local_midnight
+        from .report_rollups import window_totals
+
+        now = timezone.now()
+        today = timezone.localdate(now)
+        today_start = local_midnight(now)
+
+        # Completed orders today, read from the daily rollup row per channel
+        window = {"today": (today_start, now)}
+        total_sales = window_totals(SalesRollup.DIM_CHANNEL, window)["today"]
+        order_count = window_totals(SalesRollup.DIM_CHANNEL, window, field="count")["today"]
 
         # Notify all admins and managers
         for user_id in get_admin_users():
@@ -0,0 +1,196 @@
+"""Compact, versioned patches for realtime order events.
+
+Each published order event takes the next version from a per-order counter in
+the shared cache: one ``INCR`` per event, with no database write or row lock,
+so publishing inside a caller's transaction costs nothing there. A lost counter
+restarts from the clock (as the report cache generation does), so versions
+only move forward. The process keeps the last compact snapshot it published
+per order; when it also published the immediately preceding version, the event
+carries a JSON Patch (RFC 6902 subset: add/replace/remove) against that
+snapshot instead of the whole order:
+
+    {"id": "<order id>", "version": 7, "baseVersion": 6, "ops": [...]}
+
+Otherwise (first event in this process, another worker published the previous
+version) it carries ``"snapshot"`` with the compact order. On the channel layer
+that snapshot is left out (``to_channel``) because the message already holds
+the full order; consumers rebuild it (``from_channel``). A client whose
+local version differs from ``baseVersion`` requests a full snapshot over the
+socket (``{"action": "snapshot", "orderId": ...}``).
+
+Compact snapshots omit fields that change on every read (``ageSeconds``,
+``secondsInState``) and the duplicated ``autoAdvance`` block; the same paths
+exist in the full order, so patches apply to either form.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+MAX_TRACKED_ORDERS = 2000
+VOLATILE_KEYS = {"ageSeconds", "secondsInState", "autoAdvance"}
+
+_last_published: "OrderedDict[str, tuple[int, dict]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def compact_order(order: dict) -> dict:
+    data = {k: v for k, v in order.items() if k not in VOLATILE_KEYS}
+    if isinstance(data.get("items"), list):
+        data["items"] = [
+            {k: v for k, v in item.items() if k not in VOLATILE_KEYS} if isinstance(item, dict) else item
+            for item in data["items"]
+        ]
+    return data
+
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _same_ids(old: list, new: list) -> bool:
+    return len(old) == len(new) and all(
+        isinstance(a, dict) and isinstance(b, dict) and a.get("id") == b.get("id")
+        for a, b in zip(old, new)
+    )
+
+
+def diff(old: Any, new: Any, path: str = "") -> list[dict]:
+    """Minimal JSON Patch turning ``old`` into ``new``."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old.keys() - new.keys():
+            ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            sub = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": sub, "value": value})
+            elif old[key] != value:
+                ops.extend(diff(old[key], value, sub))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and _same_ids(old, new):
+        ops = []
+        for idx, (a, b) in enumerate(zip(old, new)):
+            if a != b:
+                ops.extend(diff(a, b, f"{path}/{idx}"))
+        return ops
+    if old == new:
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(doc: Any, ops: list[dict]) -> Any:
+    """Apply ops produced by ``diff`` (used by tests and server-side replay)."""
+    for op in ops:
+        parts = [p.replace("~1", "/").replace("~0", "~") for p in op["path"].split("/")[1:]]
+        if not parts:
+            doc = op.get("value")
+            continue
+        target = doc
+        for part in parts[:-1]:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        last = parts[-1]
+        if isinstance(target, list):
+            last = int(last)
+        if op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
+
+
+def _version_key(order_id: str) -> str:
+    return f"orders:event-version:{order_id}"
+
+
+def _seed_version(order_id: str) -> None:
+    # Start from the clock so a lost counter cannot repeat a version a client holds
+    timeout = max(1, int(getattr(settings, "ORDER_PATCH_VERSION_SECONDS", 86400)))
+    cache.add(_version_key(order_id), time.time_ns() // 1000, timeout=timeout)
+
+
+def _next_version(order_id: str) -> int:
+    try:
+        return int(cache.incr(_version_key(order_id)))
+    except ValueError:
+        _seed_version(order_id)
+        return int(cache.incr(_version_key(order_id)))
+
+
+def current_version(order_id: str) -> int:
+    _seed_version(order_id)
+    return int(cache.get(_version_key(order_id)) or 0)
+
+
+def build_order_patch(order: dict) -> Optional[dict]:
+    """Version an order payload and return its patch (or compact snapshot)."""
+    order_id = str(order.get("id") or "")
+    if not order_id:
+        return None
+    version = _next_version(order_id)
+    snapshot = compact_order(order)
+    with _lock:
+        previous = _last_published.pop(order_id, None)
+        _last_published[order_id] = (version, snapshot)
+        while len(_last_published) > MAX_TRACKED_ORDERS:
+            _last_published.popitem(last=False)
+    if previous and previous[0] == version - 1:
+        return {"id": order_id, "version": version, "baseVersion": previous[0], "ops": diff(previous[1], snapshot)}
+    return {"id": order_id, "version": version, "snapshot": snapshot}
+
+
+def to_channel(patch: dict) -> dict:
+    """Channel-layer form of a patch: a snapshot is rebuilt from the event's order."""
+    if "snapshot" not in patch:
+        return patch
+    return {"id": patch["id"], "version": patch["version"], "fromOrder": True}
+
+
+def from_channel(patch: dict, order: Optional[dict]) -> Optional[dict]:
+    if not patch.get("fromOrder"):
+        return patch
+    if not isinstance(order, dict):
+        return None
+    return {"id": patch["id"], "version": patch["version"], "snapshot": compact_order(order)}
+
+
+def load_order_snapshot(order_id: str, actor=None) -> Optional[dict]:
+    """Full order payload plus its current version, for gap recovery.
+
+    Non-staff actors may only load their own orders.
+    """
+    from .models import Order
+    from .views_orders import _safe_order
+
+    order = (
+        Order.objects.select_related("placed_by")
+        .prefetch_related("items")
+        .filter(id=order_id)
+        .first()
+    )
+    if not order:
+        return None
+    if actor is not None:
+        role = (getattr(actor, "role", None) or (actor.get("role") if isinstance(actor, dict) else "") or "").lower()
+        actor_id = str(getattr(actor, "id", None) or (actor.get("id") if isinstance(actor, dict) else "") or "")
+        if role not in {"admin", "manager", "staff"} and str(order.placed_by_id or "") != actor_id:
+            return None
+    return {"order": _safe_order(order), "version": current_version(str(order.id))}
+
+
+__all__ = [
+    "compact_order",
+    "diff",
+    "apply_patch",
+    "build_order_patch",
+    "current_version",
+    "from_channel",
+    "load_order_snapshot",
+    "to_channel",
+]
@@ -0,0 +1,69 @@
+"""Bulk joins between orders and payments.
+
+``PaymentTransaction.order_id`` is a plain string: the order's UUID for POS
+payments, an event id for catering payments, and an order number in some
+older rows. These helpers resolve a whole page of rows with one query each
+instead of a lookup per row. Both queries use the ``(order_id, created_at)``
+index on ``payment_txn`` or the order primary key.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+from uuid import UUID
+
+
+def _uuid_strings(values: Iterable) -> set[str]:
+    out = set()
+    for value in values:
+        try:
+            out.add(str(UUID(str(value))))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def order_numbers_for(order_ids: Iterable) -> dict[str, str]:
+    """``{order_id: order_number}`` for the ids that name an existing order."""
+    from .models import Order
+
+    ids = _uuid_strings(value for value in order_ids if value)
+    if not ids:
+        return {}
+    rows = Order.objects.filter(id__in=ids).values_list("id", "order_number")
+    return {str(pk): number or "" for pk, number in rows}
+
+
+def payments_for_orders(orders: Iterable) -> dict[str, object]:
+    """Latest payment per order, keyed by ``str(order.id)``.
+
+    A payment recorded against the order id wins over one recorded against
+    the order number.
+    """
+    from .models import PaymentTransaction
+
+    orders = list(orders)
+    keys: dict[str, str] = {}
+    for order in orders:
+        if getattr(order, "order_number", None):
+            keys.setdefault(str(order.order_number), str(order.id))
+    for order in orders:
+        keys[str(order.id)] = str(order.id)
+    if not keys:
+        return {}
+
+    result: dict[str, object] = {}
+    by_number: dict[str, object] = {}
+    rows = PaymentTransaction.objects.filter(order_id__in=list(keys)).order_by("order_id", "-created_at")
+    for payment in rows:
+        target = keys.get(payment.order_id)
+        if target is None:
+            continue
+        bucket = result if payment.order_id == target else by_number
+        bucket.setdefault(target, payment)
+    for target, payment in by_number.items():
+        result.setdefault(target, payment)
+    return result
+
+
+__all__ = ["order_numbers_for", "payments_for_orders"]
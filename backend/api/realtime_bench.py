@@ -0,0 +1,230 @@
+"""Load generator for the realtime websocket path (``bench_realtime`` command).
+
+Spins up N ``EventStreamConsumer`` instances through
+``channels.testing.WebsocketCommunicator`` on a fresh channel layer
+(in-memory, or a local Redis via channels_redis), publishes a realistic
+kitchen order stream at a fixed rate and measures what the clients see.
+
+Authentication is bypassed (every client is a staff actor) and the clients
+run in the same process as the consumers, so CPU figures include client-side
+JSON decoding and are an upper bound for one ASGI worker.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Iterator, Optional
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+
+from . import consumers
+from .events import event_groups, parse_topic
+
+STATIONS = ("grill", "fryer", "drinks", "pastry")
+ORDER_FLOW = ("accepted", "in_prep", "ready", "completed")
+
+
+def order_event_stream(count: int, stations=STATIONS, items_per_order: int = 3) -> Iterator[tuple[str, dict]]:
+    """Yield ``count`` (event, payload) pairs shaped like real order traffic.
+
+    Each order is created, has every item marked ready at its station and then
+    walks through the status flow, carrying the full order payload each time.
+    """
+    produced = 0
+    number = 0
+    while True:
+        number += 1
+        order_id = f"bench-{number}"
+        items = [
+            {
+                "id": f"{order_id}-{i}",
+                "name": f"Item {i}",
+                "quantity": 1,
+                "stationCode": stations[(number + i) % len(stations)],
+                "state": "queued",
+            }
+            for i in range(items_per_order)
+        ]
+        order = {"id": order_id, "orderNumber": f"B{number:05d}", "status": "pending", "items": items}
+        steps = [("order.created", {"order": order})]
+        for item in items:
+            steps.append(("order.item_state_changed", {"orderId": order_id, "order": order, "item": {**item, "state": "ready"}}))
+        for status in ORDER_FLOW:
+            steps.append(("order.status_changed", {"order": {**order, "status": status}, "status": status}))
+        for step in steps:
+            if produced >= count:
+                return
+            produced += 1
+            yield step
+
+
+def _percentile(values: list, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+async def _bench_actor(token):
+    return {"id": token, "role": "staff"} if token else None
+
+
+class _Client:
+    def __init__(self, index: int, topic: Optional[str]):
+        self.comm = WebsocketCommunicator(consumers.EventStreamConsumer.as_asgi(), f"/ws/events/?token=bench-{index}")
+        self.topic = topic
+        self.group = parse_topic(topic) if topic else None
+        self.latencies: list[float] = []
+        self.received = 0
+        self.closed_code = None
+
+    def wants(self, groups: set) -> bool:
+        return self.group is None or self.group in groups
+
+    async def start(self):
+        connected, _ = await self.comm.connect()
+        if not connected:
+            raise RuntimeError("Benchmark client could not connect")
+        await self.comm.receive_json_from()  # connection.ack
+        if self.topic:
+            await self.comm.send_json_to({"action": "subscribe", "topics": [self.topic]})
+            await self.comm.receive_json_from()
+
+    async def read(self, stop: asyncio.Event):
+        # Read the raw output queue: receive_output() cancels the app on timeout
+        while True:
+            try:
+                out = await asyncio.wait_for(self.comm.output_queue.get(), timeout=0.2)
+            except asyncio.TimeoutError:
+                if stop.is_set():
+                    return
+                continue
+            if out.get("type") == "websocket.close":
+                self.closed_code = out.get("code")
+                return
+            data = json.loads(out.get("text") or "null") or {}
+            frames = data.get("events") if data.get("type") == "event.batch" else [data]
+            now = time.perf_counter()
+            for frame in frames:
+                sent_at = (frame.get("payload") or {}).get("benchSentAt")
+                if sent_at is None:
+                    continue
+                self.received += 1
+                self.latencies.append(now - sent_at)
+
+
+async def _run(clients: int, rate: float, events: int, topics: bool, drain_seconds: float) -> dict:
+    layer = get_channel_layer()
+    pool = [_Client(i, f"station:{STATIONS[i % len(STATIONS)]}" if topics else None) for i in range(clients)]
+    await asyncio.gather(*(client.start() for client in pool))
+
+    stop = asyncio.Event()
+    readers = [asyncio.ensure_future(client.read(stop)) for client in pool]
+
+    expected = 0
+    published = 0
+    cpu_start = time.process_time()
+    started = time.perf_counter()
+    for index, (event_type, payload) in enumerate(order_event_stream(events)):
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = {**payload, "benchSentAt": time.perf_counter()}
+        groups = event_groups(event_type, payload, roles=["staff"])
+        message = {"type": "event.message", "eventId": uuid4().hex, "event": event_type, "payload": payload}
+        for group in groups:
+            await layer.group_send(group, message)
+        published += 1
+        expected += sum(1 for client in pool if client.wants(groups))
+    publish_seconds = time.perf_counter() - started
+
+    def coalesced_total():
+        return sum(row["coalesced"] for row in consumers.connection_metrics()["items"])
+
+    coalesced = 0
+    deadline = time.perf_counter() + drain_seconds
+    while time.perf_counter() < deadline:
+        coalesced = max(coalesced, coalesced_total())
+        if sum(client.received for client in pool) + coalesced >= expected:
+            break
+        await asyncio.sleep(0.05)
+    metrics = consumers.connection_metrics()
+    coalesced = max(coalesced, coalesced_total())
+    cpu_seconds = time.process_time() - cpu_start
+
+    stop.set()
+    await asyncio.gather(*readers)
+    for client in pool:
+        if client.closed_code is None:
+            await client.comm.disconnect()
+
+    delivered = sum(client.received for client in pool)
+    latencies = [value for client in pool for value in client.latencies]
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "clients": clients,
+        "events": published,
+        "targetRate": rate,
+        "achievedRate": round(published / publish_seconds, 1) if publish_seconds else None,
+        "deliveriesExpected": expected,
+        "delivered": delivered,
+        "coalesced": coalesced,
+        "dropped": max(0, expected - delivered - coalesced),
+        "slowClosed": sum(1 for client in pool if client.closed_code == consumers.SLOW_CONSUMER_CLOSE_CODE),
+        "maxQueueDepth": max((row["maxDepth"] for row in metrics["items"]), default=0),
+        "latencyMs": {
+            "p50": ms(_percentile(latencies, 50)),
+            "p90": ms(_percentile(latencies, 90)),
+            "p99": ms(_percentile(latencies, 99)),
+            "max": ms(max(latencies) if latencies else None),
+        },
+        "cpuMsPer1kEvents": round(cpu_seconds * 1000 * 1000 / published, 1) if published else None,
+        "cpuMsPer1kDeliveries": round(cpu_seconds * 1000 * 1000 / delivered, 1) if delivered else None,
+    }
+
+
+def run_benchmark(
+    clients: int = 100,
+    rate: float = 200.0,
+    events: int = 2000,
+    *,
+    layer: str = "memory",
+    redis_url: Optional[str] = None,
+    capacity: int = 100,
+    topics: bool = False,
+    batch_ms: Optional[int] = None,
+    drain_seconds: float = 5.0,
+) -> dict:
+    """Run one benchmark and return its report."""
+    if layer == "redis":
+        layer_config = {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [redis_url or "redis://127.0.0.1:6379/15"], "capacity": capacity},
+        }
+    else:
+        layer_config = {"BACKEND": "channels.layers.InMemoryChannelLayer", "CONFIG": {"capacity": capacity}}
+    overrides = {"CHANNEL_LAYERS": {"default": layer_config}}
+    if batch_ms is not None:
+        overrides["WS_BATCH_INTERVAL_MS"] = batch_ms
+
+    original = consumers._resolve_actor
+    consumers._resolve_actor = _bench_actor
+    try:
+        with override_settings(**overrides):
+            report = async_to_sync(_run)(max(1, clients), max(0.1, float(rate)), max(1, events), topics, drain_seconds)
+    finally:
+        consumers._resolve_actor = original
+    report["layer"] = layer
+    return report
+
+
+__all__ = ["run_benchmark", "order_event_stream"]
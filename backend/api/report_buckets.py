@@ -0,0 +1,87 @@
+"""Bucketed time-series aggregation for reports.
+
+A series costs one ``GROUP BY`` hour query. The hourly rows are folded into
+the requested hourly or daily buckets in Python, and empty buckets are filled
+with zero. When the local UTC offset is a whole number of hours across the
+range (always true for Asia/Manila), grouping happens on UTC hours. That avoids
+CONVERT_TZ and so does not need MySQL's time zone tables. Other zones truncate
+in the local zone on the database instead.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone as dj_tz
+
+
+def local_midnight(dt: datetime) -> datetime:
+    tz = dj_tz.get_current_timezone()
+    return dj_tz.make_aware(datetime.combine(dj_tz.localtime(dt, tz).date(), time.min), tz)
+
+
+def bucket_edges(start: datetime, unit: str, count: int) -> list[datetime]:
+    """``count + 1`` boundaries of hourly or daily buckets from the local day of ``start``."""
+    first = local_midnight(start)
+    if unit == "hour":
+        return [first + timedelta(hours=i) for i in range(count + 1)]
+    tz = dj_tz.get_current_timezone()
+    day = dj_tz.localtime(first, tz).date()
+    # Build each midnight from the calendar date so DST days keep their true length
+    return [dj_tz.make_aware(datetime.combine(day + timedelta(days=i), time.min), tz) for i in range(count + 1)]
+
+
+def month_edges(start: datetime, end: datetime) -> list[datetime]:
+    """``start``, every local first-of-month in between, then ``end``."""
+    tz = dj_tz.get_current_timezone()
+    edges = [start]
+    day = dj_tz.localtime(start, tz).date().replace(day=1)
+    while True:
+        day = (day + timedelta(days=32)).replace(day=1)
+        edge = dj_tz.make_aware(datetime.combine(day, time.min), tz)
+        if edge >= end:
+            break
+        edges.append(edge)
+    edges.append(end)
+    return edges
+
+
+def _group_tz(start: datetime, end: datetime):
+    tz = dj_tz.get_current_timezone()
+    offsets = {dj_tz.localtime(start, tz).utcoffset(), dj_tz.localtime(end, tz).utcoffset()}
+    if all(offset.total_seconds() % 3600 == 0 for offset in offsets):
+        return dt_timezone.utc
+    return tz
+
+
+def hourly_totals(qs, field: str, value, start: datetime, end: datetime) -> list[tuple[datetime, Decimal]]:
+    """``(hour, total)`` rows for ``start <= field < end`` from a single grouped query."""
+    rows = (
+        qs.filter(**{f"{field}__gte": start, f"{field}__lt": end})
+        .annotate(_bucket=TruncHour(field, tzinfo=_group_tz(start, end)))
+        .values("_bucket")
+        .annotate(_total=Sum(value))
+        .order_by()
+    )
+    return [(row["_bucket"], row["_total"] or 0) for row in rows if row["_bucket"] is not None]
+
+
+def fold(rows, edges: list[datetime]) -> list[Decimal]:
+    """Sum hourly rows into the buckets delimited by ``edges``; empty buckets stay zero."""
+    totals = [Decimal("0")] * (len(edges) - 1)
+    for hour, total in rows:
+        idx = bisect_right(edges, hour) - 1
+        if 0 <= idx < len(totals):
+            totals[idx] += Decimal(total)
+    return totals
+
+
+def series(edges: list[datetime], totals) -> list[dict]:
+    return [{"time": edge.isoformat(), "amount": float(total)} for edge, total in zip(edges, totals)]
+
+
+__all__ = ["local_midnight", "bucket_edges", "month_edges", "hourly_totals", "fold", "series"]
@@ -0,0 +1,146 @@
+"""Shared cache for report responses.
+
+Keys combine the endpoint, its parameters, the active time zone and a global
+*generation* counter. Writers that change orders or payments call
+``bump_generation`` (after commit), which moves every reader onto new keys, so
+a cached report never outlives the data it was computed from.
+
+Within one generation an entry is fresh for ``REPORT_CACHE_SECONDS``. After
+that, or after a bump, one worker takes a short lock and recomputes. The
+others serve the previous value meanwhile: the expired entry if it is still
+stored, otherwise the report's *last value*. That entry is kept per endpoint,
+parameters and time zone, outside the generation, for
+``REPORT_CACHE_LAST_SECONDS``. Readers wait for the lock holder only when the
+report has never been computed (or its last value has expired).
+
+Cache failures never fail a report: they fall back to computing directly.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone as dj_tz
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "reports:generation"
+_WAIT_STEP_SECONDS = 0.05
+
+
+def _seconds(name: str, default: float) -> float:
+    return max(0.0, float(getattr(settings, name, default)))
+
+
+def generation() -> int:
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # Start from the clock so a lost counter cannot land on an old generation
+        cache.add(GENERATION_KEY, time.time_ns() // 1000, timeout=None)
+        value = cache.get(GENERATION_KEY)
+    return int(value or 0)
+
+
+def bump_generation() -> None:
+    """Invalidate every cached report; best-effort."""
+    try:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            generation()
+    except Exception:
+        logger.exception("Failed to bump report cache generation")
+
+
+def invalidate_reports() -> None:
+    """Bump the generation once the current transaction commits."""
+    transaction.on_commit(bump_generation)
+
+
+def _digest(params: Optional[dict]) -> str:
+    raw = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def report_key(endpoint: str, params: Optional[dict] = None) -> str:
+    return f"reports:{endpoint}:{generation()}:{dj_tz.get_current_timezone_name()}:{_digest(params)}"
+
+
+def last_value_key(endpoint: str, params: Optional[dict] = None) -> str:
+    """Key of the report's most recent value, whatever its generation."""
+    return f"reports:{endpoint}:last:{dj_tz.get_current_timezone_name()}:{_digest(params)}"
+
+
+def _store(key: str, last_key: str, value, fresh: float, stale: float) -> None:
+    cache.set(key, {"value": value, "freshUntil": time.time() + fresh}, timeout=max(1, int(fresh + stale)))
+    cache.set(last_key, {"value": value}, timeout=max(1, int(_seconds("REPORT_CACHE_LAST_SECONDS", 86400))))
+
+
+def cached_report(endpoint: str, params: Optional[dict], compute: Callable[[], dict], ttl: Optional[float] = None):
+    """Return ``compute()`` through the report cache."""
+    fresh = _seconds("REPORT_CACHE_SECONDS", 30) if ttl is None else max(0.0, float(ttl))
+    if fresh <= 0:
+        return compute()
+    stale = _seconds("REPORT_CACHE_STALE_SECONDS", 60)
+    lock_seconds = _seconds("REPORT_CACHE_LOCK_SECONDS", 10)
+
+    try:
+        key = report_key(endpoint, params)
+        last_key = last_value_key(endpoint, params)
+        entry = cache.get(key)
+    except Exception:
+        logger.exception(f"Report cache unavailable for {endpoint}")
+        return compute()
+
+    if entry is not None and entry.get("freshUntil", 0) > time.time():
+        return entry["value"]
+
+    # One recompute per report at a time, across generations
+    lock_key = f"{last_key}:lock"
+    try:
+        locked = cache.add(lock_key, 1, timeout=max(1, int(lock_seconds)))
+    except Exception:
+        locked = False
+    if not locked:
+        if entry is not None:
+            return entry["value"]
+        try:
+            previous = cache.get(last_key)
+        except Exception:
+            previous = None
+        if previous is not None:
+            return previous["value"]
+        # Never computed: wait for the worker that holds the lock
+        deadline = time.monotonic() + lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(_WAIT_STEP_SECONDS)
+            try:
+                entry = cache.get(key)
+            except Exception:
+                break
+            if entry is not None:
+                return entry["value"]
+        return compute()
+
+    try:
+        value = compute()
+        try:
+            _store(key, last_key, value, fresh, stale)
+        except Exception:
+            logger.exception(f"Failed to cache report {endpoint}")
+        return value
+    finally:
+        try:
+            cache.delete(lock_key)
+        except Exception:
+            pass
+
+
+__all__ = ["cached_report", "bump_generation", "invalidate_reports", "generation", "last_value_key", "report_key"]
@@ -0,0 +1,277 @@
+"""Background jobs for reports over wide date ranges.
+
+``POST /reports/jobs`` stores a ``ReportJob`` and hands it to a worker.
+``settings.REPORT_JOB_MODE`` selects the worker:
+
+- ``celery``: ``api.tasks.run_report_job`` (default), falling back to the
+  thread pool when the broker cannot be reached
+- ``thread``: bounded in-process thread pool
+- ``sync``: run inline once the transaction commits (tests and debugging)
+
+The worker reads the sales rollups one local month at a time, records its
+progress, and stores the result until ``REPORT_JOB_TTL_SECONDS`` passes. It
+then sends ``report.job_finished`` to everyone who asked for the report, and
+clients without a socket poll ``GET /reports/jobs/<id>``.
+
+The spec is hashed together with the report cache generation. An identical
+submission while a job is pending or fresh gets the same job back. Once
+orders or payments change, the next submission computes a new one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone as dj_tz
+
+from .report_buckets import month_edges
+from .report_cache import generation
+from .report_rollups import totals_by_key
+
+logger = logging.getLogger(__name__)
+
+# Report kind -> (rollup dimensions, permission needed to request it)
+REPORT_KINDS = {
+    "sales": (("payment_method", "refund_method"), "reports.sales.view"),
+    "categories": (("category",), "reports.dashboard.view"),
+    "items": (("menu_item",), "reports.dashboard.view"),
+    "channels": (("channel",), "reports.dashboard.view"),
+}
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_job_model():
+    from .models import ReportJob
+    return ReportJob
+
+
+def _mode() -> str:
+    mode = (getattr(settings, "REPORT_JOB_MODE", "celery") or "celery").lower()
+    return mode if mode in {"thread", "celery", "sync"} else "celery"
+
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=max(60, int(getattr(settings, "REPORT_JOB_TTL_SECONDS", 3600))))
+
+
+def _stale_after() -> timedelta:
+    # A pending job older than this is assumed lost with its worker
+    return timedelta(seconds=max(60, int(getattr(settings, "REPORT_JOB_STALE_SECONDS", 900))))
+
+
+def required_permission(kind: str) -> Optional[str]:
+    entry = REPORT_KINDS.get(kind)
+    return entry[1] if entry else None
+
+
+def spec_hash(kind: str, spec: dict) -> str:
+    raw = json.dumps(
+        {"kind": kind, "spec": spec, "tz": dj_tz.get_current_timezone_name(), "generation": generation()},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _reusable(job, now: datetime) -> bool:
+    if job.expires_at <= now or job.status == job.STATUS_FAILED:
+        return False
+    if job.status == job.STATUS_DONE:
+        return True
+    return now - (job.started_at or job.created_at) < _stale_after()
+
+
+def submit(kind: str, spec: dict, start: datetime, end: datetime, actor=None):
+    """Return ``(job, created)``, reusing a pending or fresh job for the same spec."""
+    ReportJob = _get_job_model()
+    user_id = str(actor.id) if getattr(actor, "id", None) else None
+    digest = spec_hash(kind, spec)
+    now = dj_tz.now()
+    with transaction.atomic():
+        job = ReportJob.objects.select_for_update().filter(spec_hash=digest).first()
+        if job is not None and _reusable(job, now):
+            if user_id and user_id not in job.notify_user_ids and job.status != job.STATUS_DONE:
+                job.notify_user_ids = [*job.notify_user_ids, user_id]
+                job.save(update_fields=["notify_user_ids"])
+            return job, False
+        if job is not None:
+            job.delete()
+        try:
+            with transaction.atomic():
+                job = ReportJob.objects.create(
+                    kind=kind,
+                    params={**spec, "start": start.isoformat(), "end": end.isoformat()},
+                    spec_hash=digest,
+                    requested_by=actor if hasattr(actor, "id") else None,
+                    notify_user_ids=[user_id] if user_id else [],
+                    progress_total=len(month_edges(start, end)) - 1,
+                    expires_at=now + _ttl(),
+                )
+        except IntegrityError:
+            # A concurrent submission created it first
+            return ReportJob.objects.get(spec_hash=digest), False
+    job_id = str(job.id)
+    transaction.on_commit(lambda: dispatch(job_id))
+    return job, True
+
+
+def dispatch(job_id: str) -> None:
+    """Hand a queued job to the configured worker."""
+    mode = _mode()
+    if mode == "sync":
+        run_job(job_id)
+        return
+    if mode == "celery":
+        try:
+            from .tasks import run_report_job, CELERY_AVAILABLE
+
+            if CELERY_AVAILABLE:
+                run_report_job.delay(job_id)
+                return
+        except Exception as exc:
+            logger.warning(f"Celery report dispatch failed, using thread pool: {exc}")
+    _get_executor().submit(_run_threaded, job_id)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, int(getattr(settings, "REPORT_JOB_WORKERS", 1)))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        return _executor
+
+
+def _run_threaded(job_id: str) -> None:
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception(f"Report job {job_id} crashed")
+    finally:
+        close_old_connections()
+
+
+def compute_chunk(kind: str, start: datetime, end: datetime) -> dict:
+    """``{key: {"amount", "count", "quantity"}}`` for one chunk of a report."""
+    dimensions, _ = REPORT_KINDS[kind]
+    out: dict = defaultdict(lambda: {"amount": 0.0, "count": 0, "quantity": 0})
+    for dimension in dimensions:
+        for key, row in totals_by_key(dimension, start, end).items():
+            entry = out[key]
+            entry["amount"] += float(row["amount"])
+            entry["count"] += int(row["count"])
+            entry["quantity"] += int(row["quantity"])
+    return dict(out)
+
+
+def run_job(job_id: str) -> None:
+    """Compute a queued job month by month. Only one worker can claim a job."""
+    ReportJob = _get_job_model()
+    now = dj_tz.now()
+    if not ReportJob.objects.filter(id=job_id, status=ReportJob.STATUS_QUEUED).update(
+        status=ReportJob.STATUS_RUNNING, started_at=now
+    ):
+        return
+    job = ReportJob.objects.get(id=job_id)
+    try:
+        start = datetime.fromisoformat(job.params["start"])
+        end = datetime.fromisoformat(job.params["end"])
+        edges = month_edges(start, end)
+        months = []
+        totals: dict = defaultdict(lambda: {"amount": 0.0, "count": 0, "quantity": 0})
+        for index, (lo, hi) in enumerate(zip(edges, edges[1:]), start=1):
+            chunk = compute_chunk(job.kind, lo, hi)
+            for key, row in chunk.items():
+                for field, value in row.items():
+                    totals[key][field] += value
+            months.append({
+                "month": dj_tz.localtime(lo).strftime("%Y-%m"),
+                "from": lo.isoformat(),
+                "to": hi.isoformat(),
+                "total": sum(row["amount"] for row in chunk.values()),
+                "byKey": chunk,
+            })
+            ReportJob.objects.filter(id=job_id).update(progress_done=index)
+        job.result = {
+            "report": job.kind,
+            "range": {"from": start.isoformat(), "to": end.isoformat()},
+            "total": sum(row["amount"] for row in totals.values()),
+            "byKey": dict(totals),
+            "months": months,
+        }
+        job.status = ReportJob.STATUS_DONE
+        job.progress_done = len(months)
+        job.error = ""
+    except Exception as exc:
+        logger.exception(f"Report job {job_id} failed")
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(exc)[:1000]
+    job.finished_at = dj_tz.now()
+    job.expires_at = job.finished_at + _ttl()
+    # update() rather than save(): the row may have been replaced while this ran
+    ReportJob.objects.filter(id=job_id).update(
+        result=job.result,
+        status=job.status,
+        progress_done=job.progress_done,
+        error=job.error,
+        finished_at=job.finished_at,
+        expires_at=job.expires_at,
+    )
+    _notify(job)
+
+
+def _notify(job) -> None:
+    if not job.notify_user_ids:
+        return
+    try:
+        from .events import publish_event
+
+        publish_event("report.job_finished", {"job": serialize_job(job)}, user_ids=job.notify_user_ids)
+    except Exception:
+        logger.exception(f"Failed to publish report job {job.id}")
+
+
+def serialize_job(job, include_result: bool = False) -> dict:
+    data = {
+        "id": str(job.id),
+        "report": job.kind,
+        "status": job.status,
+        "progress": {"done": job.progress_done, "total": job.progress_total},
+        "range": {"from": job.params.get("start"), "to": job.params.get("end")},
+        "error": job.error or None,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+        "expiresAt": job.expires_at.isoformat() if job.expires_at else None,
+    }
+    if include_result and job.status == job.STATUS_DONE:
+        data["result"] = job.result
+    return data
+
+
+def purge_expired() -> int:
+    deleted, _ = _get_job_model().objects.filter(expires_at__lt=dj_tz.now()).delete()
+    return deleted
+
+
+__all__ = [
+    "REPORT_KINDS",
+    "required_permission",
+    "submit",
+    "dispatch",
+    "run_job",
+    "compute_chunk",
+    "serialize_job",
+    "purge_expired",
+]
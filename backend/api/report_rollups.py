@@ -0,0 +1,403 @@
+"""Incrementally maintained sales rollups (``SalesRollup``) and their readers.
+
+Writers are called from the order completion, payment and refund paths:
+
+- ``sync_order`` adds an order when it reaches ``completed`` and takes it back
+  out when it leaves that status. What it added is kept in
+  ``OrderRollupEntry``, so a revert is exact even if the order changes later.
+- ``record_payment`` and ``record_refund`` adjust the payment dimensions and
+  the named customer's ``CustomerSummary`` row.
+
+Each change touches one hourly row and one local-day row per dimension key
+and invalidates the report cache (``report_cache``) once it commits.
+``rebuild`` regenerates a date range from raw rows and ``rebuild_customers``
+the customer table (``rebuild_rollups`` command).
+
+Readers choose day rows when a window falls on local midnights (or runs up to
+now) and hour rows otherwise. A month costs about thirty rows instead of one
+row per order. Windows are resolved to whole hours.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce, Greatest, Least, Lower, Trim
+from django.utils import timezone as dj_tz
+
+from .report_buckets import local_midnight
+from .report_cache import invalidate_reports
+
+ZERO = Decimal("0")
+
+
+def _aware(dt: datetime) -> datetime:
+    return dj_tz.make_aware(dt) if dj_tz.is_naive(dt) else dt
+
+
+def hour_bucket(dt: datetime) -> datetime:
+    return dj_tz.localtime(_aware(dt)).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(dt: datetime) -> datetime:
+    return local_midnight(_aware(dt))
+
+
+def _bump(dimension: str, key: str, when: datetime, amount=ZERO, count: int = 0, quantity: int = 0):
+    from .models import SalesRollup
+
+    for grain, bucket in ((SalesRollup.GRAIN_HOUR, hour_bucket(when)), (SalesRollup.GRAIN_DAY, day_bucket(when))):
+        lookup = {"grain": grain, "dimension": dimension, "bucket": bucket, "key": (key or "")[:255]}
+        changes = {
+            "amount": F("amount") + amount,
+            "count": F("count") + count,
+            "quantity": F("quantity") + quantity,
+            "updated_at": dj_tz.now(),
+        }
+        if SalesRollup.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                SalesRollup.objects.create(**lookup, amount=amount, count=count, quantity=quantity)
+        except IntegrityError:
+            # Another writer created the row first
+            SalesRollup.objects.filter(**lookup).update(**changes)
+
+
+def _apply(lines, when: datetime, sign: int):
+    for dimension, key, amount, count, quantity in lines:
+        _bump(dimension, key, when, Decimal(str(amount)) * sign, int(count) * sign, int(quantity) * sign)
+
+
+def order_lines(order) -> list[list]:
+    """Rollup contributions of one order: ``[dimension, key, amount, count, quantity]``."""
+    from .models import SalesRollup
+
+    channel = (order.channel or order.order_type or "").strip().lower() or "unknown"
+    lines = [[SalesRollup.DIM_CHANNEL, channel, str(order.total_amount or ZERO), 1, 0]]
+    per_key: dict[tuple[str, str], list] = {}
+    for item in order.items.all():
+        line_total = (item.price or ZERO) * int(item.quantity or 0)
+        keys = [(SalesRollup.DIM_MENU_ITEM, item.item_name or "")]
+        if (item.category or "").strip():
+            keys.append((SalesRollup.DIM_CATEGORY, item.category))
+        for dim_key in keys:
+            entry = per_key.setdefault(dim_key, [ZERO, 0])
+            entry[0] += line_total
+            entry[1] += int(item.quantity or 0)
+    for (dimension, key), (amount, quantity) in per_key.items():
+        lines.append([dimension, key, str(amount), 1, quantity])
+    return lines
+
+
+def sync_order(order) -> None:
+    """Add a newly completed order to the rollups, or take back one that left ``completed``."""
+    from .models import Order, OrderRollupEntry
+
+    # Any status change can move dashboard figures, counted or not
+    invalidate_reports()
+    with transaction.atomic():
+        if order.status == Order.STATUS_COMPLETED:
+            if OrderRollupEntry.objects.filter(order_id=order.pk).exists():
+                return
+            lines = order_lines(order)
+            try:
+                with transaction.atomic():
+                    OrderRollupEntry.objects.create(order_id=order.pk, bucket_time=order.created_at, lines=lines)
+            except IntegrityError:
+                return  # a concurrent call already counted it
+            _apply(lines, order.created_at, 1)
+        else:
+            entry = OrderRollupEntry.objects.select_for_update().filter(order_id=order.pk).first()
+            if entry is None:
+                return
+            entry.delete()
+            _apply(entry.lines, entry.bucket_time, -1)
+
+
+def customer_key(name: str) -> str:
+    return (name or "").strip().lower()[:255]
+
+
+def _bump_customer(payment, spent=ZERO, payments: int = 0, refunded=ZERO, refunds: int = 0):
+    from .models import CustomerSummary
+
+    key = customer_key(payment.customer)
+    if not key:
+        return
+    when = payment.created_at
+    changes = {
+        "total_spent": F("total_spent") + spent,
+        "payment_count": F("payment_count") + payments,
+        "refunded_amount": F("refunded_amount") + refunded,
+        "refund_count": F("refund_count") + refunds,
+        "first_visit": Least(Coalesce("first_visit", when), when),
+        "last_visit": Greatest(Coalesce("last_visit", when), when),
+        "updated_at": dj_tz.now(),
+    }
+    if CustomerSummary.objects.filter(key=key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            CustomerSummary.objects.create(
+                key=key,
+                name=payment.customer.strip()[:255],
+                total_spent=spent,
+                payment_count=payments,
+                refunded_amount=refunded,
+                refund_count=refunds,
+                first_visit=when,
+                last_visit=when,
+            )
+    except IntegrityError:
+        CustomerSummary.objects.filter(key=key).update(**changes)
+
+
+def record_payment(payment) -> None:
+    from .models import PaymentTransaction, SalesRollup
+
+    if payment.status != PaymentTransaction.STATUS_COMPLETED:
+        return
+    invalidate_reports()
+    with transaction.atomic():
+        _bump(SalesRollup.DIM_PAYMENT_METHOD, payment.method or "unknown", payment.created_at, payment.amount, 1)
+        _bump_customer(payment, spent=payment.amount, payments=1)
+
+
+def record_refund(payment) -> None:
+    """Move a refunded payment from ``payment_method`` to ``refund_method``."""
+    from .models import SalesRollup
+
+    method = payment.method or "unknown"
+    invalidate_reports()
+    with transaction.atomic():
+        _bump(SalesRollup.DIM_PAYMENT_METHOD, method, payment.created_at, -payment.amount, -1)
+        _bump(SalesRollup.DIM_REFUND_METHOD, method, payment.created_at, payment.amount, 1)
+        _bump_customer(payment, spent=-payment.amount, payments=-1, refunded=payment.amount, refunds=1)
+
+
+def counted_refunds() -> Q:
+    """Refunded payments that were completed first, the ones ``record_refund`` counts.
+
+    Payments refunded before ``meta.refundedFrom`` was recorded count as completed.
+    """
+    from .models import PaymentTransaction
+
+    return Q(status=PaymentTransaction.STATUS_REFUNDED) & (
+        Q(meta__refundedFrom=PaymentTransaction.STATUS_COMPLETED) | Q(meta__refundedFrom__isnull=True)
+    )
+
+
+def rebuild(start: datetime, end: datetime, chunk_size: int = 500) -> dict:
+    """Regenerate every rollup bucket in the local days covering ``start``..``end``."""
+    from .models import Order, OrderRollupEntry, PaymentTransaction, SalesRollup
+
+    start = local_midnight(_aware(start))
+    end = _aware(end)
+    if end != local_midnight(end):
+        end = local_midnight(end) + timedelta(days=1)
+
+    acc: dict[tuple, list] = defaultdict(lambda: [ZERO, 0, 0])
+
+    def add(dimension, key, when, amount, count, quantity):
+        for grain, bucket in ((SalesRollup.GRAIN_HOUR, hour_bucket(when)), (SalesRollup.GRAIN_DAY, day_bucket(when))):
+            row = acc[(grain, dimension, bucket, (key or "")[:255])]
+            row[0] += Decimal(str(amount))
+            row[1] += count
+            row[2] += quantity
+
+    entries = []
+    orders = (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end, status=Order.STATUS_COMPLETED)
+        .prefetch_related("items")
+        .order_by()
+    )
+    for order in orders.iterator(chunk_size=chunk_size):
+        lines = order_lines(order)
+        entries.append(OrderRollupEntry(order=order, bucket_time=order.created_at, lines=lines))
+        for dimension, key, amount, count, quantity in lines:
+            add(dimension, key, order.created_at, amount, count, quantity)
+
+    payments = 0
+    rows = PaymentTransaction.objects.filter(
+        Q(status=PaymentTransaction.STATUS_COMPLETED) | counted_refunds(),
+        created_at__gte=start,
+        created_at__lt=end,
+    ).values_list("created_at", "method", "amount", "status")
+    for created_at, method, amount, status in rows.iterator(chunk_size=chunk_size):
+        payments += 1
+        dimension = (
+            SalesRollup.DIM_PAYMENT_METHOD
+            if status == PaymentTransaction.STATUS_COMPLETED
+            else SalesRollup.DIM_REFUND_METHOD
+        )
+        add(dimension, method or "unknown", created_at, amount, 1, 0)
+
+    with transaction.atomic():
+        SalesRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        OrderRollupEntry.objects.filter(order__created_at__gte=start, order__created_at__lt=end).delete()
+        SalesRollup.objects.bulk_create(
+            [
+                SalesRollup(grain=grain, dimension=dimension, bucket=bucket, key=key, amount=a, count=c, quantity=q)
+                for (grain, dimension, bucket, key), (a, c, q) in acc.items()
+            ],
+            batch_size=chunk_size,
+        )
+        OrderRollupEntry.objects.bulk_create(entries, batch_size=chunk_size)
+        invalidate_reports()
+    return {"orders": len(entries), "payments": payments, "rows": len(acc), "from": start, "to": end}
+
+
+def customer_groups(qs):
+    """Group payments by customer name in SQL: totals, counts and first/last visit."""
+    from .models import PaymentTransaction
+
+    completed = Q(status=PaymentTransaction.STATUS_COMPLETED)
+    refunded = counted_refunds()
+    return (
+        qs.filter(completed | refunded)
+        .exclude(customer="")
+        .annotate(_key=Lower(Trim("customer")))
+        .exclude(_key="")
+        .values("_key")
+        .annotate(
+            name=Max("customer"),
+            total_spent=Coalesce(Sum("amount", filter=completed), ZERO),
+            payment_count=Count("id", filter=completed),
+            refunded_amount=Coalesce(Sum("amount", filter=refunded), ZERO),
+            refund_count=Count("id", filter=refunded),
+            first_visit=Min("created_at"),
+            last_visit=Max("created_at"),
+        )
+    )
+
+
+def rebuild_customers(chunk_size: int = 500) -> int:
+    """Regenerate ``CustomerSummary`` from the payment table; returns the row count."""
+    from .models import CustomerSummary, PaymentTransaction
+
+    rows = [
+        CustomerSummary(
+            key=row["_key"][:255],
+            name=(row["name"] or "").strip()[:255],
+            total_spent=row["total_spent"],
+            payment_count=row["payment_count"],
+            refunded_amount=row["refunded_amount"],
+            refund_count=row["refund_count"],
+            first_visit=row["first_visit"],
+            last_visit=row["last_visit"],
+        )
+        for row in customer_groups(PaymentTransaction.objects.all()).order_by().iterator(chunk_size=chunk_size)
+    ]
+    with transaction.atomic():
+        CustomerSummary.objects.all().delete()
+        CustomerSummary.objects.bulk_create(rows, batch_size=chunk_size)
+        invalidate_reports()
+    return len(rows)
+
+
+# -----------------------------
+# Readers
+# -----------------------------
+
+
+def _bounds(start: datetime, end: datetime) -> tuple[str, datetime, datetime]:
+    """Grain and ``[lo, hi)`` bucket bounds covering ``start``..``end``."""
+    from .models import SalesRollup
+
+    start, end = _aware(start), _aware(end)
+    end_midnight = local_midnight(end)
+    day_end = (
+        end >= dj_tz.now()
+        or end == end_midnight
+        or end_midnight + timedelta(days=1) - end <= timedelta(seconds=1)
+    )
+    if start == local_midnight(start) and day_end:
+        hi = end_midnight if end == end_midnight else end_midnight + timedelta(days=1)
+        return SalesRollup.GRAIN_DAY, start, hi
+    end_hour = hour_bucket(end)
+    hi = end_hour if end == end_hour else end_hour + timedelta(hours=1)
+    return SalesRollup.GRAIN_HOUR, hour_bucket(start), hi
+
+
+def window_totals(dimension: str, windows: dict, field: str = "amount") -> dict:
+    """Sum ``field`` for several named ``(start, end)`` windows, one query per grain."""
+    from .models import SalesRollup
+
+    by_grain: dict[str, dict] = defaultdict(dict)
+    for name, (start, end) in windows.items():
+        grain, lo, hi = _bounds(start, end)
+        by_grain[grain][name] = Q(bucket__gte=lo, bucket__lt=hi)
+    result = {}
+    for grain, conds in by_grain.items():
+        agg = (
+            SalesRollup.objects.filter(grain=grain, dimension=dimension)
+            .filter(reduce(or_, conds.values()))
+            .aggregate(**{f"w_{name}": Sum(field, filter=q) for name, q in conds.items()})
+        )
+        result.update({name: agg[f"w_{name}"] or 0 for name in conds})
+    return result
+
+
+def totals_by_key(dimension: str, start: datetime, end: datetime) -> dict:
+    """``{key: {"amount", "count", "quantity"}}`` for one window."""
+    from .models import SalesRollup
+
+    grain, lo, hi = _bounds(start, end)
+    rows = (
+        SalesRollup.objects.filter(grain=grain, dimension=dimension, bucket__gte=lo, bucket__lt=hi)
+        .values("key")
+        .annotate(a=Sum("amount"), c=Sum("count"), q=Sum("quantity"))
+        .order_by()
+    )
+    return {row["key"]: {"amount": row["a"] or ZERO, "count": row["c"] or 0, "quantity": row["q"] or 0} for row in rows}
+
+
+def top_keys(dimension: str, start: datetime, end: datetime, field: str = "quantity", limit: int = 5) -> list:
+    from .models import SalesRollup
+
+    grain, lo, hi = _bounds(start, end)
+    rows = (
+        SalesRollup.objects.filter(grain=grain, dimension=dimension, bucket__gte=lo, bucket__lt=hi)
+        .values("key")
+        .annotate(total=Sum(field))
+        .filter(total__gt=0)
+        .order_by("-total")[:limit]
+    )
+    return [(row["key"], row["total"]) for row in rows]
+
+
+def bucket_rows(dimension: str, grain: str, start: datetime, end: datetime) -> list[tuple[datetime, Decimal]]:
+    """``(bucket, amount)`` rows in ``[start, end)``, ready for ``report_buckets.fold``."""
+    from .models import SalesRollup
+
+    rows = (
+        SalesRollup.objects.filter(grain=grain, dimension=dimension, bucket__gte=start, bucket__lt=end)
+        .values("bucket")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    return [(row["bucket"], row["total"] or ZERO) for row in rows]
+
+
+__all__ = [
+    "sync_order",
+    "record_payment",
+    "record_refund",
+    "counted_refunds",
+    "rebuild",
+    "rebuild_customers",
+    "customer_groups",
+    "customer_key",
+    "order_lines",
+    "window_totals",
+    "totals_by_key",
+    "top_keys",
+    "bucket_rows",
+]
@@ -96,6 +96,38 @@ def send_email_notification(self, user_id: int, title: str, message: str):
         raise self.retry(exc=exc)
 
 
+@shared_task
+def deliver_email_batch(email_ids: List[str]):
+    """
+    Deliver queued transactional emails over a single connection.
+    Failed messages are re-queued with exponential backoff.
+
+    Args:
+        email_ids: EmailOutbox ids to send
+    """
+    from .email_dispatch import deliver_batch, dispatch
+
+    result = deliver_batch(email_ids)
+    if result["retry"]:
+        dispatch(result["retry"], countdown=result["retryIn"])
+    logger.info(f"Email batch: {result['sent']} sent, {len(result['retry'])} retrying, {result['failed']} failed")
+    return result["sent"]
+
+
+@shared_task
+def process_email_outbox(limit: int = 100):
+    """
+    Send transactional emails that are due (new, retrying, or orphaned by a
+    worker that died mid-send).
+    """
+    from .email_dispatch import process_pending
+
+    sent = process_pending(limit=limit)
+    if sent:
+        logger.info(f"Sent {sent} queued emails from outbox")
+    return sent
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def send_push_notification(self, user_id: int, title: str, message: str, notification_type: str = 'info'):
     """
@@ -263,6 +295,14 @@ def auto_advance_orders(limit: int = 50):
                 update_fields = list(dict.fromkeys(update_fields))
                 order.save(update_fields=update_fields)
 
+                if target_canonical == "completed":
+                    try:
+                        from .report_rollups import sync_order
+
+                        sync_order(order)
+                    except Exception as exc:
+                        logger.error(f"Failed to update sales rollups for order {order_id}: {exc}")
+
                 try:
                     recalc_order_counters(order)
                 except Exception:
@@ -391,6 +431,54 @@ def cleanup_old_notifications():
     return deleted_count
 
 
+@shared_task
+def run_report_job(job_id: str):
+    """
+    Compute a queued report job (see api.report_jobs).
+    """
+    from .report_jobs import run_job
+
+    run_job(job_id)
+
+
+@shared_task
+def purge_report_jobs():
+    """
+    Delete report jobs whose results have expired.
+    """
+    from .report_jobs import purge_expired
+
+    deleted = purge_expired()
+    if deleted:
+        logger.info(f"Purged {deleted} expired report jobs")
+    return deleted
+
+
+@shared_task
+def build_ledger_checkpoint():
+    """
+    Checkpoint stock balances as of the latest local midnight and prune old checkpoints.
+    """
+    from .inventory_checkpoints import build_checkpoint, prune_checkpoints
+
+    checkpoint = build_checkpoint()
+    pruned = prune_checkpoints()
+    logger.info(f"Ledger checkpoint {checkpoint.taken_at.isoformat()}: {checkpoint.line_count} lines, {pruned} pruned")
+    return checkpoint.line_count
+
+
+@shared_task
+def sweep_expired_credentials(chunk_size: int = 500, max_chunks: int = 200):
+    """
+    Delete dead refresh/reset tokens and OTP codes in small PK-ordered chunks.
+    """
+    from .utils_token_sweep import sweep_expired_credentials as sweep
+
+    counts = sweep(chunk_size=chunk_size, max_chunks=max_chunks)
+    logger.info(f"Swept credential rows: {counts}")
+    return sum(counts.values())
+
+
 def create_notification_sync(
     user_id: int,
     title: str,
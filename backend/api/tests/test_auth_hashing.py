@@ -0,0 +1,80 @@
+import json
+import threading
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from api import utils_hashing
+from api.models import AppUser
+
+
+def _reset_pool(test):
+    original = (utils_hashing._pool, utils_hashing._slots)
+    utils_hashing._pool, utils_hashing._slots = None, None
+
+    def restore():
+        if utils_hashing._pool is not None:
+            utils_hashing._pool.shutdown(wait=True)
+        utils_hashing._pool, utils_hashing._slots = original
+
+    test.addCleanup(restore)
+
+
+@override_settings(AUTH_HASH_POOL_WORKERS=1, AUTH_HASH_POOL_QUEUE=0)
+class AuthPoolBackpressureTests(SimpleTestCase):
+    def test_saturated_pool_answers_429(self):
+        _reset_pool(self)
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        utils_hashing.submit_to_auth_pool(gate.wait, 5)
+
+        with self.assertRaises(utils_hashing.HashingPoolBusy):
+            utils_hashing.submit_to_auth_pool(lambda: None)
+
+        view = utils_hashing.auth_pool_view(lambda request: None)
+        resp = async_to_sync(view)(RequestFactory().post('/api/auth/login'))
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '1')
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ],
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_DISPATCH_MODE='sync',
+)
+class AsyncLoginTests(TransactionTestCase):
+    def setUp(self):
+        _reset_pool(self)
+        # Stored with a hasher that is no longer preferred
+        self.user = AppUser.objects.create(
+            email='hash@example.com',
+            name='Hash',
+            role='staff',
+            status='active',
+            password_hash=make_password('secret-pass', hasher='md5'),
+        )
+
+    def test_login_runs_on_pool_and_upgrades_hash(self):
+        resp = self.client.post(
+            '/api/auth/login',
+            data=json.dumps({'email': 'hash@example.com', 'password': 'secret-pass'}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()['otpRequired'])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password_hash.startswith('pbkdf2_sha256$'))
+
+    def test_wrong_password_does_not_upgrade(self):
+        resp = self.client.post(
+            '/api/auth/login',
+            data=json.dumps({'email': 'hash@example.com', 'password': 'nope-nope'}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 401)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password_hash.startswith('md5$'))
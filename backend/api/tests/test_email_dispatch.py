@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+
+from api import email_dispatch
+from api.emails import email_user_login_otp
+from api.models import EmailOutbox
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_DISPATCH_MODE='sync',
+    EMAIL_DISPATCH_MAX_ATTEMPTS=2,
+    EMAIL_DISPATCH_RETRY_BASE_SECONDS=30,
+)
+class EmailDispatchTests(TestCase):
+    def test_queued_email_is_delivered_after_commit_and_body_cleared(self):
+        user = SimpleNamespace(email='otp@example.com', name='Otp User')
+        with self.captureOnCommitCallbacks(execute=True):
+            email_id = email_user_login_otp(user, '123456')
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('123456', mail.outbox[0].body)
+        row = EmailOutbox.objects.get(id=email_id)
+        self.assertEqual(row.status, EmailOutbox.STATUS_SENT)
+        self.assertEqual(row.body, '')
+        self.assertEqual(email_dispatch.get_email_status(email_id)['status'], 'sent')
+
+    def test_batch_reuses_one_connection(self):
+        ids = [
+            email_dispatch.queue_email('Hello', 'Body', [f'user{i}@example.com'], kind='test')
+            for i in range(3)
+        ]
+        with mock.patch('api.email_dispatch.get_connection', wraps=get_connection) as conn:
+            result = email_dispatch.deliver_batch(ids)
+        self.assertEqual(conn.call_count, 1)
+        self.assertEqual(result['sent'], 3)
+        self.assertEqual(len(mail.outbox), 3)
+        # Already-sent rows are not claimed again
+        self.assertEqual(email_dispatch.deliver_batch(ids)['sent'], 0)
+
+    def test_failures_back_off_then_give_up(self):
+        email_id = email_dispatch.queue_email('Hello', 'Body', ['down@example.com'])
+        broken = mock.Mock()
+        broken.open.side_effect = OSError('smtp down')
+        with mock.patch('api.email_dispatch.get_connection', return_value=broken):
+            first = email_dispatch.deliver_batch([email_id])
+            row = EmailOutbox.objects.get(id=email_id)
+            self.assertEqual(first['retry'], [email_id])
+            self.assertEqual(first['retryIn'], 30)
+            self.assertEqual(row.status, EmailOutbox.STATUS_PENDING)
+            self.assertIsNotNone(row.next_attempt_at)
+
+            second = email_dispatch.deliver_batch([email_id])
+        row.refresh_from_db()
+        self.assertEqual(second['failed'], 1)
+        self.assertEqual(row.status, EmailOutbox.STATUS_FAILED)
+        self.assertEqual(row.attempts, 2)
+        self.assertIn('smtp down', row.last_error)
+
+    def test_defaults_to_celery_and_falls_back_to_threads_without_a_broker(self):
+        with self.settings():
+            del settings.EMAIL_DISPATCH_MODE
+            self.assertEqual(email_dispatch._mode(), 'celery')
+            with mock.patch('api.tasks.deliver_email_batch.apply_async', side_effect=OSError('broker down'), create=True), \
+                    mock.patch.object(email_dispatch, '_submit_threaded') as threaded:
+                email_dispatch.dispatch(['e-1'])
+        threaded.assert_called_once_with(['e-1'], 0)
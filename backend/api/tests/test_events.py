@@ -1,9 +1,14 @@
-from asgiref.sync import async_to_sync
-from channels.layers import InMemoryChannelLayer
-from django.test import SimpleTestCase
+import threading
 
-from api import events
-from api.events import publish_event
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from api import consumers, events
+from api.consumers import EventStreamConsumer
+from api.events import publish_event, topic_groups_for_event
+from api.views_common import _issue_jwt_from_dict
 
 
 class PublishEventTests(SimpleTestCase):
@@ -44,3 +49,230 @@ class PublishEventTests(SimpleTestCase):
 
         broadcast_msg = async_to_sync(layer.receive)(broadcast_channel)
         self.assertEqual(broadcast_msg["event"], "order.status_changed")
+
+
+IN_MEMORY_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class TopicSubscriptionTests(SimpleTestCase):
+    def setUp(self):
+        async def fake_actor(token):
+            return {"id": "u-1", "role": "staff"} if token else None
+
+        original = consumers._resolve_actor
+        consumers._resolve_actor = fake_actor
+        self.addCleanup(lambda: setattr(consumers, "_resolve_actor", original))
+
+    def test_topic_groups_for_order_event(self):
+        groups = topic_groups_for_event(
+            "order.item_state_changed",
+            {"orderId": "o-1", "item": {"stationCode": "GRILL"}},
+        )
+        self.assertEqual(
+            groups,
+            {"topic.event.order.item_state_changed", "topic.order.o-1", "topic.station.grill"},
+        )
+        self.assertIn("topic.inventory", topic_groups_for_event("inventory.updated", {}))
+
+    def test_station_subscriber_only_gets_its_station_once(self):
+        async def scenario():
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), "/ws/events/?token=t")
+            connected, _ = await comm.connect()
+            self.assertTrue(connected)
+            await comm.receive_json_from()  # connection.ack
+
+            await comm.send_json_to({"action": "subscribe", "topics": ["station:grill", "order:o-1", "bogus"]})
+            ack = await comm.receive_json_from()
+            self.assertEqual(ack["payload"]["accepted"], ["station:grill", "order:o-1"])
+            self.assertEqual(ack["payload"]["rejected"], ["bogus"])
+
+            publish = sync_to_async(publish_event)
+            await publish("order.item_state_changed", {"orderId": "o-2", "item": {"stationCode": "bar"}}, roles=["staff"])
+            # Matches both subscribed topics; must arrive exactly once
+            await publish("order.item_state_changed", {"orderId": "o-1", "item": {"stationCode": "grill"}}, roles=["staff"])
+
+            msg = await comm.receive_json_from()
+            self.assertEqual(msg["payload"]["orderId"], "o-1")
+            self.assertTrue(await comm.receive_nothing())
+
+            await comm.send_json_to({"action": "unsubscribe"})
+            await comm.receive_json_from()
+            await publish("inventory.updated", {"item": {}}, roles=["staff"])
+            msg = await comm.receive_json_from()
+            self.assertEqual(msg["event"], "inventory.updated")
+            await comm.disconnect()
+
+        async_to_sync(scenario)()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, WS_BATCH_INTERVAL_MS=50)
+class OutboundBatchingTests(SimpleTestCase):
+    def setUp(self):
+        async def fake_actor(token):
+            return {"id": "u-1", "role": "staff"} if token else None
+
+        original = consumers._resolve_actor
+        consumers._resolve_actor = fake_actor
+        self.addCleanup(lambda: setattr(consumers, "_resolve_actor", original))
+
+    def _burst(self):
+        async def scenario():
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), "/ws/events/?token=t")
+            await comm.connect()
+            await comm.receive_json_from()  # connection.ack
+
+            publish = sync_to_async(publish_event)
+            for status in ("accepted", "in_prep", "ready"):
+                await publish("order.status_changed", {"order": {"id": "o-1"}, "status": status}, roles=["staff"])
+            await publish("order.created", {"order": {"id": "o-2"}}, roles=["staff"])
+
+            self.assertEqual(consumers.connection_metrics()["connections"], 1)
+            frame = await comm.receive_json_from(timeout=2)
+            await comm.disconnect()
+            self.assertEqual(consumers.connection_metrics()["connections"], 0)
+            self.assertEqual(frame["type"], "event.batch")
+            return [(e["event"], e["payload"].get("status")) for e in frame["events"]]
+
+        return async_to_sync(scenario)()
+
+    def test_burst_is_batched_with_every_update_while_client_keeps_up(self):
+        self.assertEqual(
+            self._burst(),
+            [
+                ("order.status_changed", "accepted"),
+                ("order.status_changed", "in_prep"),
+                ("order.status_changed", "ready"),
+                ("order.created", None),
+            ],
+        )
+
+    @override_settings(WS_OUTBOX_HIGH_WATER=1)
+    def test_superseded_updates_are_dropped_once_client_is_behind(self):
+        # The first update is queued before the client is behind; the later ones collapse
+        self.assertEqual(
+            self._burst(),
+            [("order.status_changed", "accepted"), ("order.status_changed", "ready"), ("order.created", None)],
+        )
+
+    @override_settings(WS_OUTBOX_LIMIT=2)
+    def test_consumer_that_overflows_its_outbox_is_closed(self):
+        async def scenario():
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), "/ws/events/?token=t")
+            await comm.connect()
+            await comm.receive_json_from()
+
+            publish = sync_to_async(publish_event)
+            for n in range(3):
+                await publish("order.created", {"order": {"id": f"o-{n}"}}, roles=["staff"])
+            closed = await comm.receive_output(timeout=2)
+            self.assertEqual(closed, {"type": "websocket.close", "code": consumers.SLOW_CONSUMER_CLOSE_CODE})
+
+        async_to_sync(scenario)()
+
+    def test_patch_socket_gets_the_snapshot_rebuilt_from_the_order(self):
+        async def scenario():
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), "/ws/events/?token=t&patches=1")
+            await comm.connect()
+            await comm.receive_json_from()
+
+            await sync_to_async(publish_event)("order.created", {"order": {"id": "o-9", "ageSeconds": 4}}, roles=["staff"])
+            frame = await comm.receive_json_from(timeout=2)
+            await comm.disconnect()
+            return frame["payload"]
+
+        payload = async_to_sync(scenario)()
+        self.assertNotIn("order", payload)
+        self.assertEqual(payload["orderPatch"]["snapshot"], {"id": "o-9"})
+
+    def test_chained_order_patches_are_folded(self):
+        merged = consumers._merge_order_patch(
+            {"id": "o-1", "version": 2, "baseVersion": 1, "ops": [{"op": "replace", "path": "/status", "value": "a"}]},
+            {"id": "o-1", "version": 3, "baseVersion": 2, "ops": [{"op": "replace", "path": "/status", "value": "b"}]},
+        )
+        self.assertEqual((merged["baseVersion"], merged["version"], len(merged["ops"])), (1, 3, 2))
+        self.assertIsNone(consumers._merge_order_patch({"version": 2, "ops": []}, {"version": 4, "baseVersion": 3, "ops": []}))
+
+
+class RealtimeBenchTests(SimpleTestCase):
+    def test_small_run_delivers_everything(self):
+        from api.realtime_bench import run_benchmark
+
+        report = run_benchmark(clients=2, rate=500, events=16, batch_ms=0, drain_seconds=2)
+        self.assertEqual(report["deliveriesExpected"], 32)
+        self.assertEqual((report["delivered"], report["dropped"]), (32, 0))
+        self.assertIsNotNone(report["latencyMs"]["p99"])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, WS_ACTOR_CACHE_SECONDS=60)
+class AsyncHandshakeTests(SimpleTestCase):
+    def setUp(self):
+        consumers._actor_cache.clear()
+        self.addCleanup(consumers._actor_cache.clear)
+        self.loads = []
+        self.release = threading.Event()
+        self.stored = {"id": "u-9", "role": "manager"}
+
+        def fake_load(claims):
+            self.loads.append(claims["sub"])
+            self.release.wait(5)
+            if claims["sub"] != self.stored["id"]:
+                return None, None
+            return dict(self.stored), {"id": "u-9", "name": "Nine", "role": "manager"}
+
+        original = consumers._load_actor
+        consumers._load_actor = fake_load
+        self.addCleanup(lambda: setattr(consumers, "_load_actor", original))
+        self.addCleanup(self.release.set)
+
+    def _token(self, user_id):
+        return _issue_jwt_from_dict({"id": user_id, "email": f"{user_id}@example.com", "role": "staff"})
+
+    def test_ack_precedes_profile_load_and_role_is_corrected(self):
+        async def scenario():
+            layer = get_channel_layer()
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), f"/ws/events/?token={self._token('u-9')}")
+            connected, _ = await comm.connect()
+            self.assertTrue(connected)
+            ack = await comm.receive_json_from()
+            self.assertEqual((ack["event"], ack["payload"]["role"], ack["payload"]["user"]), ("connection.established", "staff", None))
+
+            self.release.set()
+            profile = await comm.receive_json_from(timeout=2)
+            self.assertEqual((profile["event"], profile["payload"]["role"]), ("connection.profile", "manager"))
+            self.assertIn("role_manager", layer.groups)
+            self.assertNotIn("role_staff", layer.groups)
+            await comm.disconnect()
+
+            # Cached: the next handshake gets the profile immediately without another load
+            again = WebsocketCommunicator(EventStreamConsumer.as_asgi(), f"/ws/events/?token={self._token('u-9')}")
+            await again.connect()
+            ack = await again.receive_json_from()
+            self.assertEqual(ack["payload"]["user"]["name"], "Nine")
+            self.assertTrue(await again.receive_nothing())
+            await again.disconnect()
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.loads, ["u-9"])
+
+    def test_unknown_user_is_disconnected_after_lookup(self):
+        async def scenario():
+            self.release.set()
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), f"/ws/events/?token={self._token('gone')}")
+            await comm.connect()
+            await comm.receive_json_from()
+            closed = await comm.receive_output(timeout=2)
+            self.assertEqual(closed, {"type": "websocket.close", "code": 4401})
+            await comm.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_invalid_token_is_rejected_without_lookup(self):
+        async def scenario():
+            comm = WebsocketCommunicator(EventStreamConsumer.as_asgi(), "/ws/events/?token=not-a-jwt")
+            connected, code = await comm.connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, 4401)
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.loads, [])
@@ -0,0 +1,440 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as dj_tz
+
+from api import inventory_services as inv
+from api.inventory_checkpoints import build_checkpoint
+from api.inventory_scan import run_scan
+from api.locations import forget_location, get_location
+from api.models import AppUser, Batch, InventoryActivity, InventoryAlert, InventoryItem, Location, Notification, ReorderSetting, StockBalance, StockMovement
+from api.report_buckets import local_midnight
+from api.tests.test_orders import auth_headers
+from api.utils_dbtime import DbClock
+
+
+# UTC_TIMESTAMP() is MySQL-only; the test database uses the app clock
+@mock.patch('api.inventory_services.db_now', dj_tz.now)
+class StockBalanceTests(TestCase):
+    def setUp(self):
+        self.main = Location.objects.get_or_create(code='MAIN', defaults={'name': 'Main'})[0]
+        self.bar = Location.objects.create(code='BAR', name='Bar')
+        self.rice = InventoryItem.objects.create(name='Rice', unit='kg')
+        self.early = Batch.objects.create(item=self.rice, lot_code='A', expiry_date=date.today() + timedelta(days=3))
+        self.late = Batch.objects.create(item=self.rice, lot_code='B', expiry_date=date.today() + timedelta(days=30))
+
+    def _balances(self):
+        return {
+            (b.location.code, b.batch_key and Batch.objects.get(id=b.batch_key).lot_code): b.qty
+            for b in StockBalance.objects.select_related('location').all()
+        }
+
+    def test_movements_keep_balances_in_step_with_the_ledger(self):
+        inv.record_receipt(item=self.rice, qty=Decimal('5'), location=self.main, batch=self.late)
+        inv.record_receipt(item=self.rice, qty=Decimal('4'), location=self.main, batch=self.early)
+        inv.consume_for_order(order_id='o-1', components=[(self.rice, Decimal('6'))], location=self.main)
+        inv.transfer_stock(item=self.rice, qty=Decimal('2'), from_location=self.main, to_location=self.bar)
+        inv.adjust_stock(item=self.rice, delta_qty=Decimal('1.5'), location=self.bar, reason='count')
+
+        # FEFO: the early batch is consumed first
+        self.assertEqual(self._balances(), {
+            ('MAIN', 'A'): Decimal('0'),
+            ('MAIN', 'B'): Decimal('1'),
+            ('BAR', 'B'): Decimal('2'),
+            ('BAR', ''): Decimal('1.5'),
+        })
+        self.assertEqual(inv.get_current_stock([str(self.rice.id)]), {str(self.rice.id): Decimal('4.5')})
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.quantity, Decimal('4.50'))
+        self.assertEqual(inv.verify_balances(), [])
+
+        with self.assertRaises(ValueError):
+            inv.consume_for_order(order_id='o-2', components=[(self.rice, Decimal('2'))], location=self.main)
+
+    def test_orders_are_allocated_together_and_replayed_by_key(self):
+        oil = InventoryItem.objects.create(name='Oil', unit='l')
+        inv.record_receipt(item=self.rice, qty=Decimal('3'), location=self.main, batch=self.late)
+        inv.record_receipt(item=self.rice, qty=Decimal('2'), location=self.main, batch=self.early)
+        inv.record_receipt(item=oil, qty=Decimal('1'), location=self.main)
+        orders = [
+            inv.OrderConsumption('o-1', [(self.rice, Decimal('3')), (oil, Decimal('1'))], idempotency_key='order:o-1'),
+            inv.OrderConsumption('o-2', [(self.rice, Decimal('2'))]),
+        ]
+
+        result = inv.consume_for_orders(orders, location=self.main)
+        # o-1 empties the early batch first; o-2 sees only what o-1 left
+        self.assertEqual(
+            [(m.batch and m.batch.lot_code, m.qty) for m in result['o-1']],
+            [('A', Decimal('-2')), ('B', Decimal('-1')), (None, Decimal('-1'))],
+        )
+        self.assertEqual([(m.batch.lot_code, m.qty) for m in result['o-2']], [('B', Decimal('-2'))])
+        self.assertEqual(inv.verify_balances(), [])
+
+        again = inv.consume_for_order(order_id='o-1', components=orders[0].components, location=self.main, idempotency_key='order:o-1')
+        self.assertEqual([m.id for m in again], [m.id for m in result['o-1']])
+
+        # A shortage in any order writes nothing
+        count = StockMovement.objects.count()
+        inv.record_receipt(item=oil, qty=Decimal('5'), location=self.main)
+        with self.assertRaises(ValueError):
+            inv.consume_for_orders([
+                inv.OrderConsumption('o-3', [(oil, Decimal('1'))]),
+                inv.OrderConsumption('o-4', [(self.rice, Decimal('1'))]),
+            ], location=self.main)
+        self.assertEqual(StockMovement.objects.count(), count + 1)
+
+    def test_low_stock_is_evaluated_per_location_in_one_query(self):
+        sugar = InventoryItem.objects.create(name='Sugar', unit='kg')
+        ReorderSetting.objects.create(item=self.rice, location=self.main, reorder_point=Decimal('5'))
+        ReorderSetting.objects.create(item=self.rice, location=self.bar, reorder_point=Decimal('2'))
+        ReorderSetting.objects.create(item=sugar, location=self.main, reorder_point=Decimal('1'), low_stock_threshold=Decimal('1'))
+        inv.record_receipt(item=self.rice, qty=Decimal('4'), location=self.main)
+        inv.record_receipt(item=self.rice, qty=Decimal('3'), location=self.bar)
+
+        with self.assertNumQueries(1):
+            low = inv.get_low_stock()
+        # Sugar has no balance rows at all and counts as zero
+        self.assertEqual([(item.name, qty) for item, qty in low], [('Rice', Decimal('4')), ('Sugar', Decimal('0'))])
+        self.assertEqual(inv.get_low_stock([str(sugar.id)]), [(sugar, Decimal('0'))])
+
+        staff = AppUser.objects.create(email='mgr@example.com', name='Mgr', role='manager', status='active')
+        inv._maybe_notify_low_stock([str(self.rice.id), str(sugar.id)])
+        self.assertEqual(list(Notification.objects.filter(user=staff).values_list('title', flat=True)), ['Low stock: Sugar'])
+
+    def test_verifier_reports_and_fixes_drift(self):
+        inv.record_receipt(item=self.rice, qty=Decimal('3'), location=self.main, batch=self.early)
+        StockBalance.objects.filter(item=self.rice).update(qty=Decimal('7'))
+        # Reads come from the balance table, so the drift is visible
+        self.assertEqual(inv.get_current_stock([str(self.rice.id)])[str(self.rice.id)], Decimal('7'))
+
+        drift = inv.verify_balances(fix=True)
+        self.assertEqual([(d['ledger'], d['balance']) for d in drift], [(Decimal('3'), Decimal('7'))])
+        self.assertEqual(inv.verify_balances(), [])
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+
+@mock.patch('api.inventory_services.db_now', dj_tz.now)
+@mock.patch('api.inventory_checkpoints.db_now', dj_tz.now)
+@override_settings(INVENTORY_CHECKPOINT_SAFETY_SECONDS=0)
+class LedgerCheckpointTests(TestCase):
+    def setUp(self):
+        self.main = Location.objects.get_or_create(code='MAIN', defaults={'name': 'Main'})[0]
+        self.oil = InventoryItem.objects.create(name='Oil', unit='l')
+        self.today = local_midnight(dj_tz.now())
+
+    def _ledger(self, as_of):
+        total = StockMovement.objects.filter(item=self.oil, effective_at__lte=as_of).aggregate(t=Sum('qty'))['t']
+        return total or Decimal('0')
+
+    def test_as_of_reads_checkpoint_plus_later_and_backdated_movements(self):
+        three_days = self.today - timedelta(days=3)
+        inv.record_receipt(item=self.oil, qty=Decimal('10'), location=self.main, effective_at=three_days)
+        inv.adjust_stock(item=self.oil, delta_qty=Decimal('-4'), location=self.main, effective_at=three_days + timedelta(days=1))
+        first = build_checkpoint(self.today - timedelta(days=1))
+        self.assertEqual(first.line_count, 1)
+
+        # Entered after the checkpoint but dated before it
+        inv.adjust_stock(item=self.oil, delta_qty=Decimal('1'), location=self.main, effective_at=three_days)
+        inv.record_receipt(item=self.oil, qty=Decimal('5'), location=self.main, effective_at=self.today + timedelta(minutes=1))
+
+        oil = str(self.oil.id)
+        for as_of in (self.today - timedelta(hours=12), dj_tz.now()):
+            with CaptureQueriesContext(connection) as ctx:
+                stock = inv.get_current_stock([oil], as_of=as_of)
+            self.assertEqual(stock[oil], self._ledger(as_of))
+            self.assertEqual(len(ctx.captured_queries), 3)  # checkpoint, its lines, the tail
+
+        # Built incrementally from the first checkpoint
+        second = build_checkpoint(self.today)
+        line = second.lines.get()
+        self.assertEqual(line.qty, self._ledger(self.today))
+        self.assertEqual(inv.get_current_stock([oil], as_of=dj_tz.now())[oil], Decimal('12'))
+
+
+@override_settings(INVENTORY_SCAN_SAFETY_SECONDS=0, INVENTORY_SCAN_CHUNK=1)
+class InventoryScanTests(TestCase):
+    def setUp(self):
+        for target in ('api.inventory_services.db_now', 'api.inventory_scan.db_now'):
+            patcher = mock.patch(target, dj_tz.now)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.main = Location.objects.get_or_create(code='MAIN', defaults={'name': 'Main'})[0]
+        self.manager = AppUser.objects.create(email='mgr@example.com', name='Mgr', role='manager', status='active')
+        self.rice = InventoryItem.objects.create(name='Rice', unit='kg')
+        self.salt = InventoryItem.objects.create(name='Salt', unit='kg')
+        for item in (self.rice, self.salt):
+            ReorderSetting.objects.create(item=item, location=self.main, reorder_point=Decimal('5'))
+        batch = Batch.objects.create(item=self.rice, lot_code='A', expiry_date=date.today() + timedelta(days=3))
+        inv.record_receipt(item=self.rice, qty=Decimal('3'), location=self.main, batch=batch)
+        inv.record_receipt(item=self.salt, qty=Decimal('2'), location=self.main)
+
+    def _titles(self):
+        titles = Notification.objects.filter(user=self.manager).values_list('title', flat=True)
+        return sorted(titles)
+
+    def test_reports_state_changes_once_and_only_rechecks_moved_items(self):
+        result = run_scan()
+        self.assertEqual((result['lowStock'], result['expiring']), (2, 1))
+        self.assertEqual(self._titles(), ['Expiring soon: Rice', 'Low stock: Rice', 'Low stock: Salt'])
+
+        # Nothing changed: nothing new
+        self.assertEqual(run_scan()['notifications'], 0)
+
+        # Salt has no movements since the watermark, so its lost state is not rebuilt
+        InventoryAlert.objects.filter(subject__startswith=str(self.salt.id)).delete()
+        inv.record_receipt(item=self.rice, qty=Decimal('10'), location=self.main)
+        result = run_scan()
+        self.assertEqual((result['itemsChecked'], result['recovered'], result['notifications']), (1, 1, 0))
+
+        # Running low again is a new state and is reported again
+        inv.adjust_stock(item=self.rice, delta_qty=Decimal('-9'), location=self.main)
+        self.assertEqual(run_scan()['notifications'], 1)
+        self.assertEqual(self._titles().count('Low stock: Rice'), 2)
+        self.assertEqual(run_scan(full=True)['lowStock'], 1)  # Salt, whose alert was deleted
+
+    def test_alert_upsert_names_no_conflict_target_where_mysql_cannot(self):
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(InventoryAlert.objects, 'bulk_create') as upsert:
+            run_scan()
+        self.assertIsNone(upsert.call_args.kwargs['unique_fields'])
+        self.assertTrue(upsert.call_args.kwargs['update_conflicts'])
+
+
+def _drain(resp):
+    """Collect an async streaming body from the sync test client."""
+    async def read():
+        return [chunk async for chunk in resp.streaming_content]
+    return async_to_sync(read)()
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('api.inventory_services.db_now', dj_tz.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = AppUser.objects.create(email='clerk@example.com', name='Clerk', role='staff', status='active')
+        self.main = Location.objects.get_or_create(code='MAIN', defaults={'name': 'Main'})[0]
+        self.flour = InventoryItem.objects.create(name='Flour', unit='kg')
+        self.start = local_midnight(dj_tz.now()) - timedelta(days=10)
+        inv.record_receipt(item=self.flour, qty=Decimal('20'), location=self.main, effective_at=self.start)
+        # Several movements share one effective_at, so pages split on recorded_at/id
+        for qty in ('-1', '-2', '-3'):
+            inv.adjust_stock(item=self.flour, delta_qty=Decimal(qty), location=self.main, effective_at=self.start + timedelta(days=1))
+        inv.record_receipt(item=self.flour, qty=Decimal('5'), location=self.main, effective_at=self.start + timedelta(days=2))
+
+    def _get(self, **params):
+        return self.client.get('/api/inventory/ledger', {'itemId': str(self.flour.id), **params}, **auth_headers(self.user))
+
+    def test_cursor_pages_and_exports_carry_running_balances(self):
+        balances, cursor = [], None
+        while True:
+            body = self._get(limit=2, **({'cursor': cursor} if cursor else {})).json()
+            balances += [row['balance'] for row in body['data']]
+            cursor = body['pagination']['nextCursor']
+            if not cursor:
+                break
+        self.assertEqual(len(balances), 5)
+        self.assertEqual(balances[0], 20.0)
+        self.assertEqual(balances[-1], 19.0)
+
+        # The opening balance of a date-bounded range comes from before it
+        ranged = self._get(**{'from': (self.start + timedelta(days=2)).isoformat()}).json()['data']
+        self.assertEqual([row['balance'] for row in ranged], [19.0])
+
+        ndjson = self._get(format='ndjson')
+        lines = b''.join(_drain(ndjson)).decode().splitlines()
+        self.assertEqual([json.loads(line)['balance'] for line in lines], balances)
+        csv_rows = b''.join(_drain(self._get(format='csv'))).decode().splitlines()
+        self.assertEqual(csv_rows[0].split(',')[:6], ['id', 'effectiveAt', 'recordedAt', 'type', 'qty', 'balance'])
+        self.assertEqual(len(csv_rows), 6)
+
+        self.assertEqual(self._get(cursor='not-a-cursor').status_code, 400)
+
+
+    @override_settings(LEDGER_EXPORT_CHUNK=2)
+    def test_export_streams_chunks_as_they_are_read(self):
+        resp = self._get(format='ndjson')
+        self.assertTrue(resp.is_async)
+
+        async def first_chunk():
+            return await anext(aiter(resp.streaming_content))
+
+        with CaptureQueriesContext(connection) as ctx:
+            first = async_to_sync(first_chunk)()
+        # Only the first keyset chunk has been read when the first bytes go out
+        self.assertEqual(len(first.decode().splitlines()), 2)
+        self.assertEqual(sum('inv_stock_movement' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual(len(b''.join(_drain(self._get(format='ndjson'))).decode().splitlines()), 5)
+
+    def test_activity_feed_merges_movements_and_item_edits_by_cursor(self):
+        moves = list(StockMovement.objects.order_by('recorded_at', 'id'))
+        base = dj_tz.now() - timedelta(hours=1)
+        for i, mv in enumerate(moves):
+            StockMovement.objects.filter(id=mv.id).update(recorded_at=base + timedelta(minutes=2 * i))
+        for i in range(3):
+            edit = InventoryActivity.objects.create(item=self.flour, action='update', reason=f'edit {i}')
+            # Edits land between movements, one sharing a movement's timestamp
+            InventoryActivity.objects.filter(id=edit.id).update(created_at=base + timedelta(minutes=3 * i + 1 if i else 0))
+
+        seen, cursor = [], None
+        while True:
+            body = self.client.get(
+                '/api/inventory/recent-activity', {'limit': 3, **({'cursor': cursor} if cursor else {})}, **auth_headers(self.user)
+            ).json()
+            seen += body['data']
+            cursor = body['pagination']['nextCursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len({row['id'] for row in seen}), 8)
+        stamps = [row['recordedAt'] for row in seen]
+        self.assertEqual(stamps, sorted(stamps, reverse=True))
+        self.assertEqual(sum(row['type'] == 'ITEM_UPDATE' for row in seen), 3)
+
+        only_edits = self.client.get('/api/inventory/recent-activity', {'types': 'ITEM_UPDATE'}, **auth_headers(self.user)).json()
+        self.assertEqual([row['reason'] for row in only_edits['data']], ['edit 2', 'edit 1', 'edit 0'])
+
+
+class LocationRegistryTests(TestCase):
+    def tearDown(self):
+        forget_location()
+
+    def test_resolves_from_cache_after_commit_and_forgets_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bar = get_location('BAR')
+        self.assertEqual((bar.code, bar.name), ('BAR', 'Bar'))
+        with self.assertNumQueries(0):
+            self.assertIs(get_location('BAR'), bar)
+
+        bar.name = 'Bar counter'
+        bar.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(get_location('BAR').name, 'Bar counter')
+        self.assertEqual(Location.objects.filter(code='BAR').count(), 1)
+
+        # Not cached until the transaction that created it commits
+        with self.captureOnCommitCallbacks(execute=False):
+            get_location('PATIO')
+        with self.assertNumQueries(1):
+            get_location('PATIO')
+
+
+class StockImportTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('api.inventory_services.db_now', dj_tz.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = AppUser.objects.create(email='stock@example.com', name='Stock', role='staff', status='active', permissions=['all'])
+        self.main = Location.objects.get_or_create(code='MAIN', defaults={'name': 'Main'})[0]
+        self.flour = InventoryItem.objects.create(name='Flour', unit='kg')
+        self.sugar = InventoryItem.objects.create(name='Sugar', unit='kg')
+        inv.record_receipt(item=self.sugar, qty=Decimal('2'), location=self.main)
+
+    def _post(self, body, **headers):
+        return self.client.post('/api/inventory/import?goodsReceiptId=GR-7', data=body, content_type='text/csv', **auth_headers(self.user), **headers)
+
+    def test_imports_all_lines_at_once_with_one_event(self):
+        body = (
+            'Item Name,Qty,Type,Lot Code,Expiry Date,Unit Cost,Reason\n'
+            'Flour,10,receipt,L1,2030-01-31,1.25,\n'
+            'flour,5,,,,,\n'
+            f'{self.sugar.name},-1.5,adjustment,,,,spillage\n'
+        )
+        with mock.patch('api.events.publish_event') as publish, self.captureOnCommitCallbacks(execute=True):
+            resp = self._post(body, HTTP_IDEMPOTENCY_KEY='gr-7')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        self.assertEqual((data['lines'], data['receipts'], data['adjustments'], data['batches']), (3, 2, 1, 1))
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args[0][0], 'inventory.import_recorded')
+
+        self.assertEqual(inv.get_current_stock([str(self.flour.id)])[str(self.flour.id)], Decimal('15'))
+        self.flour.refresh_from_db()
+        self.assertEqual((self.flour.quantity, self.flour.last_restocked is not None), (Decimal('15.00'), True))
+        self.assertEqual(Batch.objects.get(item=self.flour).lot_code, 'L1')
+        self.assertEqual(StockMovement.objects.filter(reference_id='GR-7').count(), 3)
+        self.assertEqual(inv.verify_balances(), [])
+
+        # Same key again: nothing new is written
+        replay = self._post(body, HTTP_IDEMPOTENCY_KEY='gr-7').json()['data']
+        self.assertTrue(replay['replayed'])
+        self.assertEqual(StockMovement.objects.filter(reference_id='GR-7').count(), 3)
+
+    def test_reports_every_bad_line_and_writes_nothing(self):
+        body = (
+            'itemId,qty,type\n'
+            f'{self.flour.id},-3,receipt\n'
+            '00000000-0000-0000-0000-000000000000,1,receipt\n'
+            f'{self.flour.id},4,receipt\n'
+            f'{self.sugar.id},-5,adjustment\n'
+        )
+        resp = self._post(body)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([e['line'] for e in resp.json()['errors']], [1, 2])
+
+        # Shortages are found under lock, before anything is written
+        resp = self._post('\n'.join(body.splitlines()[:1] + body.splitlines()[3:]) + '\n')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['errors'], [{'line': 2, 'message': 'Adjustment would result in negative stock'}])
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_receipts_earlier_in_the_file_cover_later_adjustments(self):
+        # Names match whatever their case; 2 on hand + 10 received covers -12
+        resp = self._post('itemName,qty,type\nSUGAR,10,receipt\nsugar,-12,adjustment\n')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(inv.get_current_stock([str(self.sugar.id)])[str(self.sugar.id)], Decimal('0'))
+
+        # Only the adjustment that goes short is reported, not the receipt after it
+        resp = self._post('itemName,qty,type\nSugar,-1,adjustment\nSugar,5,receipt\n')
+        self.assertEqual(resp.json()['errors'], [{'line': 1, 'message': 'Adjustment would result in negative stock'}])
+
+
+@override_settings(DB_CLOCK_RESYNC_SECONDS=60, DB_CLOCK_MAX_DRIFT_SECONDS=1)
+class DbClockTests(SimpleTestCase):
+    def setUp(self):
+        self.server = dj_tz.now()
+        self.mono = 100.0
+        self.wall = 5000.0
+        self.samples = 0
+
+        def sample():
+            self.samples += 1
+            return self.server
+
+        self.clock = DbClock(sample=sample, monotonic=lambda: self.mono, wall=lambda: self.wall)
+
+    def _advance(self, seconds, wall=None):
+        self.mono += seconds
+        self.wall += seconds if wall is None else wall
+        self.server += timedelta(seconds=seconds)
+
+    def test_serves_from_the_offset_and_resyncs_on_age_or_drift(self):
+        self.assertEqual(self.clock.now(), self.server)
+        self._advance(30)
+        self.assertEqual(self.clock.now(), self.server)
+        self.assertEqual(self.samples, 1)
+
+        self._advance(30)  # resync interval reached
+        self.clock.now()
+        self.assertEqual(self.samples, 2)
+
+        self._advance(1, wall=5)  # host clock stepped
+        self.clock.now()
+        self.assertEqual(self.samples, 3)
+
+    def test_never_goes_backwards_after_a_resync(self):
+        first = self.clock.now()
+        self._advance(60)
+        self.server -= timedelta(seconds=70)  # server clock stepped back
+        # Held at the last value served until the server catches up
+        with self.assertLogs('api.utils_dbtime', 'WARNING'):
+            self.assertEqual(self.clock.now(), first)
+        self._advance(15)
+        self.assertEqual(self.clock.now(), first + timedelta(seconds=5))
@@ -0,0 +1,70 @@
+import copy
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api import order_patches
+from api.models import Order
+from api.order_patches import apply_patch, build_order_patch, compact_order, current_version, diff, from_channel, to_channel
+
+
+class OrderPatchTests(TestCase):
+    def setUp(self):
+        order_patches._last_published.clear()
+        cache.clear()
+        self.order = Order.objects.create(order_number='P-1', status='accepted')
+        self.payload = {
+            'id': str(self.order.id),
+            'status': 'accepted',
+            'ageSeconds': 3,
+            'autoAdvance': {'paused': False},
+            'items': [
+                {'id': 'i1', 'state': 'queued', 'secondsInState': 1},
+                {'id': 'i2', 'state': 'queued', 'secondsInState': 1},
+            ],
+        }
+
+    def test_second_event_is_a_small_patch_on_the_previous_version(self):
+        with self.assertNumQueries(0):  # versions come from the cache, not the order row
+            first = build_order_patch(self.payload)
+        self.assertNotIn('ageSeconds', first['snapshot'])
+
+        updated = copy.deepcopy(self.payload)
+        updated['status'] = 'in_prep'
+        updated['ageSeconds'] = 30
+        updated['items'][1]['state'] = 'cooking'
+        second = build_order_patch(updated)
+
+        self.assertEqual((second['version'], second['baseVersion']), (first['version'] + 1, first['version']))
+        self.assertEqual(
+            sorted(op['path'] for op in second['ops']),
+            ['/items/1/state', '/status'],
+        )
+        rebuilt = apply_patch(copy.deepcopy(first['snapshot']), second['ops'])
+        self.assertEqual(rebuilt, compact_order(updated))
+        self.assertEqual(current_version(str(self.order.id)), second['version'])
+
+    def test_unknown_base_falls_back_to_snapshot(self):
+        first = build_order_patch(self.payload)
+        order_patches._last_published.clear()  # e.g. previous version came from another worker
+        nxt = build_order_patch(self.payload)
+        self.assertEqual(nxt['version'], first['version'] + 1)
+        self.assertIn('snapshot', nxt)
+        self.assertNotIn('ops', nxt)
+
+        # The channel message already carries the order, so the snapshot is not sent twice
+        wire = to_channel(nxt)
+        self.assertNotIn('snapshot', wire)
+        self.assertEqual(from_channel(wire, self.payload), nxt)
+
+    def test_lost_counter_restarts_above_earlier_versions(self):
+        first = build_order_patch(self.payload)
+        cache.clear()
+        self.assertGreater(build_order_patch(self.payload)['version'], first['version'])
+
+    def test_reordered_items_replace_the_list(self):
+        old = {'items': [{'id': 'a'}, {'id': 'b'}]}
+        new = {'items': [{'id': 'b'}, {'id': 'a'}], 'note': 'x'}
+        ops = diff(old, new)
+        self.assertIn({'op': 'replace', 'path': '/items', 'value': new['items']}, ops)
+        self.assertEqual(apply_patch(copy.deepcopy(old), ops), new)
@@ -0,0 +1,327 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as dj_tz
+
+from api.models import AppUser, CustomerSummary, Order, OrderItem, OrderRollupEntry, PaymentTransaction, ReportJob, SalesRollup
+from api.payment_lookup import payments_for_orders
+from api.report_buckets import bucket_edges, fold, local_midnight, month_edges
+from api.report_cache import bump_generation, cached_report, last_value_key, report_key
+from api.report_rollups import rebuild, rebuild_customers, totals_by_key
+from api.tests.test_orders import auth_headers
+
+
+def _order(number, when, total, items=(), status=Order.STATUS_COMPLETED):
+    order = Order.objects.create(order_number=number, status=status, total_amount=total)
+    for name, category, price, qty in items:
+        OrderItem.objects.create(order=order, item_name=name, category=category, price=price, quantity=qty)
+    Order.objects.filter(pk=order.pk).update(created_at=when)
+    return order
+
+
+class DashboardAggregationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = AppUser.objects.create(email='admin@example.com', name='Admin', role='admin', status='active')
+        self.today = local_midnight(dj_tz.now())
+        self.yesterday = self.today - timedelta(days=1)
+
+    def test_hourly_series_categories_and_popular_items(self):
+        _order('D-1', self.today + timedelta(seconds=1), 30, [('Adobo', 'Meals', 10, 3)])
+        _order('D-2', self.yesterday + timedelta(hours=13, minutes=5), 12, [('Iced Tea', 'Drinks', 6, 2)])
+        _order('D-3', self.today + timedelta(seconds=2), 99, [('Adobo', 'Meals', 10, 9)], status=Order.STATUS_VOIDED)
+        PaymentTransaction.objects.create(order_id='D-1', amount=Decimal('30'), method='cash')
+        rebuild(self.yesterday, dj_tz.now())
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/reports/dashboard?range=today', **auth_headers(self.admin))
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+
+        self.assertEqual(len(data['salesByTime']), 24)
+        self.assertEqual(data['salesByTime'][0]['amount'], 30.0)
+        self.assertEqual(sum(b['amount'] for b in data['salesByTime']), 30.0)
+        self.assertEqual(data['salesByTimeYesterday'][13]['amount'], 12.0)
+        self.assertEqual(data['salesByCategory'], [{'category': 'Meals', 'amount': 30.0}])
+        self.assertEqual(data['salesByCategoryYesterday'], [{'category': 'Drinks', 'amount': 12.0}])
+        self.assertEqual(data['popularItems'], [{'name': 'Adobo', 'count': 3}])
+        self.assertEqual((data['orderCount'], data['orderCountYesterday']), (1, 1))
+        self.assertEqual(data['dailySales'], 30.0)
+        # Fixed number of queries regardless of range: auth + aggregates + recent sales
+        self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_recent_sales_resolve_payments_in_one_query(self):
+        orders = [_order(f'P-{i}', self.today + timedelta(seconds=i + 1), 10) for i in range(5)]
+        PaymentTransaction.objects.create(order_id=str(orders[0].id), amount=Decimal('10'), method='card')
+        PaymentTransaction.objects.create(order_id='P-1', amount=Decimal('10'), method='mobile')
+
+        with CaptureQueriesContext(connection) as ctx:
+            payments = payments_for_orders(orders)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(payments[str(orders[0].id)].method, 'card')
+        self.assertEqual(payments[str(orders[1].id)].method, 'mobile')
+        self.assertNotIn(str(orders[2].id), payments)
+
+        data = self.client.get('/api/reports/dashboard?range=today', **auth_headers(self.admin)).json()['data']
+        methods = {row['id']: row['paymentMethod'] for row in data['recentSales']}
+        self.assertEqual((methods['P-0'], methods['P-1'], methods['P-2']), ('card', 'mobile', 'cash'))
+
+    def test_daily_buckets_are_zero_filled(self):
+        edges = bucket_edges(self.today - timedelta(days=2), 'day', 3)
+        rows = [(self.today + timedelta(hours=5), Decimal('7'))]
+        self.assertEqual(fold(rows, edges), [Decimal('0'), Decimal('0'), Decimal('7')])
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Staff with full permissions: no admin/manager to notify on completion
+        self.admin = AppUser.objects.create(
+            email='lead@example.com', name='Lead', role='staff', status='active', permissions=['all']
+        )
+        self.today = local_midnight(dj_tz.now())
+
+    def test_payment_and_refund_update_rollups_incrementally(self):
+        order = _order('R-1', self.today + timedelta(seconds=1), 25, status=Order.STATUS_ACCEPTED)
+        resp = self.client.post(
+            f'/api/orders/{order.id}/payment',
+            data={'amount': 25, 'method': 'cash'},
+            content_type='application/json',
+            **auth_headers(self.admin),
+        )
+        self.assertEqual(resp.status_code, 200)
+        now = dj_tz.now()
+        self.assertEqual(totals_by_key(SalesRollup.DIM_PAYMENT_METHOD, self.today, now)['cash']['amount'], Decimal('25'))
+
+        self.client.post(f"/api/payments/{resp.json()['data']['id']}/refund", **auth_headers(self.admin))
+        self.assertEqual(totals_by_key(SalesRollup.DIM_PAYMENT_METHOD, self.today, now)['cash']['amount'], Decimal('0'))
+        self.assertEqual(totals_by_key(SalesRollup.DIM_REFUND_METHOD, self.today, now)['cash']['amount'], Decimal('25'))
+
+        sales = self.client.get('/api/reports/sales?range=today', **auth_headers(self.admin)).json()['data']
+        self.assertEqual((sales['total'], sales['byMethod']), (25.0, {'cash': 25.0}))
+
+    def test_rebuild_counts_only_refunds_of_completed_payments(self):
+        paid = PaymentTransaction.objects.create(order_id='R-2', amount=Decimal('25'), method='cash', customer='Eli')
+        pending = PaymentTransaction.objects.create(
+            order_id='R-3', amount=Decimal('9'), method='cash', customer='Eli', status=PaymentTransaction.STATUS_PENDING
+        )
+        for p in (paid, pending):
+            self.client.post(f'/api/payments/{p.id}/refund', **auth_headers(self.admin))
+        now = dj_tz.now()
+        incremental = totals_by_key(SalesRollup.DIM_REFUND_METHOD, self.today, now)
+
+        rebuild(self.today, now)
+        self.assertEqual(totals_by_key(SalesRollup.DIM_REFUND_METHOD, self.today, now), incremental)
+        self.assertEqual(incremental['cash']['amount'], Decimal('25'))
+        rebuild_customers()
+        row = CustomerSummary.objects.get(key='eli')
+        self.assertEqual((row.refunded_amount, row.refund_count), (Decimal('25'), 1))
+
+    def test_completion_adds_order_once_and_leaving_completed_reverts(self):
+        order = _order('R-2', self.today + timedelta(seconds=1), 40, [('Sisig', 'Meals', 20, 2)], status='staged')
+        for status in ('completed', 'completed'):
+            self.client.patch(
+                f'/api/orders/{order.id}/status',
+                data={'status': status},
+                content_type='application/json',
+                **auth_headers(self.admin),
+            )
+        now = dj_tz.now()
+        self.assertEqual(totals_by_key(SalesRollup.DIM_MENU_ITEM, self.today, now)['Sisig']['quantity'], 2)
+        day = SalesRollup.objects.get(grain='day', dimension='channel', bucket=self.today)
+        self.assertEqual((day.amount, day.count), (Decimal('40'), 1))
+
+        self.client.patch(
+            f'/api/orders/{order.id}/status',
+            data={'status': 'refunded'},
+            content_type='application/json',
+            **auth_headers(self.admin),
+        )
+        day.refresh_from_db()
+        self.assertEqual((day.amount, day.count), (Decimal('0'), 0))
+        self.assertFalse(OrderRollupEntry.objects.filter(order=order).exists())
+
+
+@override_settings(REPORT_CACHE_SECONDS=30, REPORT_CACHE_STALE_SECONDS=60)
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+    def test_hit_until_generation_bump(self):
+        self.assertEqual(cached_report('sales', {'range': 'today'}, self.compute), {'calls': 1})
+        self.assertEqual(cached_report('sales', {'range': 'today'}, self.compute), {'calls': 1})
+        self.assertEqual(cached_report('sales', {'range': '7d'}, self.compute), {'calls': 2})
+
+        bump_generation()
+        self.assertEqual(cached_report('sales', {'range': 'today'}, self.compute), {'calls': 3})
+
+    def test_payment_commit_invalidates_cached_sales(self):
+        admin = AppUser.objects.create(
+            email='lead@example.com', name='Lead', role='staff', status='active', permissions=['all']
+        )
+        order = _order('C-1', dj_tz.now(), 15, status=Order.STATUS_ACCEPTED)
+        first = self.client.get('/api/reports/sales?range=today', **auth_headers(admin)).json()['data']
+        self.assertEqual(first['total'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f'/api/orders/{order.id}/payment',
+                data={'amount': 15, 'method': 'cash'},
+                content_type='application/json',
+                **auth_headers(admin),
+            )
+        second = self.client.get('/api/reports/sales?range=today', **auth_headers(admin)).json()['data']
+        self.assertEqual(second['total'], 15.0)
+
+    def test_expired_entry_is_served_while_another_worker_recomputes(self):
+        cached_report('dashboard', {'range': 'today'}, self.compute)
+        key = report_key('dashboard', {'range': 'today'})
+        entry = cache.get(key)
+        cache.set(key, {**entry, 'freshUntil': 0})  # expired but still stored
+        lock_key = f"{last_value_key('dashboard', {'range': 'today'})}:lock"
+        cache.add(lock_key, 1)  # another worker is recomputing
+
+        self.assertEqual(cached_report('dashboard', {'range': 'today'}, self.compute), {'calls': 1})
+        self.assertEqual(self.calls, 1)
+
+        cache.delete(lock_key)
+        self.assertEqual(cached_report('dashboard', {'range': 'today'}, self.compute), {'calls': 2})
+
+    @override_settings(REPORT_CACHE_LOCK_SECONDS=5)
+    def test_last_value_is_served_after_a_bump_while_another_worker_recomputes(self):
+        cached_report('dashboard', {'range': 'today'}, self.compute)
+        bump_generation()
+        cache.add(f"{last_value_key('dashboard', {'range': 'today'})}:lock", 1)
+
+        started = time.monotonic()
+        self.assertEqual(cached_report('dashboard', {'range': 'today'}, self.compute), {'calls': 1})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.calls, 1)
+
+
+class CustomerHistoryTests(TestCase):
+    def setUp(self):
+        self.admin = AppUser.objects.create(
+            email='lead@example.com', name='Lead', role='staff', status='active', permissions=['all']
+        )
+        self.today = local_midnight(dj_tz.now())
+
+    def _payment(self, customer, amount, when, status=PaymentTransaction.STATUS_COMPLETED):
+        p = PaymentTransaction.objects.create(order_id='X', amount=Decimal(amount), method='cash', customer=customer, status=status)
+        PaymentTransaction.objects.filter(pk=p.pk).update(created_at=when)
+        return p
+
+    def test_grouped_totals_with_date_filter_and_paging(self):
+        self._payment('Ana Cruz', 30, self.today + timedelta(hours=9))
+        self._payment('ana cruz ', 20, self.today - timedelta(days=3))
+        self._payment('Ben', 50, self.today + timedelta(hours=10))
+        self._payment('Ben', 5, self.today + timedelta(hours=11), status=PaymentTransaction.STATUS_REFUNDED)
+        self._payment('', 99, self.today + timedelta(hours=8))
+
+        rebuild_customers()
+        body = self.client.get('/api/reports/customer-history?limit=1', **auth_headers(self.admin)).json()
+        self.assertEqual(body['source'], 'summary')
+        self.assertEqual(body['pagination']['total'], 2)
+        # Names that differ only in case or spacing are one customer
+        self.assertEqual([(r['customer'].lower(), r['totalSpent'], r['payments']) for r in body['data']], [('ana cruz', 50.0, 2)])
+
+        today = dj_tz.localdate().isoformat()
+        body = self.client.get(f'/api/reports/customer-history?from={today}&to={today}&sort=name', **auth_headers(self.admin)).json()
+        self.assertEqual(body['source'], 'payments')
+        rows = {r['customer'].strip().lower(): (r['totalSpent'], r['payments'], r['refunded']) for r in body['data']}
+        self.assertEqual(rows, {'ana cruz': (30.0, 1, 0.0), 'ben': (50.0, 1, 5.0)})
+
+        txns = self.client.get('/api/reports/customer-history?view=transactions&customer=ben', **auth_headers(self.admin)).json()
+        self.assertEqual(len(txns['data']), 2)
+
+    def test_migration_backfills_lifetime_history(self):
+        self._payment('Ana Cruz', 30, self.today - timedelta(days=40))
+        self._payment('Ben', 5, self.today - timedelta(days=2), status=PaymentTransaction.STATUS_REFUNDED)
+        backfill = import_module('api.migrations.0056_customer_summary').backfill_customers
+        backfill(django_apps, None)
+        # A payment after the backfill adds to the row instead of replacing its history
+        order = _order('H-2', dj_tz.now(), 10, status=Order.STATUS_ACCEPTED)
+        self.client.post(
+            f'/api/orders/{order.id}/payment',
+            data={'amount': 10, 'method': 'cash', 'customer': 'Ana Cruz'},
+            content_type='application/json',
+            **auth_headers(self.admin),
+        )
+        body = self.client.get('/api/reports/customer-history', **auth_headers(self.admin)).json()
+        self.assertEqual(body['source'], 'summary')
+        rows = {r['customer'].lower(): (r['totalSpent'], r['payments'], r['refunded']) for r in body['data']}
+        self.assertEqual(rows, {'ana cruz': (40.0, 2, 0.0), 'ben': (0.0, 0, 5.0)})
+
+    def test_payment_and_refund_keep_summary_current(self):
+        order = _order('H-1', dj_tz.now(), 40, status=Order.STATUS_ACCEPTED)
+        resp = self.client.post(
+            f'/api/orders/{order.id}/payment',
+            data={'amount': 40, 'method': 'cash', 'customer': 'Dana'},
+            content_type='application/json',
+            **auth_headers(self.admin),
+        )
+        self.assertEqual(resp.status_code, 200)
+        row = CustomerSummary.objects.get(key='dana')
+        self.assertEqual((row.total_spent, row.payment_count), (Decimal('40'), 1))
+
+        self.client.post(f"/api/payments/{resp.json()['data']['id']}/refund", **auth_headers(self.admin))
+        row.refresh_from_db()
+        self.assertEqual((row.total_spent, row.payment_count, row.refunded_amount, row.refund_count), (Decimal('0'), 0, Decimal('40'), 1))
+
+
+@override_settings(REPORT_JOB_MODE='sync')
+class ReportJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = AppUser.objects.create(
+            email='lead@example.com', name='Lead', role='staff', status='active', permissions=['all']
+        )
+        self.today = local_midnight(dj_tz.now())
+
+    def test_month_edges_split_on_local_month_starts(self):
+        start = self.today.replace(month=1, day=15)
+        end = self.today.replace(month=3, day=10)
+        edges = month_edges(start, end)
+        self.assertEqual([dj_tz.localtime(e).strftime('%m-%d') for e in edges], ['01-15', '02-01', '03-01', '03-10'])
+
+    def test_job_computes_by_month_and_identical_specs_share_it(self):
+        old = self.today.replace(month=1, day=5) if self.today.month > 1 else self.today - timedelta(days=40)
+        _order('J-1', old + timedelta(hours=10), 25)
+        _order('J-2', self.today + timedelta(seconds=1), 15)
+        PaymentTransaction.objects.create(order_id='J-2', amount=Decimal('15'), method='cash')
+        rebuild(old, dj_tz.now())
+
+        spec = {'report': 'channels', 'from': dj_tz.localtime(old).date().isoformat()}
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post('/api/reports/jobs', data=spec, content_type='application/json', **auth_headers(self.admin))
+        self.assertEqual(resp.status_code, 202)
+        body = resp.json()
+        self.assertTrue(body['created'])
+        job_id = body['data']['id']
+
+        status = self.client.get(f'/api/reports/jobs/{job_id}', **auth_headers(self.admin)).json()['data']
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['progress']['done'], status['progress']['total'])
+        self.assertEqual(status['result']['total'], 40.0)
+        self.assertEqual(len(status['result']['months']), status['progress']['total'])
+
+        again = self.client.post('/api/reports/jobs', data=spec, content_type='application/json', **auth_headers(self.admin)).json()
+        self.assertFalse(again['created'])
+        self.assertEqual(again['data']['id'], job_id)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_unknown_report_is_rejected(self):
+        resp = self.client.post('/api/reports/jobs', data={'report': 'nope', 'range': 'ytd'}, content_type='application/json', **auth_headers(self.admin))
+        self.assertEqual(resp.status_code, 400)
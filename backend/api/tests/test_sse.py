@@ -0,0 +1,94 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.events import topic_group
+from api import views_sse
+from api.views_sse import EventHub, stream_events
+
+
+async def _take(gen, count):
+    frames = []
+    for _ in range(count):
+        frames.append(await asyncio.wait_for(gen.__anext__(), timeout=2))
+    await gen.aclose()
+    return frames
+
+
+class EventHubTests(SimpleTestCase):
+    def test_replays_only_events_after_last_event_id(self):
+        async def run():
+            hub = EventHub(size=10)
+            for n in range(3):
+                hub.append('order.updated', {'n': n})
+            gen = stream_events(hub, hub.format_id(1), set(), keepalive=5)
+            return hub, await _take(gen, 3)
+
+        hub, frames = asyncio.run(run())
+        self.assertTrue(frames[0].startswith('retry:'))
+        self.assertIn(f'id: {hub.format_id(2)}\n', frames[1])
+        self.assertIn('"n": 1', frames[1])
+        self.assertIn(f'id: {hub.format_id(3)}\n', frames[2])
+
+    def test_evicted_or_foreign_id_triggers_reset(self):
+        hub = EventHub(size=2)
+        for n in range(5):
+            hub.append('order.updated', {'n': n})
+        self.assertEqual(hub.resolve(hub.format_id(1)), (5, True))
+        self.assertEqual(hub.resolve('deadbeef-4'), (5, True))
+        self.assertEqual(hub.resolve(hub.format_id(3)), (3, False))
+
+        async def run():
+            gen = stream_events(hub, 'deadbeef-4', set(), keepalive=5)
+            return await _take(gen, 2)
+
+        frames = asyncio.run(run())
+        self.assertIn('event: stream.reset', frames[1])
+
+    def test_live_events_are_filtered_by_topic(self):
+        async def run():
+            hub = EventHub(size=10)
+            gen = stream_events(hub, None, {topic_group('station', 'grill')}, keepalive=5)
+            await gen.__anext__()  # retry
+            pending = asyncio.ensure_future(gen.__anext__())
+            await asyncio.sleep(0)
+            hub.append('order.updated', {'stationCode': 'bar'})
+            hub.append('order.updated', {'stationCode': 'grill'})
+            frame = await asyncio.wait_for(pending, timeout=2)
+            await gen.aclose()
+            return hub, frame
+
+        hub, frame = asyncio.run(run())
+        self.assertIn(f'id: {hub.format_id(2)}\n', frame)
+        self.assertIn('grill', frame)
+
+    def test_group_membership_is_refreshed_while_traffic_flows(self):
+        class BusyLayer:
+            def __init__(self):
+                self.joins = 0
+
+            async def new_channel(self, prefix):
+                return f'{prefix}test'
+
+            async def group_add(self, group, channel):
+                self.joins += 1
+
+            async def receive(self, channel):
+                await asyncio.sleep(0.01)
+                return {'type': 'event.message', 'event': 'order.updated', 'payload': {}}
+
+        layer = BusyLayer()
+
+        async def run():
+            hub = EventHub(size=10)
+            task = asyncio.ensure_future(hub.pump())
+            await asyncio.sleep(0.25)
+            task.cancel()
+            return hub
+
+        with mock.patch.object(views_sse, 'get_channel_layer', return_value=layer), \
+                mock.patch.object(views_sse, 'GROUP_REFRESH_SECONDS', 0.1):
+            hub = asyncio.run(run())
+        self.assertGreater(hub.seq, 5)
+        self.assertGreaterEqual(layer.joins, 2)
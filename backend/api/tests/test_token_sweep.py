@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone as dj_tz
+
+from api.models import AppUser, LoginOTP, PasswordResetCode, RefreshToken, ResetToken
+from api.utils_password_reset import _sha256_hex, find_active_reset_token, verify_password_reset_code
+from api.utils_token_sweep import sweep_expired_credentials
+
+
+@override_settings(TOKEN_SWEEP_RETENTION_SECONDS=3600)
+class CredentialSweepTests(TestCase):
+    def setUp(self):
+        self.user = AppUser.objects.create(email='sweep@example.com', name='Sweep', role='staff', status='active')
+        self.now = dj_tz.now()
+        self.long_ago = self.now - timedelta(days=2)
+
+    def test_sweeps_dead_rows_in_chunks_and_keeps_live_ones(self):
+        live = RefreshToken.objects.create(user=self.user, token_hash='live', expires_at=self.now + timedelta(days=1))
+        for i in range(3):
+            RefreshToken.objects.create(user=self.user, token_hash=f'old{i}', expires_at=self.long_ago)
+        RefreshToken.objects.create(
+            user=self.user, token_hash='revoked', expires_at=self.now + timedelta(days=1), revoked_at=self.long_ago
+        )
+        # Recently expired rows stay for the retention window
+        recent = ResetToken.objects.create(user=self.user, token_hash='recent', expires_at=self.now - timedelta(minutes=5))
+        ResetToken.objects.create(
+            user=self.user, token_hash='used', expires_at=self.now + timedelta(minutes=5), used_at=self.long_ago
+        )
+        PasswordResetCode.objects.create(user=self.user, code_hash='x', expires_at=self.long_ago)
+        LoginOTP.objects.create(user=self.user, code_hash='y', expires_at=self.now + timedelta(minutes=1), consumed_at=self.long_ago)
+
+        counts = sweep_expired_credentials(chunk_size=2)
+
+        self.assertEqual(counts['refresh_token'], 4)
+        self.assertEqual(counts['reset_token'], 1)
+        self.assertEqual(counts['password_reset_code'], 1)
+        self.assertEqual(counts['login_otp'], 1)
+        self.assertEqual(list(RefreshToken.objects.values_list('id', flat=True)), [live.id])
+        self.assertEqual(list(ResetToken.objects.values_list('id', flat=True)), [recent.id])
+
+    def test_code_lookups_match_by_hash(self):
+        rt = ResetToken.objects.create(
+            user=self.user, token_hash='t', code_hash=_sha256_hex('123456'), expires_at=self.now + timedelta(minutes=5)
+        )
+        self.assertEqual(find_active_reset_token(self.user, '123456'), rt)
+        self.assertIsNone(find_active_reset_token(self.user, '654321'))
+
+        code = PasswordResetCode.objects.create(
+            user=self.user, code_hash=_sha256_hex('111111'), expires_at=self.now + timedelta(minutes=1)
+        )
+        self.assertIsNone(verify_password_reset_code(self.user, '222222', max_attempts=2))
+        code.refresh_from_db()
+        self.assertEqual(code.attempts, 1)
+        self.assertEqual(verify_password_reset_code(self.user, '111111', max_attempts=2), code)
+        code.refresh_from_db()
+        self.assertTrue(code.used)
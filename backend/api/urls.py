@@ -16,6 +16,7 @@ from . import views_reports as rpt_views
 from . import views_cash as cash_views
 from . import views_diag as diag_views
 from . import views_catering as catering_views
+from . import views_sse as sse_views
 from django.urls import path, include
 
 urlpatterns = [
@@ -34,23 +35,23 @@ urlpatterns = [
     path('api/accounts/', include('accounts.urls')),  # registration, login, etc.
      path("health/", auth_views.health, name="health"),
     path("health/db", auth_views.health_db, name="health_db"),
-    path("auth/login", auth_views.auth_login, name="auth_login"),
+    path("auth/login", auth_views.auth_login_async, name="auth_login"),
     path("auth/login/resend-otp", auth_views.auth_login_resend_otp, name="auth_login_resend_otp"),
     path("auth/login/verify-otp", auth_views.auth_login_verify_otp, name="auth_login_verify_otp"),
     path("auth/logout", auth_views.auth_logout, name="auth_logout"),
-    path("auth/register", auth_views.auth_register, name="auth_register"),
+    path("auth/register", auth_views.auth_register_async, name="auth_register"),
     path("auth/verify-email", auth_views.verify_email, name="verify_email"),
     path("auth/resend-verification", auth_views.resend_verification, name="resend_verification"),
     path("auth/forgot-password", auth_views.forgot_password, name="forgot_password"),
     path("auth/resend-reset", auth_views.forgot_password, name="resend_reset"),
-    path("auth/reset-password", auth_views.reset_password, name="reset_password"),
-    path("auth/reset-password-code", auth_views.reset_password_code, name="reset_password_code"),
+    path("auth/reset-password", auth_views.reset_password_async, name="reset_password"),
+    path("auth/reset-password-code", auth_views.reset_password_code_async, name="reset_password_code"),
     path("auth/verify-reset-code", auth_views.verify_reset_code, name="verify_reset_code"),
     # New OTP + signer-based password reset
     path("auth/password-reset/request", pr_views.password_reset_request, name="password_reset_request"),
     path("auth/password-reset/verify", pr_views.password_reset_verify, name="password_reset_verify"),
-    path("auth/password-reset/confirm", pr_views.password_reset_confirm, name="password_reset_confirm"),
-    path("auth/change-password", auth_views.change_password, name="change_password"),
+    path("auth/password-reset/confirm", pr_views.password_reset_confirm_async, name="password_reset_confirm"),
+    path("auth/change-password", auth_views.change_password_async, name="change_password"),
     path("auth/refresh-token", auth_views.refresh_token, name="refresh_token"),
     path("auth/google", auth_views.auth_google, name="auth_google"),
     path("auth/me", auth_views.auth_me, name="auth_me"),
@@ -146,6 +147,7 @@ urlpatterns = [
     path("inventory/consume", inv_views.inventory_consume, name="inventory_consume"),
     path("inventory/transfer", inv_views.inventory_transfer, name="inventory_transfer"),
     path("inventory/adjust", inv_views.inventory_adjust, name="inventory_adjust"),
+    path("inventory/import", inv_views.inventory_import, name="inventory_import"),
     path("inventory/ledger", inv_views.inventory_ledger, name="inventory_ledger"),
 
     # Catering events
@@ -169,6 +171,8 @@ urlpatterns = [
     path("reports/orders", rpt_views.reports_orders, name="reports_orders"),
     path("reports/staff-attendance", rpt_views.reports_staff_attendance, name="reports_staff_attendance"),
     path("reports/customer-history", rpt_views.reports_customer_history, name="reports_customer_history"),
+    path("reports/jobs", rpt_views.report_job_submit, name="report_job_submit"),
+    path("reports/jobs/<uuid:job_id>", rpt_views.report_job_status, name="report_job_status"),
 
     # Cash handling
     path("cash/open", cash_views.cash_open, name="cash_open"),
@@ -188,4 +192,8 @@ urlpatterns += [
     path("diagnostics/media", diag_views.diag_media, name="diag_media"),
     path("diagnostics/receipt", diag_views.diag_receipt, name="diag_receipt"),
     path("diagnostics/cash-drawer", diag_views.diag_cash_drawer, name="diag_cash_drawer"),
+    path("diagnostics/email/<uuid:eid>", diag_views.diag_email_status, name="diag_email_status"),
+    path("diagnostics/realtime", diag_views.diag_realtime, name="diag_realtime"),
+    # Realtime fallback (Server-Sent Events)
+    path("events/stream", sse_views.event_stream, name="event_stream"),
 ]
@@ -1,14 +1,37 @@
+"""Database server time.
+
+Stock movements are stamped with the MySQL server clock so that every app
+server agrees on ordering. Querying ``UTC_TIMESTAMP()`` for each stamp costs
+a round trip, so ``db_now()`` samples the server clock once, remembers the
+offset and serves later calls from the local monotonic clock. It samples again:
+
+- every ``DB_CLOCK_RESYNC_SECONDS`` (default 60),
+- when the local wall clock moved more than ``DB_CLOCK_MAX_DRIFT_SECONDS``
+  (default 1.0) away from the monotonic clock since the last sample, e.g.
+  after an NTP step on the host.
+
+Values served by one process never go backwards. ``db_now(exact=True)`` (or
+``DB_CLOCK_EXACT = True``) always queries the server.
+"""
+
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
 
+from django.conf import settings
 from django.db import connection
 
+logger = logging.getLogger(__name__)
 
-def db_now() -> datetime:
+
+def db_now_exact() -> datetime:
     """Return the MySQL server timestamp as an aware UTC datetime."""
     with connection.cursor() as cur:
-        cur.execute("SELECT UTC_TIMESTAMP()")
+        cur.execute("SELECT UTC_TIMESTAMP(6)")
         row = cur.fetchone()
         value = row[0]
         if isinstance(value, datetime):
@@ -16,4 +39,73 @@ def db_now() -> datetime:
         return datetime.fromisoformat(str(value).replace(" ", "T")).replace(tzinfo=timezone.utc)
 
 
-__all__ = ["db_now"]
+class DbClock:
+    """Server time from one sample plus elapsed monotonic time."""
+
+    def __init__(
+        self,
+        sample: Callable[[], datetime] = db_now_exact,
+        monotonic: Callable[[], float] = time.monotonic,
+        wall: Callable[[], float] = time.time,
+    ):
+        self._sample = sample
+        self._monotonic = monotonic
+        self._wall = wall
+        self._lock = threading.Lock()
+        self._anchor: Optional[datetime] = None
+        self._anchor_mono = 0.0
+        self._anchor_wall = 0.0
+        self._last: Optional[datetime] = None
+
+    def _stale(self, mono: float, wall: float) -> bool:
+        if self._anchor is None:
+            return True
+        elapsed = mono - self._anchor_mono
+        if elapsed >= float(getattr(settings, "DB_CLOCK_RESYNC_SECONDS", 60)):
+            return True
+        drift = abs((wall - self._anchor_wall) - elapsed)
+        return drift > float(getattr(settings, "DB_CLOCK_MAX_DRIFT_SECONDS", 1.0))
+
+    def _resync(self) -> None:
+        before = self._monotonic()
+        sampled = self._sample()
+        after = self._monotonic()
+        if self._anchor is not None:
+            predicted = self._anchor + timedelta(seconds=after - self._anchor_mono)
+            skew = abs((sampled - predicted).total_seconds())
+            if skew > float(getattr(settings, "DB_CLOCK_MAX_DRIFT_SECONDS", 1.0)):
+                logger.warning(f"Database clock moved {skew:.3f}s from the cached offset; resynced")
+        # The server read the clock somewhere inside the round trip; assume the middle
+        self._anchor = sampled + timedelta(seconds=(after - before) / 2)
+        self._anchor_mono = after
+        self._anchor_wall = self._wall()
+
+    def now(self) -> datetime:
+        with self._lock:
+            mono, wall = self._monotonic(), self._wall()
+            if self._stale(mono, wall):
+                self._resync()
+                mono = self._monotonic()
+            value = self._anchor + timedelta(seconds=mono - self._anchor_mono)
+            if self._last is not None and value < self._last:
+                value = self._last
+            self._last = value
+            return value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._anchor = None
+            self._last = None
+
+
+_clock = DbClock()
+
+
+def db_now(exact: bool = False) -> datetime:
+    """Database server time (aware UTC), from the cached offset unless ``exact``."""
+    if exact or getattr(settings, "DB_CLOCK_EXACT", False):
+        return db_now_exact()
+    return _clock.now()
+
+
+__all__ = ["db_now", "db_now_exact", "DbClock"]
@@ -0,0 +1,137 @@
+"""Password hashing off the request thread.
+
+PBKDF2 costs hundreds of milliseconds of CPU. Under ASGI, sync views share a
+single thread-sensitive executor, so a burst of logins would stall every other
+sync view and websocket handshake. Auth endpoints are therefore exposed as
+async views (see ``auth_pool_view``) that run their handler on a dedicated,
+bounded thread pool; ``hashlib.pbkdf2_hmac`` releases the GIL, so the workers
+hash in parallel.
+
+The pool admits at most ``AUTH_HASH_POOL_WORKERS + AUTH_HASH_POOL_QUEUE``
+jobs. Beyond that callers get ``HashingPoolBusy`` (HTTP 429) instead of
+queueing without bound.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import close_old_connections
+from django.http import JsonResponse
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the auth pool has no free slot."""
+
+
+_pool: ThreadPoolExecutor | None = None
+_slots: threading.BoundedSemaphore | None = None
+_pool_lock = threading.Lock()
+
+
+def _pool_size() -> tuple[int, int]:
+    default_workers = min(4, os.cpu_count() or 1)
+    workers = max(1, int(getattr(settings, "AUTH_HASH_POOL_WORKERS", default_workers) or default_workers))
+    queue = max(0, int(getattr(settings, "AUTH_HASH_POOL_QUEUE", 16)))
+    return workers, queue
+
+
+def _get_pool() -> tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers, queue = _pool_size()
+                _slots = threading.BoundedSemaphore(workers + queue)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-hash")
+    return _pool, _slots
+
+
+def submit_to_auth_pool(func, *args, **kwargs) -> Future:
+    """Run ``func`` on the auth pool; raises HashingPoolBusy when saturated."""
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingPoolBusy()
+
+    def _run():
+        # Pool threads hold their own DB connections; honour CONN_MAX_AGE
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    try:
+        fut = pool.submit(_run)
+    except Exception:
+        slots.release()
+        raise
+    fut.add_done_callback(lambda _f: slots.release())
+    return fut
+
+
+async def run_in_auth_pool(func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` executed on the auth pool."""
+    return await asyncio.wrap_future(submit_to_auth_pool(func, *args, **kwargs))
+
+
+def hash_password(raw_password: str) -> str:
+    """Hash with the currently preferred hasher."""
+    return make_password(raw_password)
+
+
+def verify_and_upgrade_password(raw_password: str, user) -> bool:
+    """Check ``raw_password`` against ``user.password_hash``.
+
+    When the stored hash uses an outdated hasher or iteration count (e.g.
+    PASSWORD_HASHERS changed), it is transparently re-hashed and saved.
+    """
+    encoded = getattr(user, "password_hash", "") or ""
+    if not raw_password or not encoded:
+        return False
+
+    def _upgrade(raw):
+        new_hash = make_password(raw)
+        try:
+            type(user).objects.filter(pk=user.pk, password_hash=encoded).update(password_hash=new_hash)
+            user.password_hash = new_hash
+        except Exception:
+            # Upgrade is opportunistic; the old hash keeps working
+            pass
+
+    return check_password(raw_password, encoded, setter=_upgrade)
+
+
+def busy_response():
+    resp = JsonResponse({"success": False, "message": "Server busy, please retry shortly."}, status=429)
+    resp["Retry-After"] = "1"
+    return resp
+
+
+def auth_pool_view(sync_view):
+    """Wrap a sync auth view as an async view that runs on the auth pool."""
+
+    @functools.wraps(sync_view)
+    async def _view(request, *args, **kwargs):
+        try:
+            return await run_in_auth_pool(sync_view, request, *args, **kwargs)
+        except HashingPoolBusy:
+            return busy_response()
+
+    return _view
+
+
+__all__ = [
+    "HashingPoolBusy",
+    "submit_to_auth_pool",
+    "run_in_auth_pool",
+    "hash_password",
+    "verify_and_upgrade_password",
+    "auth_pool_view",
+]
@@ -47,37 +47,53 @@ def verify_password_reset_code(user, raw_code: str, max_attempts: int = 5) -> Op
     - Increments attempts on failure; blocks after max_attempts
     - Returns the matching instance on success and marks it used
     - Returns None on failure (generic)
+
+    The code is resolved with an indexed ``(user, code_hash)`` lookup, so the
+    cost does not grow with the number of codes issued to the user.
     """
+    from django.db.models import F
     from .models import PasswordResetCode
 
     if not raw_code or len(raw_code.strip()) != 6 or not raw_code.strip().isdigit():
         return None
     now = dj_timezone.now()
-    code_qs = (
-        PasswordResetCode.objects.filter(user=user, used=False, expires_at__gt=now)
-        .order_by("-created_at")
-    )
+    active = PasswordResetCode.objects.filter(user=user, used=False, expires_at__gt=now)
     chash = _sha256_hex(raw_code.strip())
-    for item in code_qs:
-        if item.attempts >= max_attempts:
-            # Hard block this code
-            item.used = True
-            item.save(update_fields=["used"])
-            continue
-        if item.code_hash == chash:
-            item.used = True
-            item.save(update_fields=["used"])
-            return item
-        # wrong try
-        item.attempts = int(item.attempts or 0) + 1
-        if item.attempts >= max_attempts:
-            item.used = True
-            item.save(update_fields=["attempts", "used"])
-        else:
-            item.save(update_fields=["attempts"])
+    item = active.filter(code_hash=chash).order_by("-created_at").first()
+    if item is not None:
+        item.used = True
+        item.save(update_fields=["used"])
+        # Hard block: a code that exhausted its attempts never verifies
+        return item if item.attempts < max_attempts else None
+    # wrong try: count it against every live code, then retire exhausted ones
+    active.update(attempts=F("attempts") + 1)
+    active.filter(attempts__gte=max_attempts).update(used=True)
     return None
 
 
+def find_active_reset_token(user, raw_code: str):
+    """Return the newest live ResetToken whose code matches, or None.
+
+    Single indexed lookup on ``(user, code_hash)``.
+    """
+    from .models import ResetToken
+
+    code = (raw_code or "").strip()
+    if not code:
+        return None
+    return (
+        ResetToken.objects.filter(
+            user=user,
+            code_hash=_sha256_hex(code),
+            used_at__isnull=True,
+            revoked_at__isnull=True,
+            expires_at__gt=dj_timezone.now(),
+        )
+        .order_by("-created_at")
+        .first()
+    )
+
+
 def make_reset_token(user) -> str:
     """Create a short‑lived, signed token bound to the user id.
 
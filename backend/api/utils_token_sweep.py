@@ -0,0 +1,82 @@
+"""Deletion of dead credential rows (refresh tokens, reset tokens, OTPs).
+
+A row is dead once it has expired, been consumed/used, or been revoked.
+Dead rows are kept for ``TOKEN_SWEEP_RETENTION_SECONDS`` (default one day)
+for troubleshooting, then deleted in small primary-key-ordered chunks so each
+DELETE holds locks only briefly and never runs as one giant transaction.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone as dj_timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _retention_seconds() -> int:
+    return max(0, int(getattr(settings, "TOKEN_SWEEP_RETENTION_SECONDS", 86400)))
+
+
+def _dead_filters(cutoff):
+    """Map each credential model to the predicate selecting its dead rows."""
+    from .models import RefreshToken, ResetToken, PasswordResetCode, LoginOTP
+
+    return [
+        (RefreshToken, Q(expires_at__lt=cutoff) | Q(revoked_at__lt=cutoff)),
+        (ResetToken, Q(expires_at__lt=cutoff) | Q(used_at__lt=cutoff) | Q(revoked_at__lt=cutoff)),
+        (PasswordResetCode, Q(expires_at__lt=cutoff) | Q(used=True, created_at__lt=cutoff)),
+        (LoginOTP, Q(expires_at__lt=cutoff) | Q(consumed_at__lt=cutoff)),
+    ]
+
+
+def _delete_in_chunks(model, predicate, chunk_size: int, max_chunks: Optional[int]) -> int:
+    deleted = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        pks = list(
+            model.objects.filter(predicate)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not pks:
+            break
+        # Each chunk commits on its own (autocommit); keeps lock time short
+        _, per_model = model.objects.filter(pk__in=pks).delete()
+        deleted += int(per_model.get(model._meta.label, 0))
+        chunks += 1
+        if len(pks) < chunk_size:
+            break
+    return deleted
+
+
+def sweep_expired_credentials(
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunks: Optional[int] = None,
+    now=None,
+) -> Dict[str, int]:
+    """Delete dead credential rows; returns deleted counts keyed by table.
+
+    ``max_chunks`` bounds the work per model per run (None = until clean).
+    """
+    chunk_size = max(1, int(chunk_size or DEFAULT_CHUNK_SIZE))
+    cutoff = (now or dj_timezone.now()) - timedelta(seconds=_retention_seconds())
+    counts: Dict[str, int] = {}
+    for model, predicate in _dead_filters(cutoff):
+        try:
+            counts[model._meta.db_table] = _delete_in_chunks(model, predicate, chunk_size, max_chunks)
+        except Exception as exc:
+            logger.error(f"Credential sweep failed for {model._meta.db_table}: {exc}")
+            counts[model._meta.db_table] = 0
+    return counts
+
+
+__all__ = ["sweep_expired_credentials"]
@@ -11,6 +11,7 @@ from django.db.utils import OperationalError, ProgrammingError
 from django.db import connection
 from django.utils import timezone as dj_timezone
 from django.contrib.auth.hashers import check_password
+from .utils_hashing import auth_pool_view, hash_password, verify_and_upgrade_password
 import jwt
 import secrets
 import requests as _requests
@@ -186,7 +187,7 @@ def auth_login(request):
         db_user = AppUser.objects.filter(email=email).first()
         if db_user:
             user_exists = True
-        if db_user and db_user.password_hash and password and check_password(password, db_user.password_hash):
+        if db_user and db_user.password_hash and password and verify_and_upgrade_password(password, db_user):
             status_l = (db_user.status or "").lower()
             safe_user = _safe_user_from_db(db_user)
             # Block deactivated accounts
@@ -951,7 +952,6 @@ def resend_verification(request):
     return resp
 
 from django.db import transaction
-from django.contrib.auth.hashers import make_password
 from .views_common import _issue_emailverify_token_from_db, _issue_emailverify_token_from_dict, _now_iso
 from .emails import email_user_email_verification
 
@@ -1002,7 +1002,7 @@ def auth_register(request):
                     role=role,
                     status="pending",
                     permissions=[],
-                    password_hash=make_password(password) if password else "",
+                    password_hash=hash_password(password) if password else "",
                     email_verified=False,
                     phone=phone,
                 )
@@ -1160,8 +1160,7 @@ def reset_password(request):
                 if rt and rt.is_active:
                     rt.used_at = dj_timezone.now()
                     rt.save(update_fields=["used_at"])
-            from django.contrib.auth.hashers import make_password
-            u.password_hash = make_password(new_password)
+            u.password_hash = hash_password(new_password)
             u.save(update_fields=["password_hash"])
             _revoke_all_refresh_tokens(u)
             return JsonResponse({"success": True, "message": "Password reset successful"})
@@ -1176,8 +1175,7 @@ def reset_password(request):
         if not rt or not rt.is_active:
             raise OperationalError("not found")
         u = rt.user
-        from django.contrib.auth.hashers import make_password
-        u.password_hash = make_password(new_password)
+        u.password_hash = hash_password(new_password)
         u.save(update_fields=["password_hash"])
         rt.used_at = dj_timezone.now()
         rt.save(update_fields=["used_at"])
@@ -1216,23 +1214,15 @@ def reset_password_code(request):
     if not email or not code or not new_password or len(new_password) < 8:
         return JsonResponse({"success": False, "message": "Invalid or expired code"}, status=400)
     try:
-        from .models import AppUser, ResetToken
+        from .models import AppUser
         u = AppUser.objects.filter(email=email).first()
         if not u:
             return JsonResponse({"success": False, "message": "Invalid or expired code"}, status=400)
-        tokens = ResetToken.objects.filter(user=u, used_at__isnull=True, revoked_at__isnull=True).order_by("-created_at")
-        chash = hashlib.sha256(code.encode("utf-8")).hexdigest()
-        ok = None
-        for rt in tokens:
-            if not rt.is_active:
-                continue
-            if rt.code_hash and rt.code_hash == chash:
-                ok = rt
-                break
+        from .utils_password_reset import find_active_reset_token
+        ok = find_active_reset_token(u, code)
         if not ok:
             return JsonResponse({"success": False, "message": "Invalid or expired code"}, status=400)
-        from django.contrib.auth.hashers import make_password
-        u.password_hash = make_password(new_password)
+        u.password_hash = hash_password(new_password)
         u.save(update_fields=["password_hash"])
         ok.used_at = dj_timezone.now()
         ok.save(update_fields=["used_at"])
@@ -1255,19 +1245,12 @@ def verify_reset_code(request):
     if not email or not code:
         return JsonResponse({"success": False, "message": "Invalid or expired code"}, status=400)
     try:
-        from .models import AppUser, ResetToken
+        from .models import AppUser
         u = AppUser.objects.filter(email=email).first()
         if not u:
             return JsonResponse({"success": False, "message": "Invalid or expired code"}, status=400)
-        tokens = ResetToken.objects.filter(user=u, used_at__isnull=True, revoked_at__isnull=True).order_by("-created_at")
-        chash = hashlib.sha256(code.encode("utf-8")).hexdigest()
-        ok = None
-        for rt in tokens:
-            if not rt.is_active:
-                continue
-            if rt.code_hash and rt.code_hash == chash:
-                ok = rt
-                break
+        from .utils_password_reset import find_active_reset_token
+        ok = find_active_reset_token(u, code)
         if not ok:
             return JsonResponse({"success": False, "message": "Invalid or expired code"}, status=400)
         from .views_common import _issue_pwdcommit_token_from_db
@@ -1383,8 +1366,7 @@ def change_password(request):
             raise OperationalError("not found")
         if not u.password_hash or not current or not check_password(current, u.password_hash):
             return JsonResponse({"success": False, "message": "Invalid current password"}, status=400)
-        from django.contrib.auth.hashers import make_password
-        u.password_hash = make_password(new)
+        u.password_hash = hash_password(new)
         u.save(update_fields=["password_hash"])
         try:
             record_audit(
@@ -1427,6 +1409,15 @@ def change_password(request):
         pass
     return JsonResponse({"success": True})
 
+# Async variants for ASGI: the handlers above hash passwords (PBKDF2), so they
+# run on the bounded auth pool instead of the shared sync executor and answer
+# 429 when that pool is saturated.
+auth_login_async = auth_pool_view(auth_login)
+auth_register_async = auth_pool_view(auth_register)
+change_password_async = auth_pool_view(change_password)
+reset_password_async = auth_pool_view(reset_password)
+reset_password_code_async = auth_pool_view(reset_password_code)
+
 __all__ = [
     "health",
     "auth_login",
@@ -1442,4 +1433,9 @@ __all__ = [
     "auth_google",
     "verify_email",
     "resend_verification",
+    "auth_login_async",
+    "auth_register_async",
+    "change_password_async",
+    "reset_password_async",
+    "reset_password_code_async",
 ]
@@ -589,7 +589,8 @@ def catering_event_payment(request, event_id):
         # Record payment transaction (if PaymentTransaction model is being used)
         try:
             from .models import PaymentTransaction
-            PaymentTransaction.objects.create(
+            from .report_rollups import record_payment
+            txn = PaymentTransaction.objects.create(
                 order_id=str(event.id),
                 amount=amount,
                 method=payment_method,
@@ -605,6 +606,7 @@ def catering_event_payment(request, event_id):
                     "source": "catering",
                 }
             )
+            record_payment(txn)
         except Exception:
             pass  # PaymentTransaction is optional
 
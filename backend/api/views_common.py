@@ -353,7 +353,11 @@ def _actor_from_token(token: str):
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
     except Exception:
         return None
+    return _actor_from_claims(payload)
 
+
+def _actor_from_claims(payload: dict):
+    """Resolve the actor named by already-verified JWT claims."""
     email = (payload.get("email") or "").lower().strip()
     sub = str(payload.get("sub") or "")
 
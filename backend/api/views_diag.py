@@ -97,4 +97,33 @@ def diag_receipt(request):
     return resp
 
 
-__all__ = ["diag_ping", "diag_cash_drawer", "diag_receipt", "diag_media"]
+@require_http_methods(["GET"])  # /diagnostics/email/<uuid>
+def diag_email_status(request, eid):
+    """Delivery status of a queued transactional email (admin/manager only)."""
+    actor, err = _actor_from_request(request)
+    if not actor:
+        return err
+    role = (getattr(actor, "role", None) or (actor.get("role") if isinstance(actor, dict) else "") or "").lower()
+    if role not in {"admin", "manager"}:
+        return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
+    from .email_dispatch import get_email_status
+    data = get_email_status(str(eid))
+    if not data:
+        return JsonResponse({"success": False, "message": "Not found"}, status=404)
+    return JsonResponse({"success": True, "email": data})
+
+
+@require_http_methods(["GET"])  # /diagnostics/realtime
+def diag_realtime(request):
+    """Outbound websocket queue depths for this process (admin/manager only)."""
+    actor, err = _actor_from_request(request)
+    if not actor:
+        return err
+    role = (getattr(actor, "role", None) or (actor.get("role") if isinstance(actor, dict) else "") or "").lower()
+    if role not in {"admin", "manager"}:
+        return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
+    from .consumers import connection_metrics
+    return JsonResponse({"success": True, **connection_metrics()})
+
+
+__all__ = ["diag_ping", "diag_cash_drawer", "diag_receipt", "diag_media", "diag_email_status", "diag_realtime"]
@@ -1,16 +1,21 @@
 """Inventory endpoints: items CRUD, stock adjustments, low stock, activities."""
 
+import csv
 import json
 import logging
 from datetime import datetime
+from itertools import islice
 from uuid import UUID
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone as dj_timezone
 
 from .events import publish_event
+from .locations import get_location
 from .views_common import _actor_from_request, _has_permission, _paginate, rate_limit
 from .inventory_services import (
     get_current_stock,
@@ -20,7 +25,6 @@ from .inventory_services import (
     get_expiring_batches,
     consume_for_order,
     transfer_stock,
-    get_recent_activity,
 )
 
 
@@ -107,7 +111,7 @@ def inventory_items(request):
     if not (_has_permission(actor, "inventory.menu.manage") or _has_permission(actor, "inventory.update") or getattr(actor, "role", "").lower() in {"admin", "manager"}):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
-        from .models import InventoryItem, Location
+        from .models import InventoryItem
         data = json.loads(request.body.decode("utf-8") or "{}")
         name = (data.get("name") or "").strip()
         if not name:
@@ -136,7 +140,7 @@ def inventory_items(request):
         # If initial quantity provided, mirror it into the ledger as a receipt
         try:
             if qty > 0:
-                loc = Location.objects.filter(code="MAIN").first() or Location.objects.create(code="MAIN", name="Main")
+                loc = get_location("MAIN")
                 record_receipt(item=item, qty=qty, location=loc, actor=actor if hasattr(actor, "id") else None, reference_type="opening_balance")
         except Exception:
             pass
@@ -249,7 +253,7 @@ def inventory_item_stock(request, iid):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
         from django.db import connection
-        from .models import InventoryItem, InventoryActivity, Location
+        from .models import InventoryItem, InventoryActivity
         data = json.loads(request.body.decode("utf-8") or "{}")
         try:
             qty = float(data.get("quantity") or 0)
@@ -278,7 +282,7 @@ def inventory_item_stock(request, iid):
             # previous from ledger
             prev_map = get_current_stock([str(item.id)], location_id=None, as_of=None)
             prev = float(prev_map.get(str(item.id), 0))
-            loc = Location.objects.filter(code="MAIN").first() or Location.objects.create(code="MAIN", name="Main")
+            loc = get_location("MAIN")
             try:
                 if op == "add":
                     if qty == 0:
@@ -435,12 +439,12 @@ def inventory_receipts(request):
     if not (_has_permission(actor, "inventory.update") or getattr(actor, "role", "").lower() in {"admin", "manager", "staff"}):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
-        from .models import InventoryItem, Location, Batch
+        from .models import InventoryItem, Batch
         payload = json.loads(request.body.decode("utf-8") or "{}")
         item_id = payload.get("itemId") or payload.get("item_id")
         qty = float(payload.get("qty") or payload.get("quantity") or 0)
         location_code = (payload.get("location") or payload.get("locationCode") or "MAIN").strip() or "MAIN"
-        loc = Location.objects.filter(code=location_code).first() or Location.objects.create(code=location_code, name=location_code.title())
+        loc = get_location(location_code)
         item = InventoryItem.objects.filter(id=item_id).first()
         if not item:
             return JsonResponse({"success": False, "message": "Item not found"}, status=404)
@@ -460,6 +464,59 @@ def inventory_receipts(request):
         return JsonResponse({"success": False, "message": "Failed to record receipt"}, status=500)
 
 
+@require_http_methods(["POST"]) 
+@rate_limit(limit=20, window_seconds=60)
+def inventory_import(request):
+    """Bulk receipts/adjustments from CSV or JSON (see inventory_import).
+
+    Accepts a ``text/csv`` body, an uploaded ``file`` (.csv or .json), or JSON
+    ``{"lines": [...]}`` / ``{"csv": "..."}``. ``location``, ``supplier`` and
+    ``goodsReceiptId`` apply to lines that do not set their own.
+    """
+    actor, err = _actor_from_request(request)
+    if not actor:
+        return err
+    if not (_has_permission(actor, "inventory.update") or getattr(actor, "role", "").lower() in {"admin", "manager", "staff"}):
+        return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
+    from .inventory_import import TYPE_ADJUSTMENT, ImportValidationError, import_stock, parse_lines, validate_lines
+    try:
+        options = request.GET.dict()
+        upload = request.FILES.get("file")
+        if upload is not None:
+            options.update(request.POST.dict())
+            fmt = "json" if upload.name.lower().endswith(".json") else "csv"
+            rows = parse_lines(upload.read(), fmt)
+        elif (request.content_type or "").startswith("text/csv"):
+            rows = parse_lines(request.body, "csv")
+        else:
+            payload = json.loads(request.body.decode("utf-8") or "{}")
+            if isinstance(payload, dict):
+                options.update({k: v for k, v in payload.items() if isinstance(v, str) and k != "csv"})
+                rows = parse_lines(payload["csv"], "csv") if payload.get("csv") else parse_lines(payload, "json")
+            else:
+                rows = parse_lines(payload, "json")
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "message": "Could not read import lines"}, status=400)
+    try:
+        lines = validate_lines(rows, location=options.get("location") or options.get("locationCode"), supplier=options.get("supplier") or "")
+        if any(line.type == TYPE_ADJUSTMENT for line in lines) and not (
+            _has_permission(actor, "inventory.update") or getattr(actor, "role", "").lower() in {"admin", "manager"}
+        ):
+            return JsonResponse({"success": False, "message": "Forbidden: adjustments need inventory.update"}, status=403)
+        summary = import_stock(
+            lines,
+            actor=actor,
+            reference=str(options.get("goodsReceiptId") or options.get("reference") or ""),
+            idempotency_key=request.headers.get("Idempotency-Key") or options.get("idempotencyKey") or None,
+        )
+        return JsonResponse({"success": True, "data": summary})
+    except ImportValidationError as exc:
+        return JsonResponse({"success": False, "message": str(exc), "errors": exc.errors}, status=400)
+    except Exception:
+        logger.exception("Failed to import stock lines")
+        return JsonResponse({"success": False, "message": "Failed to import"}, status=500)
+
+
 @require_http_methods(["POST"]) 
 @rate_limit(limit=60, window_seconds=60)
 def inventory_adjust(request):
@@ -469,13 +526,13 @@ def inventory_adjust(request):
     if not (_has_permission(actor, "inventory.update") or getattr(actor, "role", "").lower() in {"admin", "manager"}):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
-        from .models import InventoryItem, Location
+        from .models import InventoryItem
         payload = json.loads(request.body.decode("utf-8") or "{}")
         item_id = payload.get("itemId") or payload.get("item_id")
         delta = float(payload.get("delta") or payload.get("quantity") or 0)
         reason = (payload.get("reason") or "Manual adjustment").strip()
         location_code = (payload.get("location") or payload.get("locationCode") or "MAIN").strip() or "MAIN"
-        loc = Location.objects.filter(code=location_code).first() or Location.objects.create(code=location_code, name=location_code.title())
+        loc = get_location(location_code)
         item = InventoryItem.objects.filter(id=item_id).first()
         if not item:
             return JsonResponse({"success": False, "message": "Item not found"}, status=404)
@@ -488,50 +545,171 @@ def inventory_adjust(request):
         return JsonResponse({"success": False, "message": "Failed to adjust"}, status=500)
 
 
+def _safe_movement(m, balance=None):
+    return {
+        "id": str(m.id),
+        "itemId": str(m.item_id),
+        "locationId": str(m.location_id),
+        "batchId": str(m.batch_id) if m.batch_id else None,
+        "type": m.movement_type,
+        "qty": float(m.qty or 0),
+        "balance": float(balance) if balance is not None else None,
+        "effectiveAt": m.effective_at.isoformat() if m.effective_at else None,
+        "recordedAt": m.recorded_at.isoformat() if m.recorded_at else None,
+        "referenceType": m.reference_type,
+        "referenceId": m.reference_id,
+        "reason": m.reason,
+    }
+
+
+_LEDGER_COLUMNS = [
+    "id", "effectiveAt", "recordedAt", "type", "qty", "balance",
+    "locationId", "batchId", "referenceType", "referenceId", "reason",
+]
+
+
+class _Echo:
+    """File-like object whose write() hands back the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def _ledger_lines(rows, fmt):
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(_LEDGER_COLUMNS)
+        for m, balance in rows:
+            row = _safe_movement(m, balance)
+            yield writer.writerow([row[c] if row[c] is not None else "" for c in _LEDGER_COLUMNS])
+    else:
+        for m, balance in rows:
+            yield json.dumps(_safe_movement(m, balance)) + "\n"
+
+
+async def _ledger_stream(lines, chunk_size: int):
+    """Hand the export to ASGI chunk by chunk; a sync iterator would be buffered whole.
+
+    Each chunk is read and serialized on the thread that owns the DB connection.
+    """
+    lines = iter(lines)
+    next_chunk = sync_to_async(lambda: list(islice(lines, chunk_size)), thread_sensitive=True)
+    while True:
+        chunk = await next_chunk()
+        if not chunk:
+            return
+        yield "".join(chunk)
+
+
 @require_http_methods(["GET"]) 
 @rate_limit(limit=120, window_seconds=60)
 def inventory_ledger(request):
+    """Stock ledger of one item with running balances.
+
+    JSON pages by cursor (``cursor``/``limit``, ``pagination.nextCursor``);
+    ``format=csv`` or ``format=ndjson`` streams the whole range instead.
+    """
     actor, err = _actor_from_request(request)
     if not actor:
         return err
     try:
-        from .inventory_services import get_stock_ledger
+        from .inventory_ledger import iter_ledger, ledger_page
         item_id = request.GET.get("item_id") or request.GET.get("itemId")
         if not item_id:
             return JsonResponse({"success": False, "message": "item_id required"}, status=400)
         date_from = request.GET.get("from") or None
         date_to = request.GET.get("to") or None
-        location_id = request.GET.get("location_id") or None
-        df = datetime.fromisoformat(date_from) if date_from else None
-        dt = datetime.fromisoformat(date_to) if date_to else None
-        moves = get_stock_ledger(item_id=item_id, date_from=df, date_to=dt, location_id=location_id)
-        data = []
-        for m in moves:
-            data.append({
-                "id": str(m.id),
-                "itemId": str(m.item_id),
-                "locationId": str(m.location_id),
-                "batchId": str(m.batch_id) if m.batch_id else None,
-                "type": m.movement_type,
-                "qty": float(m.qty or 0),
-                "effectiveAt": m.effective_at.isoformat() if m.effective_at else None,
-                "recordedAt": m.recorded_at.isoformat() if m.recorded_at else None,
-                "referenceType": m.reference_type,
-                "referenceId": m.reference_id,
-                "reason": m.reason,
-            })
-        return JsonResponse({"success": True, "data": data})
+        location_id = request.GET.get("location_id") or request.GET.get("locationId") or None
+        fmt = (request.GET.get("format") or "json").lower()
+        try:
+            UUID(str(item_id))
+            if location_id:
+                UUID(str(location_id))
+            df = datetime.fromisoformat(date_from) if date_from else None
+            dt = datetime.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return JsonResponse({"success": False, "message": "Invalid item, location or date"}, status=400)
+        if fmt in {"csv", "ndjson"}:
+            chunk_size = max(1, int(getattr(settings, "LEDGER_EXPORT_CHUNK", 1000)))
+            rows = iter_ledger(item_id, date_from=df, date_to=dt, location_id=location_id, chunk_size=chunk_size)
+            content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+            resp = StreamingHttpResponse(_ledger_stream(_ledger_lines(rows, fmt), chunk_size), content_type=content_type)
+            resp["Content-Disposition"] = f'attachment; filename="ledger-{item_id}.{fmt}"'
+            resp["X-Accel-Buffering"] = "no"
+            return resp
+        try:
+            limit = max(1, min(1000, int(request.GET.get("limit") or 1000)))
+        except (TypeError, ValueError):
+            limit = 1000
+        try:
+            page, next_cursor = ledger_page(
+                item_id,
+                date_from=df,
+                date_to=dt,
+                location_id=location_id,
+                cursor=request.GET.get("cursor") or None,
+                limit=limit,
+            )
+        except ValueError:
+            return JsonResponse({"success": False, "message": "Invalid cursor"}, status=400)
+        data = [_safe_movement(m, balance) for m, balance in page]
+        return JsonResponse({"success": True, "data": data, "pagination": {"limit": limit, "nextCursor": next_cursor}})
     except Exception:
+        logger.exception("Failed to read stock ledger")
         return JsonResponse({"success": True, "data": []})
 
 
+def _feed_movement(m):
+    return {
+        "id": str(m.id),
+        "itemId": str(m.item_id),
+        "itemName": getattr(m.item, "name", ""),
+        "itemUnit": getattr(m.item, "unit", None),
+        "locationId": str(m.location_id),
+        "locationCode": getattr(m.location, "code", None),
+        "batchId": str(m.batch_id) if m.batch_id else None,
+        "batchLot": getattr(m.batch, "lot_code", None) if m.batch_id else None,
+        "batchExpiry": m.batch.expiry_date.isoformat() if getattr(m, "batch", None) and m.batch.expiry_date else None,
+        "type": m.movement_type,
+        "qty": float(m.qty or 0),
+        "effectiveAt": m.effective_at.isoformat() if m.effective_at else None,
+        "recordedAt": m.recorded_at.isoformat() if m.recorded_at else None,
+        "referenceType": m.reference_type,
+        "referenceId": m.reference_id,
+        "reason": m.reason,
+        "actorId": str(m.actor_id) if m.actor_id else None,
+        "actorName": (getattr(m.actor, "name", None) or getattr(m.actor, "email", None) or None),
+    }
+
+
+def _feed_update(a):
+    return {
+        "id": str(a.id),
+        "itemId": str(a.item_id),
+        "itemName": getattr(a.item, "name", ""),
+        "type": "ITEM_UPDATE",
+        "qty": None,
+        "effectiveAt": None,
+        "recordedAt": a.created_at.isoformat() if a.created_at else None,
+        "referenceType": "",
+        "referenceId": "",
+        "reason": a.reason,
+        "actorId": str(a.actor_id) if a.actor_id else None,
+        "actorName": (getattr(a.actor, "name", None) or getattr(a, "performed_by", None) or None),
+        "meta": getattr(a, "meta", {}) or {},
+    }
+
+
 @require_http_methods(["GET"]) 
 @rate_limit(limit=120, window_seconds=60)
 def inventory_recent_activity(request):
+    """Stock movements and item edits, newest first, paged by ``cursor`` (see inventory_feed)."""
     actor, err = _actor_from_request(request)
     if not actor:
         return err
     try:
+        from .inventory_feed import SOURCE_MOVEMENT, activity_feed
+
         # Validate UUID-like params defensively to avoid ValueError from ORM filters
         def _parse_uuid(val):
             try:
@@ -547,10 +725,6 @@ def inventory_recent_activity(request):
         types_param = request.GET.get("types") or ""
         types = [t for t in [x.strip() for x in types_param.split(",")] if t]
         since = request.GET.get("since") or None
-        try:
-            page = int(request.GET.get("page", 1) or 1)
-        except Exception:
-            page = 1
         try:
             limit = int(request.GET.get("limit", 50) or 50)
         except Exception:
@@ -562,65 +736,23 @@ def inventory_recent_activity(request):
                 since_dt = datetime.fromisoformat(since)
             except Exception:
                 since_dt = None
-        rows = get_recent_activity(item_id=item_id, location_id=location_id, types=types or None, since=since_dt, page=page, limit=limit)
-        data = []
-        for m in rows:
-            data.append({
-                "id": str(m.id),
-                "itemId": str(m.item_id),
-                "itemName": getattr(m.item, "name", ""),
-                "itemUnit": getattr(m.item, "unit", None),
-                "locationId": str(m.location_id),
-                "locationCode": getattr(m.location, "code", None),
-                "batchId": str(m.batch_id) if m.batch_id else None,
-                "batchLot": getattr(m.batch, "lot_code", None) if m.batch_id else None,
-                "batchExpiry": m.batch.expiry_date.isoformat() if getattr(m, "batch", None) and m.batch.expiry_date else None,
-                "type": m.movement_type,
-                "qty": float(m.qty or 0),
-                "effectiveAt": m.effective_at.isoformat() if m.effective_at else None,
-                "recordedAt": m.recorded_at.isoformat() if m.recorded_at else None,
-                "referenceType": m.reference_type,
-                "referenceId": m.reference_id,
-                "reason": m.reason,
-                "actorId": str(m.actor_id) if m.actor_id else None,
-                "actorName": (getattr(m.actor, "name", None) or getattr(m.actor, "email", None) or None),
-            })
-        # Include non-stock item updates from InventoryActivity
         try:
-            from .models import InventoryActivity
-            ia_qs = InventoryActivity.objects.select_related("item").filter(action="update")
-            if item_id:
-                ia_qs = ia_qs.filter(item_id=item_id)
-            ia_qs = ia_qs.order_by("-created_at")[:limit]
-            for a in ia_qs:
-                data.append({
-                    "id": str(a.id),
-                    "itemId": str(a.item_id),
-                    "itemName": getattr(a.item, "name", ""),
-                    "type": "ITEM_UPDATE",
-                    "qty": None,
-                    "effectiveAt": None,
-                    "recordedAt": a.created_at.isoformat() if a.created_at else None,
-                    "referenceType": "",
-                    "referenceId": "",
-                    "reason": a.reason,
-                    "actorId": str(a.actor_id) if a.actor_id else None,
-                    "actorName": (getattr(a.actor, "name", None) or getattr(a, "performed_by", None) or None),
-                    "meta": getattr(a, "meta", {}) or {},
-                })
-        except Exception:
-            pass
-        # Sort combined by recordedAt desc
-        def _key(x):
-            return x.get("recordedAt") or x.get("effectiveAt") or ""
-        try:
-            data.sort(key=_key, reverse=True)
-        except Exception:
-            pass
-        return JsonResponse({"success": True, "data": data, "pagination": {"page": page, "limit": limit, "total": None}})
+            entries, next_cursor = activity_feed(
+                item_id=item_id,
+                location_id=location_id,
+                types=types or None,
+                since=since_dt,
+                cursor=request.GET.get("cursor") or None,
+                limit=limit,
+            )
+        except ValueError:
+            return JsonResponse({"success": False, "message": "Invalid cursor"}, status=400)
+        data = [_feed_movement(row) if source == SOURCE_MOVEMENT else _feed_update(row) for source, row in entries]
+        return JsonResponse({"success": True, "data": data, "pagination": {"limit": limit, "nextCursor": next_cursor, "total": None}})
     except Exception:
+        logger.exception("Failed to load recent inventory activity")
         # Fallback: no activity yet
-        return JsonResponse({"success": True, "data": [], "pagination": {"page": 1, "limit": 50, "total": None}})
+        return JsonResponse({"success": True, "data": [], "pagination": {"limit": 50, "nextCursor": None, "total": None}})
 
 
 @require_http_methods(["POST"]) 
@@ -633,12 +765,12 @@ def inventory_consume(request):
     if not (getattr(actor, "role", "").lower() in {"admin", "manager", "staff"} or _has_permission(actor, "inventory.update")):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
-        from .models import InventoryItem, Location
+        from .models import InventoryItem
         payload = json.loads(request.body.decode("utf-8") or "{}")
         order_id = str(payload.get("orderId") or payload.get("order_id") or "")
         comps = payload.get("components") or []
         location_code = (payload.get("location") or payload.get("locationCode") or "MAIN").strip() or "MAIN"
-        loc = Location.objects.filter(code=location_code).first() or Location.objects.create(code=location_code, name=location_code.title())
+        loc = get_location(location_code)
         components = []
         for c in comps:
             iid = c.get("itemId") or c.get("ingredientId") or c.get("inventoryItemId")
@@ -667,14 +799,14 @@ def inventory_transfer(request):
     if not (_has_permission(actor, "inventory.update") or getattr(actor, "role", "").lower() in {"admin", "manager"}):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
-        from .models import InventoryItem, Location
+        from .models import InventoryItem
         payload = json.loads(request.body.decode("utf-8") or "{}")
         item_id = payload.get("itemId") or payload.get("item_id")
         qty = float(payload.get("qty") or payload.get("quantity") or 0)
         from_code = (payload.get("fromLocation") or payload.get("from") or "MAIN").strip() or "MAIN"
         to_code = (payload.get("toLocation") or payload.get("to") or "MAIN").strip() or "MAIN"
-        from_loc = Location.objects.filter(code=from_code).first() or Location.objects.create(code=from_code, name=from_code.title())
-        to_loc = Location.objects.filter(code=to_code).first() or Location.objects.create(code=to_code, name=to_code.title())
+        from_loc = get_location(from_code)
+        to_loc = get_location(to_code)
         item = InventoryItem.objects.filter(id=item_id).first()
         if not item:
             return JsonResponse({"success": False, "message": "Item not found"}, status=404)
@@ -698,6 +830,7 @@ __all__ = [
     "inventory_expiring",
     "inventory_receipts",
     "inventory_adjust",
+    "inventory_import",
     "inventory_ledger",
     "inventory_consume",
     "inventory_transfer",
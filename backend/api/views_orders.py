@@ -993,6 +993,11 @@ def orders(request):
             },
         )
         publish_event("order.created", {"order": order_payload}, roles={"admin", "manager", "staff"}, user_ids=[str(o.placed_by_id)] if getattr(o, "placed_by_id", None) else None)
+        try:
+            from .report_cache import invalidate_reports
+            invalidate_reports()
+        except Exception:
+            logger.exception("Failed to invalidate report cache")
 
         # Trigger notifications for new order and large orders
         try:
@@ -1889,6 +1894,13 @@ def order_status(request, oid):
         else:
             o.save(update_fields=["updated_at"])
 
+        if status_changed:
+            try:
+                from .report_rollups import sync_order
+                sync_order(o)
+            except Exception:
+                logger.exception("Failed to update sales rollups for order status change")
+
         # Optional: decrement inventory on completion using simple recipe from MenuItem.ingredients
         if canonical_status(o.status) == "completed":
             try:
@@ -1914,8 +1926,8 @@ def order_status(request, oid):
                     components = [(invs[k], comp_map[k]) for k in comp_map.keys() if k in invs]
                     if components:
                         # Use MAIN location by default
-                        from .models import Location
-                        loc = Location.objects.filter(code="MAIN").first() or Location.objects.create(code="MAIN", name="Main")
+                        from .locations import get_location
+                        loc = get_location("MAIN")
                         consume_for_order(order_id=str(o.id), components=components, location=loc, actor=actor if hasattr(actor, "id") else None)
             except Exception:
                 pass
@@ -11,7 +11,6 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from django.db.utils import OperationalError, ProgrammingError
 from django.utils import timezone as dj_timezone
@@ -25,6 +24,7 @@ from .utils_password_reset import (
     OTP_TTL_SECONDS,
 )
 from .emails import email_user_password_reset
+from .utils_hashing import auth_pool_view, hash_password
 
 
 def _parse_json(request):
@@ -125,10 +125,13 @@ def password_reset_confirm(request):
         u = AppUser.objects.filter(id=uid).first()
         if not u:
             return JsonResponse({"success": False, "message": "Invalid or expired token"}, status=400)
-        u.password_hash = make_password(new_password)
+        u.password_hash = hash_password(new_password)
         u.save(update_fields=["password_hash"])
         _revoke_all_refresh_tokens(u)
         return JsonResponse({"success": True, "message": "Password reset successful"})
     except (OperationalError, ProgrammingError):
         return JsonResponse({"success": False, "message": "Server error"}, status=500)
 
+
+# ASGI: hashing runs on the bounded auth pool (429 when saturated)
+password_reset_confirm_async = auth_pool_view(password_reset_confirm)
@@ -18,6 +18,7 @@ from django.db.utils import OperationalError, ProgrammingError
 from django.db.models import F
 from decimal import Decimal
 
+from .payment_lookup import order_numbers_for
 from .views_common import _actor_from_request, _has_permission, _client_meta, _require_admin_or_manager, rate_limit
 
 
@@ -41,17 +42,11 @@ def _lookup_order_number(order_id, order_numbers=None):
     if not order_id:
         return ""
     key = str(order_id)
-    if order_numbers and key in order_numbers:
-        return order_numbers[key] or ""
+    if order_numbers is not None:
+        # Resolved in bulk by the caller; a miss means there is no such order
+        return order_numbers.get(key) or ""
     try:
-        from .models import Order
-
-        return (
-            Order.objects.filter(id=key)
-            .values_list("order_number", flat=True)
-            .first()
-            or ""
-        )
+        return order_numbers_for([key]).get(key, "")
     except Exception:
         return ""
 
@@ -159,6 +154,11 @@ def order_payment(request, order_id: str):
             processed_by=actor if hasattr(actor, "id") else None,
             meta=({"idempotencyKey": idempo} if idempo else {}),
         )
+        try:
+            from .report_rollups import record_payment
+            record_payment(p)
+        except Exception:
+            logger.exception("Failed to update sales rollups for payment")
         # Update the order's payment method for consistency
         order_number = ""
         try:
@@ -288,19 +288,10 @@ def payments_list(request):
         start_i = max(0, (page - 1) * max(1, limit))
         end_i = start_i + max(1, limit)
         slice_items = list(qs[start_i:end_i])
-        order_numbers = {}
-        if slice_items:
-            order_ids = {str(x.order_id) for x in slice_items if x.order_id}
-            if order_ids:
-                try:
-                    from .models import Order
-
-                    order_numbers = {
-                        str(o.id): o.order_number or ""
-                        for o in Order.objects.filter(id__in=order_ids)
-                    }
-                except Exception:
-                    order_numbers = {}
+        try:
+            order_numbers = order_numbers_for(x.order_id for x in slice_items)
+        except Exception:
+            order_numbers = {}
         items = [_serialize_db(x, order_numbers) for x in slice_items]
         return JsonResponse(
             {
@@ -341,10 +332,19 @@ def payment_refund(request, pid: str):
             return JsonResponse({"success": False, "message": "Not found"}, status=404)
         if p.status == PaymentTransaction.STATUS_REFUNDED:
             return JsonResponse({"success": True, "data": _serialize_db(p)})
+        was_completed = p.status == PaymentTransaction.STATUS_COMPLETED
+        # Kept so rollup rebuilds count the same refunds as record_refund
+        p.meta = {**(p.meta or {}), "refundedFrom": p.status}
         p.status = PaymentTransaction.STATUS_REFUNDED
         p.refunded_at = dj_timezone.now()
         p.refunded_by = getattr(actor, "email", "") or ""
-        p.save(update_fields=["status", "refunded_at", "refunded_by", "updated_at"])
+        p.save(update_fields=["status", "meta", "refunded_at", "refunded_by", "updated_at"])
+        if was_completed:
+            try:
+                from .report_rollups import record_refund
+                record_refund(p)
+            except Exception:
+                logger.exception("Failed to update sales rollups for refund")
         try:
             from .utils_audit import record_audit
             record_audit(
@@ -437,9 +437,11 @@ def payment_invoice(request, pid: str):
             c.drawString(72, y, "Payment Invoice")
             y -= 24
             c.setFont("Helvetica", 10)
+            order_number = _serialize_db(p)["orderNumber"]
             fields = [
                 ("Invoice ID", str(p.id)),
                 ("Order ID", p.order_id),
+                ("Order Number", order_number),
                 ("Date", (p.created_at or dj_timezone.now()).strftime("%Y-%m-%d %H:%M:%S")),
                 ("Amount", f"₱{float(p.amount):.2f}"),
                 ("Method", p.method.title()),
@@ -6,13 +6,20 @@ Focuses on read-only aggregation using existing models. Keep responses simple an
 from __future__ import annotations
 
 from datetime import datetime, timedelta
+import json
 import logging
 from collections import defaultdict
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone as dj_tz
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, F, Q
 
+from .payment_lookup import order_numbers_for, payments_for_orders
+from .report_buckets import bucket_edges, fold, series
+from .report_cache import cached_report
+from .report_jobs import required_permission, serialize_job, submit as submit_report_job
+from .report_rollups import bucket_rows, customer_groups, customer_key, top_keys, totals_by_key, window_totals
 from .views_common import _actor_from_request, _has_permission
 
 
@@ -32,6 +39,10 @@ def _parse_range(val: str | None):
         # Convert back to UTC for database queries
         start = dj_tz.make_aware(start_of_day_local.replace(tzinfo=None), dj_tz.get_current_timezone())
         return start, now
+    if s == "ytd":
+        local_now = dj_tz.localtime(now)
+        year_start = local_now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        return dj_tz.make_aware(year_start.replace(tzinfo=None), dj_tz.get_current_timezone()), now
     if s == "7d":
         return now - timedelta(days=7), now
     if s == "30d":
@@ -44,6 +55,146 @@ def _parse_range(val: str | None):
         return now - timedelta(days=1), now
 
 
+def _dashboard_data(r: str) -> dict:
+    from .models import Order, SalesRollup
+
+    start, end = _parse_range(r)
+
+    # Calculate yesterday's date range for comparisons
+    yesterday_start = start - timedelta(days=1)
+    yesterday_end = yesterday_start.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+    # Get start of month for monthly sales (in Manila timezone)
+    now = dj_tz.now()
+    local_now = dj_tz.localtime(now)
+    month_start_local = local_now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_start = dj_tz.make_aware(month_start_local.replace(tzinfo=None), dj_tz.get_current_timezone())
+
+    last_month_start = (month_start - timedelta(days=1)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month_end = month_start - timedelta(seconds=1)
+
+    # Everything below reads the SalesRollup tables (see report_rollups):
+    # payments by method, completed orders by channel, category and menu item.
+    payment_totals = window_totals(SalesRollup.DIM_PAYMENT_METHOD, {
+        "daily": (start, end),
+        "yesterday": (yesterday_start, yesterday_end),
+        "monthly": (month_start, end),
+        "last_month": (last_month_start, last_month_end),
+    })
+    daily_sales = payment_totals["daily"]
+    daily_sales_yesterday = payment_totals["yesterday"]
+    monthly_sales = payment_totals["monthly"]
+    monthly_sales_last_month = payment_totals["last_month"]
+
+    # Calculate percentage change for daily sales
+    daily_sales_change = 0.0
+    if daily_sales_yesterday > 0:
+        daily_sales_change = ((daily_sales - daily_sales_yesterday) / daily_sales_yesterday) * 100
+
+    # Calculate percentage change for monthly sales
+    monthly_sales_change = 0.0
+    if monthly_sales_last_month > 0:
+        monthly_sales_change = ((monthly_sales - monthly_sales_last_month) / monthly_sales_last_month) * 100
+
+    # Completed order counts for today and yesterday
+    order_counts = window_totals(
+        SalesRollup.DIM_CHANNEL,
+        {"today": (start, end), "yesterday": (yesterday_start, yesterday_end)},
+        field="count",
+    )
+    order_count = order_counts["today"]
+    order_count_yesterday = order_counts["yesterday"]
+
+    # Calculate percentage change for order count
+    order_count_change = 0.0
+    if order_count_yesterday > 0:
+        order_count_change = ((order_count - order_count_yesterday) / order_count_yesterday) * 100
+
+    # Sales by time - hourly for a single day, daily for multi-day ranges, each
+    # against the preceding period, bucketed by Order.created_at (when the sale was
+    # placed). ISO timestamps let the frontend convert time zones.
+    if (end - start).total_seconds() / 3600 <= 24:
+        grain = SalesRollup.GRAIN_HOUR
+        edges = bucket_edges(start, "hour", 24)
+        comparison_edges = bucket_edges(yesterday_start, "hour", 24)
+    else:
+        grain = SalesRollup.GRAIN_DAY
+        num_days = int((end - start).total_seconds() / 86400) + 1
+        edges = bucket_edges(start, "day", num_days)
+        comparison_edges = bucket_edges(start - timedelta(days=num_days), "day", num_days)
+    # Both series come from one query over the combined span
+    time_rows = bucket_rows(
+        SalesRollup.DIM_CHANNEL,
+        grain,
+        min(edges[0], comparison_edges[0]),
+        max(edges[-1], comparison_edges[-1]),
+    )
+    sales_by_time = series(edges, fold(time_rows, edges))
+    sales_by_time_yesterday = series(comparison_edges, fold(time_rows, comparison_edges))
+
+    # Sales by category and popular items
+    sales_by_category = [
+        {"category": key, "amount": float(row["amount"])}
+        for key, row in totals_by_key(SalesRollup.DIM_CATEGORY, start, end).items()
+        if row["amount"] > 0
+    ]
+    sales_by_category_yesterday = [
+        {"category": key, "amount": float(row["amount"])}
+        for key, row in totals_by_key(SalesRollup.DIM_CATEGORY, yesterday_start, yesterday_end).items()
+        if row["amount"] > 0
+    ]
+    popular_items = [
+        {"name": name, "count": count}
+        for name, count in top_keys(SalesRollup.DIM_MENU_ITEM, start, end)
+    ]
+    popular_items_yesterday = [
+        {"name": name, "count": count}
+        for name, count in top_keys(SalesRollup.DIM_MENU_ITEM, yesterday_start, yesterday_end)
+    ]
+
+    # Recent sales (last 10 completed orders)
+    recent_orders = list(Order.objects.filter(
+        created_at__gte=start,
+        created_at__lte=end
+    ).exclude(
+        status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
+    ).order_by('-created_at')[:10])
+
+    recent_sales = []
+    payments = payments_for_orders(recent_orders)
+    for order in recent_orders:
+        payment = payments.get(str(order.id))
+        payment_method = payment.method if payment else order.payment_method or "cash"
+
+        recent_sales.append({
+            "id": order.order_number,
+            "total": float(order.total_amount),
+            "date": order.created_at.isoformat() if order.created_at else None,
+            "paymentMethod": payment_method
+        })
+
+    return {
+        "dailySales": float(daily_sales),
+        "dailySalesYesterday": float(daily_sales_yesterday),
+        "dailySalesChange": float(daily_sales_change),
+        "monthlySales": float(monthly_sales),
+        "monthlySalesLastMonth": float(monthly_sales_last_month),
+        "monthlySalesChange": float(monthly_sales_change),
+        "orderCount": order_count,
+        "orderCountYesterday": order_count_yesterday,
+        "orderCountChange": float(order_count_change),
+        "salesByTime": sales_by_time,
+        "salesByTimeYesterday": sales_by_time_yesterday,
+        "salesByCategory": sales_by_category,
+        "salesByCategoryYesterday": sales_by_category_yesterday,
+        "popularItems": popular_items,
+        "popularItemsYesterday": popular_items_yesterday,
+        "recentSales": recent_sales,
+        "dateRangeStart": start.isoformat(),
+        "dateRangeEnd": end.isoformat(),
+    }
+
+
 @require_http_methods(["GET"])  # /reports/dashboard
 def reports_dashboard(request):
     """Aggregate dashboard statistics: sales, orders, popular items, recent sales."""
@@ -54,297 +205,30 @@ def reports_dashboard(request):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
 
     try:
-        from .models import Order, OrderItem, PaymentTransaction, MenuItem
-
         r = request.GET.get("range", "today")
-        start, end = _parse_range(r)
-
-        # Calculate yesterday's date range for comparisons
-        yesterday_start = start - timedelta(days=1)
-        yesterday_end = yesterday_start.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-        # Get start of month for monthly sales (in Manila timezone)
-        now = dj_tz.now()
-        local_now = dj_tz.localtime(now)
-        month_start_local = local_now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_start = dj_tz.make_aware(month_start_local.replace(tzinfo=None), dj_tz.get_current_timezone())
-
-        # Daily sales (today)
-        daily_payments = PaymentTransaction.objects.filter(
-            created_at__gte=start,
-            created_at__lte=end,
-            status=PaymentTransaction.STATUS_COMPLETED
-        )
-        daily_sales = daily_payments.aggregate(total=Sum("amount"))["total"] or 0
-
-        # Yesterday's sales for comparison
-        daily_sales_yesterday = PaymentTransaction.objects.filter(
-            created_at__gte=yesterday_start,
-            created_at__lte=yesterday_end,
-            status=PaymentTransaction.STATUS_COMPLETED
-        ).aggregate(total=Sum("amount"))["total"] or 0
-
-        # Calculate percentage change for daily sales
-        daily_sales_change = 0.0
-        if daily_sales_yesterday > 0:
-            daily_sales_change = ((daily_sales - daily_sales_yesterday) / daily_sales_yesterday) * 100
-
-        # Monthly sales
-        monthly_payments = PaymentTransaction.objects.filter(
-            created_at__gte=month_start,
-            created_at__lte=end,
-            status=PaymentTransaction.STATUS_COMPLETED
-        )
-        monthly_sales = monthly_payments.aggregate(total=Sum("amount"))["total"] or 0
-
-        # Last month's sales for comparison
-        last_month_start = (month_start - timedelta(days=1)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        last_month_end = month_start - timedelta(seconds=1)
-        monthly_sales_last_month = PaymentTransaction.objects.filter(
-            created_at__gte=last_month_start,
-            created_at__lte=last_month_end,
-            status=PaymentTransaction.STATUS_COMPLETED
-        ).aggregate(total=Sum("amount"))["total"] or 0
-
-        # Calculate percentage change for monthly sales
-        monthly_sales_change = 0.0
-        if monthly_sales_last_month > 0:
-            monthly_sales_change = ((monthly_sales - monthly_sales_last_month) / monthly_sales_last_month) * 100
-
-        # Order count for today
-        orders_today = Order.objects.filter(
-            created_at__gte=start,
-            created_at__lte=end
-        ).exclude(status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED])
-        order_count = orders_today.count()
-
-        # Yesterday's order count for comparison
-        orders_yesterday = Order.objects.filter(
-            created_at__gte=yesterday_start,
-            created_at__lte=yesterday_end
-        ).exclude(status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED])
-        order_count_yesterday = orders_yesterday.count()
-
-        # Calculate percentage change for order count
-        order_count_change = 0.0
-        if order_count_yesterday > 0:
-            order_count_change = ((order_count - order_count_yesterday) / order_count_yesterday) * 100
-
-        # Sales by time - hourly for today, daily for multi-day ranges
-        # Use Order.created_at for accurate sale timing (when order was placed)
-        # Send ISO timestamps to frontend for timezone conversion
-        sales_by_time = []
-        sales_by_time_yesterday = []
-
-        # Determine if this is a single-day or multi-day range
-        time_diff = (end - start).total_seconds() / 3600  # hours
-
-        if time_diff <= 24:  # Single day - use hourly breakdown
-            for hour in range(0, 24):  # Every 1 hour
-                # Create timezone-aware boundaries for accurate comparison
-                hour_start = start.replace(hour=hour, minute=0, second=0, microsecond=0)
-                hour_end = hour_start + timedelta(hours=1)
-
-                # Aggregate by Order.total_amount for actual sale values
-                # Filter out cancelled/voided orders for accurate reporting
-                hour_total = Order.objects.filter(
-                    created_at__gte=hour_start,
-                    created_at__lt=hour_end
-                ).exclude(
-                    status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-                ).aggregate(total=Sum("total_amount"))["total"] or 0
-
-                # Send ISO timestamp for frontend timezone conversion
-                sales_by_time.append({
-                    "time": hour_start.isoformat(),  # ISO format with timezone info
-                    "amount": float(hour_total)
-                })
-
-            # Yesterday's sales for comparison (same hourly breakdown)
-            for hour in range(0, 24):  # Every 1 hour
-                hour_start = yesterday_start.replace(hour=hour, minute=0, second=0, microsecond=0)
-                hour_end = hour_start + timedelta(hours=1)
-
-                hour_total = Order.objects.filter(
-                    created_at__gte=hour_start,
-                    created_at__lt=hour_end
-                ).exclude(
-                    status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-                ).aggregate(total=Sum("total_amount"))["total"] or 0
-
-                sales_by_time_yesterday.append({
-                    "time": hour_start.isoformat(),
-                    "amount": float(hour_total)
-                })
-        else:  # Multi-day range - use daily breakdown
-            # Calculate number of days in range
-            num_days = int((end - start).total_seconds() / 86400) + 1
-
-            # Get daily sales for the selected range
-            for day_offset in range(num_days):
-                day_start = start + timedelta(days=day_offset)
-                # Ensure we're working with start of day in local timezone
-                local_day_start = dj_tz.localtime(day_start)
-                day_start_normalized = local_day_start.replace(hour=0, minute=0, second=0, microsecond=0)
-                day_start_aware = dj_tz.make_aware(day_start_normalized.replace(tzinfo=None), dj_tz.get_current_timezone())
-                day_end = day_start_aware + timedelta(days=1)
-
-                day_total = Order.objects.filter(
-                    created_at__gte=day_start_aware,
-                    created_at__lt=day_end
-                ).exclude(
-                    status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-                ).aggregate(total=Sum("total_amount"))["total"] or 0
-
-                sales_by_time.append({
-                    "time": day_start_aware.isoformat(),
-                    "amount": float(day_total)
-                })
-
-            # For comparison, get the previous period (same number of days before)
-            comparison_start = start - timedelta(days=num_days)
-            for day_offset in range(num_days):
-                day_start = comparison_start + timedelta(days=day_offset)
-                local_day_start = dj_tz.localtime(day_start)
-                day_start_normalized = local_day_start.replace(hour=0, minute=0, second=0, microsecond=0)
-                day_start_aware = dj_tz.make_aware(day_start_normalized.replace(tzinfo=None), dj_tz.get_current_timezone())
-                day_end = day_start_aware + timedelta(days=1)
-
-                day_total = Order.objects.filter(
-                    created_at__gte=day_start_aware,
-                    created_at__lt=day_end
-                ).exclude(
-                    status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-                ).aggregate(total=Sum("total_amount"))["total"] or 0
-
-                sales_by_time_yesterday.append({
-                    "time": day_start_aware.isoformat(),
-                    "amount": float(day_total)
-                })
-
-        # Sales by category (from menu items in orders)
-        # Include all valid order statuses except cancelled/voided
-        category_sales = defaultdict(float)
-        order_items = OrderItem.objects.filter(
-            order__created_at__gte=start,
-            order__created_at__lte=end
-        ).exclude(
-            order__status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-        ).select_related('menu_item')
-
-        for item in order_items:
-            # Only count items with non-empty categories
-            category = getattr(item, 'category', None)
-            if category and category.strip():
-                category_sales[category] += float(item.price * item.quantity)
-
-        # Convert to list format, filter out any zero amounts
-        sales_by_category = [
-            {"category": cat, "amount": amount}
-            for cat, amount in category_sales.items()
-            if amount > 0
-        ]
-
-        # Yesterday's sales by category for comparison
-        category_sales_yesterday = defaultdict(float)
-        order_items_yesterday = OrderItem.objects.filter(
-            order__created_at__gte=yesterday_start,
-            order__created_at__lte=yesterday_end
-        ).exclude(
-            order__status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-        ).select_related('menu_item')
-
-        for item in order_items_yesterday:
-            category = getattr(item, 'category', None)
-            if category and category.strip():
-                category_sales_yesterday[category] += float(item.price * item.quantity)
-
-        sales_by_category_yesterday = [
-            {"category": cat, "amount": amount}
-            for cat, amount in category_sales_yesterday.items()
-            if amount > 0
-        ]
-
-        # Popular items (most ordered today)
-        # Include all valid orders except cancelled/voided
-        popular_items_data = OrderItem.objects.filter(
-            order__created_at__gte=start,
-            order__created_at__lte=end
-        ).exclude(
-            order__status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-        ).values('item_name').annotate(
-            count=Sum('quantity')
-        ).order_by('-count')[:5]
-
-        popular_items = [
-            {"name": item["item_name"], "count": item["count"]}
-            for item in popular_items_data
-        ]
-
-        # Yesterday's popular items for comparison
-        popular_items_yesterday_data = OrderItem.objects.filter(
-            order__created_at__gte=yesterday_start,
-            order__created_at__lte=yesterday_end
-        ).exclude(
-            order__status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-        ).values('item_name').annotate(
-            count=Sum('quantity')
-        ).order_by('-count')[:5]
-
-        popular_items_yesterday = [
-            {"name": item["item_name"], "count": item["count"]}
-            for item in popular_items_yesterday_data
-        ]
-
-        # Recent sales (last 10 completed orders)
-        recent_orders = Order.objects.filter(
-            created_at__gte=start,
-            created_at__lte=end
-        ).exclude(
-            status__in=[Order.STATUS_CANCELLED, Order.STATUS_VOIDED]
-        ).order_by('-created_at')[:10]
-
-        recent_sales = []
-        for order in recent_orders:
-            # Get payment method from associated payment
-            payment = PaymentTransaction.objects.filter(order_id=order.order_number).first()
-            payment_method = payment.method if payment else order.payment_method or "cash"
-
-            recent_sales.append({
-                "id": order.order_number,
-                "total": float(order.total_amount),
-                "date": order.created_at.isoformat() if order.created_at else None,
-                "paymentMethod": payment_method
-            })
-
-        return JsonResponse({
-            "success": True,
-            "data": {
-                "dailySales": float(daily_sales),
-                "dailySalesYesterday": float(daily_sales_yesterday),
-                "dailySalesChange": float(daily_sales_change),
-                "monthlySales": float(monthly_sales),
-                "monthlySalesLastMonth": float(monthly_sales_last_month),
-                "monthlySalesChange": float(monthly_sales_change),
-                "orderCount": order_count,
-                "orderCountYesterday": order_count_yesterday,
-                "orderCountChange": float(order_count_change),
-                "salesByTime": sales_by_time,
-                "salesByTimeYesterday": sales_by_time_yesterday,
-                "salesByCategory": sales_by_category,
-                "salesByCategoryYesterday": sales_by_category_yesterday,
-                "popularItems": popular_items,
-                "popularItemsYesterday": popular_items_yesterday,
-                "recentSales": recent_sales,
-                "dateRangeStart": start.isoformat(),
-                "dateRangeEnd": end.isoformat(),
-            }
-        })
+        data = cached_report("dashboard", {"range": r}, lambda: _dashboard_data(r))
+        return JsonResponse({"success": True, "data": data})
     except Exception as e:
         logger.exception("Failed to generate dashboard stats")
         return JsonResponse({"success": False, "message": f"Unable to generate dashboard stats: {str(e)}"}, status=500)
 
 
+def _sales_data(r: str | None) -> dict:
+    from .models import SalesRollup
+
+    start, end = _parse_range(r)
+    # Recorded payments, refunded ones included, from the rollups
+    by_method = defaultdict(float)
+    for dimension in (SalesRollup.DIM_PAYMENT_METHOD, SalesRollup.DIM_REFUND_METHOD):
+        for method, row in totals_by_key(dimension, start, end).items():
+            by_method[method] += float(row["amount"])
+    return {
+        "total": sum(by_method.values()),
+        "byMethod": dict(by_method),
+        "range": {"from": start.isoformat(), "to": end.isoformat()},
+    }
+
+
 @require_http_methods(["GET"])  # /reports/sales
 def reports_sales(request):
     actor, err = _actor_from_request(request)
@@ -353,23 +237,9 @@ def reports_sales(request):
     if not _has_permission(actor, "reports.sales.view"):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     try:
-        from django.db.models import Sum
-        from .models import PaymentTransaction
         r = request.GET.get("range")
-        start, end = _parse_range(r)
-        qs = PaymentTransaction.objects.filter(created_at__gte=start, created_at__lte=end)
-        total = qs.aggregate(total=Sum("amount")).get("total") or 0
-        by_method = (
-            qs.values("method").annotate(total=Sum("amount")).order_by()
-        )
-        return JsonResponse({
-            "success": True,
-            "data": {
-                "total": float(total or 0),
-                "byMethod": {row["method"]: float(row["total"] or 0) for row in by_method},
-                "range": {"from": start.isoformat(), "to": end.isoformat()},
-            },
-        })
+        data = cached_report("sales", {"range": r}, lambda: _sales_data(r))
+        return JsonResponse({"success": True, "data": data})
     except Exception:
         logger.exception("Failed to generate sales report")
         return JsonResponse({"success": False, "message": "Unable to generate sales report"}, status=500)
@@ -436,8 +306,88 @@ def reports_staff_attendance(request):
         return JsonResponse({"success": False, "message": "Unable to generate staff attendance report"}, status=500)
 
 
-@require_http_methods(["GET"])  # /reports/customer-history?customer=
+_HISTORY_SORTS = {
+    "total": ("-total_spent", "_key"),
+    "visits": ("-payment_count", "_key"),
+    "recent": ("-last_visit", "_key"),
+    "name": ("_key",),
+}
+
+
+def _history_window(params):
+    """``(start, end)`` from ``range``/``from``/``to``, or ``(None, None)`` for all time."""
+    if params.get("range"):
+        start, end = _parse_range(params.get("range"))
+        return (dj_tz.make_aware(start) if dj_tz.is_naive(start) else start,
+                dj_tz.make_aware(end) if dj_tz.is_naive(end) else end)
+    bounds = []
+    for name in ("from", "to"):
+        raw = str(params.get(name) or "").strip()
+        if not raw:
+            bounds.append(None)
+            continue
+        value = datetime.fromisoformat(raw)
+        if len(raw) == 10:
+            # Plain dates are local days; "to" includes the whole day
+            value = dj_tz.make_aware(value, dj_tz.get_current_timezone())
+            if name == "to":
+                value += timedelta(days=1)
+        elif dj_tz.is_naive(value):
+            value = dj_tz.make_aware(value)
+        bounds.append(value)
+    return bounds[0], bounds[1]
+
+
+def _page_args(request, default_limit: int, max_limit: int):
+    page = max(1, int(request.GET.get("page") or 1))
+    limit = min(max_limit, max(1, int(request.GET.get("limit") or default_limit)))
+    return page, limit
+
+
+def _pagination(page: int, limit: int, total: int) -> dict:
+    return {"page": page, "limit": limit, "total": total, "totalPages": max(1, (total + limit - 1) // limit)}
+
+
+def _customer_transactions(request, customer, start, end):
+    from .models import PaymentTransaction
+
+    page, limit = _page_args(request, 500, 500)
+    qs = PaymentTransaction.objects.all()
+    if customer:
+        qs = qs.filter(customer__icontains=customer)
+    if start:
+        qs = qs.filter(created_at__gte=start)
+    if end:
+        qs = qs.filter(created_at__lt=end)
+    total = qs.count()
+    rows = list(qs.order_by("-created_at", "-id")[(page - 1) * limit:page * limit])
+    order_numbers = order_numbers_for(p.order_id for p in rows)
+    data = [
+        {
+            "id": str(p.id),
+            "orderId": p.order_id,
+            "orderNumber": order_numbers.get(str(p.order_id)) or str(p.order_id or ""),
+            "amount": float(p.amount or 0),
+            "method": p.method,
+            "status": p.status,
+            "date": p.created_at.isoformat() if p.created_at else None,
+            "reference": p.reference or "",
+            "customer": p.customer or "",
+        }
+        for p in rows
+    ]
+    return JsonResponse({"success": True, "data": data, "pagination": _pagination(page, limit, total)})
+
+
+@require_http_methods(["GET"])  # /reports/customer-history?customer=&range=|from=&to=&sort=&page=&limit=&view=
 def reports_customer_history(request):
+    """Per-customer totals, visit counts and last visit, grouped in SQL and paginated.
+
+    ``view=transactions`` lists the individual payments instead. Without a
+    date filter, and with ``CUSTOMER_SUMMARY_TABLE`` enabled, totals come from
+    the precomputed ``CustomerSummary`` table (backfilled by its migration,
+    regenerated by ``rebuild_rollups --customers``).
+    """
     actor, err = _actor_from_request(request)
     if not actor:
         return err
@@ -445,31 +395,117 @@ def reports_customer_history(request):
         return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
     customer = (request.GET.get("customer") or "").strip()
     try:
-        from .models import PaymentTransaction
-        qs = PaymentTransaction.objects.all()
-        if customer:
-            qs = qs.filter(customer__icontains=customer)
-        qs = qs.order_by("-created_at")[:500]
+        start, end = _history_window(request.GET)
+        page, limit = _page_args(request, 50, 200)
+    except (TypeError, ValueError):
+        return JsonResponse({"success": False, "message": "Invalid date range or paging"}, status=400)
+    try:
+        if (request.GET.get("view") or "").strip().lower() == "transactions":
+            return _customer_transactions(request, customer, start, end)
+
+        from .models import CustomerSummary, PaymentTransaction
+        order_by = _HISTORY_SORTS.get((request.GET.get("sort") or "total").strip().lower(), _HISTORY_SORTS["total"])
+        use_table = start is None and end is None and getattr(settings, "CUSTOMER_SUMMARY_TABLE", True)
+        if use_table:
+            qs = CustomerSummary.objects.annotate(_key=F("key"))
+            if customer:
+                qs = qs.filter(key__contains=customer_key(customer))
+            qs = qs.values(
+                "_key", "name", "total_spent", "payment_count", "refunded_amount",
+                "refund_count", "first_visit", "last_visit",
+            )
+            source = "summary"
+        else:
+            qs = PaymentTransaction.objects.all()
+            if customer:
+                qs = qs.filter(customer__icontains=customer)
+            if start:
+                qs = qs.filter(created_at__gte=start)
+            if end:
+                qs = qs.filter(created_at__lt=end)
+            qs = customer_groups(qs)
+            source = "payments"
+        total = qs.count()
+        rows = qs.order_by(*order_by)[(page - 1) * limit:page * limit]
         data = [
             {
-                "id": str(p.id),
-                "orderId": p.order_id,
-                "orderNumber": str(p.order_id) if p.order_id else "",
-                "amount": float(p.amount or 0),
-                "method": p.method,
-                "status": p.status,
-                "date": p.created_at.isoformat() if p.created_at else None,
-                "reference": p.reference or "",
-                "customer": p.customer or "",
+                "customer": row["name"],
+                "totalSpent": float(row["total_spent"] or 0),
+                "payments": row["payment_count"],
+                "refunded": float(row["refunded_amount"] or 0),
+                "refunds": row["refund_count"],
+                "averageSpend": float(row["total_spent"] or 0) / row["payment_count"] if row["payment_count"] else 0.0,
+                "firstVisit": row["first_visit"].isoformat() if row["first_visit"] else None,
+                "lastVisit": row["last_visit"].isoformat() if row["last_visit"] else None,
             }
-            for p in qs
+            for row in rows
         ]
-        return JsonResponse({"success": True, "data": data})
+        return JsonResponse({
+            "success": True,
+            "data": data,
+            "pagination": _pagination(page, limit, total),
+            "range": {"from": start.isoformat() if start else None, "to": end.isoformat() if end else None},
+            "source": source,
+        })
     except Exception:
         logger.exception("Failed to generate customer history report")
         return JsonResponse({"success": False, "message": "Unable to generate customer history report"}, status=500)
 
 
+@require_http_methods(["POST"])  # /reports/jobs
+def report_job_submit(request):
+    """Queue a wide-range report: ``{"report": "sales", "range": "ytd"}`` or ``from``/``to`` dates."""
+    actor, err = _actor_from_request(request)
+    if not actor:
+        return err
+    try:
+        spec = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        spec = {}
+    if not isinstance(spec, dict):
+        spec = {}
+    kind = str(spec.get("report") or "").strip().lower()
+    permission = required_permission(kind)
+    if not permission:
+        return JsonResponse({"success": False, "message": f"Unknown report '{kind}'"}, status=400)
+    if not _has_permission(actor, permission):
+        return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
+    try:
+        start, end = _history_window(spec)
+    except (TypeError, ValueError):
+        return JsonResponse({"success": False, "message": "Invalid date range"}, status=400)
+    if start is None:
+        return JsonResponse({"success": False, "message": "A range or from date is required"}, status=400)
+    end = end or dj_tz.now()
+    if end <= start:
+        return JsonResponse({"success": False, "message": "Range end must be after its start"}, status=400)
+    try:
+        normalized = {name: spec[name] for name in ("range", "from", "to") if spec.get(name)}
+        job, created = submit_report_job(kind, normalized, start, end, actor)
+        return JsonResponse({"success": True, "data": serialize_job(job, include_result=True), "created": created}, status=202)
+    except Exception:
+        logger.exception("Failed to queue report job")
+        return JsonResponse({"success": False, "message": "Unable to queue report"}, status=500)
+
+
+@require_http_methods(["GET"])  # /reports/jobs/<uuid:job_id>
+def report_job_status(request, job_id):
+    actor, err = _actor_from_request(request)
+    if not actor:
+        return err
+    try:
+        from .models import ReportJob
+        job = ReportJob.objects.filter(id=job_id).first()
+        if job is None:
+            return JsonResponse({"success": False, "message": "Report job not found or expired"}, status=404)
+        if not _has_permission(actor, required_permission(job.kind) or "reports.dashboard.view"):
+            return JsonResponse({"success": False, "message": "Forbidden"}, status=403)
+        return JsonResponse({"success": True, "data": serialize_job(job, include_result=True)})
+    except Exception:
+        logger.exception("Failed to read report job")
+        return JsonResponse({"success": False, "message": "Unable to read report job"}, status=500)
+
+
 __all__ = [
     "reports_dashboard",
     "reports_sales",
@@ -477,5 +513,7 @@ __all__ = [
     "reports_orders",
     "reports_staff_attendance",
     "reports_customer_history",
+    "report_job_submit",
+    "report_job_status",
 ]
 
@@ -0,0 +1,191 @@
+"""Server-Sent Events fallback for clients that cannot keep a websocket open.
+
+GET /events/stream?token=<jwt>[&topics=station:grill,inventory]
+
+Each ASGI process runs one hub that listens on the channel-layer
+``broadcast`` group (every ``publish_event`` reaches it) and keeps a bounded
+ring buffer of recent events with monotonically increasing ids of the form
+``<process epoch>-<seq>``. A reconnecting client sends ``Last-Event-ID`` and
+receives only what it missed. When that is impossible (the id predates the
+buffer or came from another process) it receives ``stream.reset`` and should
+reload its state once.
+
+Requires an ASGI server; under WSGI the stream would never finish.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Optional
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+
+from .events import parse_topic, topic_groups_for_event
+from .views_common import _actor_from_token
+
+logger = logging.getLogger(__name__)
+
+# Re-join the broadcast group periodically; channel-layer memberships expire
+GROUP_REFRESH_SECONDS = 300
+
+
+class EventHub:
+    """Per-process ring buffer of published events."""
+
+    def __init__(self, size: Optional[int] = None):
+        size = size or int(getattr(settings, "SSE_BUFFER_SIZE", 1000))
+        self.epoch = uuid4().hex[:8]
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=max(1, size))
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def append(self, event_type: str, payload) -> int:
+        self.seq += 1
+        self.buffer.append((self.seq, event_type, payload))
+        # Wake every waiting stream, then re-arm for the next event
+        self.changed.set()
+        self.changed = asyncio.Event()
+        return self.seq
+
+    def format_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def resolve(self, last_event_id: Optional[str]) -> tuple[int, bool]:
+        """Cursor to resume from and whether the client must reset."""
+        if not last_event_id:
+            return self.seq, False
+        epoch, _, raw_seq = str(last_event_id).partition("-")
+        try:
+            seq = int(raw_seq)
+        except ValueError:
+            return self.seq, True
+        if epoch != self.epoch or seq > self.seq or not self.covers(seq):
+            return self.seq, True
+        return seq, False
+
+    def covers(self, cursor: int) -> bool:
+        """True when every event after ``cursor`` is still buffered."""
+        oldest = self.buffer[0][0] if self.buffer else self.seq + 1
+        return cursor >= oldest - 1
+
+    def after(self, cursor: int) -> list:
+        return [entry for entry in self.buffer if entry[0] > cursor]
+
+    async def pump(self):
+        layer = get_channel_layer()
+        if not layer:
+            return
+        channel = await layer.new_channel("sse.")
+        loop = asyncio.get_running_loop()
+        joined_at: Optional[float] = None
+        while True:
+            try:
+                # Refresh on schedule even while messages keep arriving
+                if joined_at is None or loop.time() - joined_at >= GROUP_REFRESH_SECONDS:
+                    await layer.group_add("broadcast", channel)
+                    joined_at = loop.time()
+                remaining = max(0.0, GROUP_REFRESH_SECONDS - (loop.time() - joined_at))
+                try:
+                    msg = await asyncio.wait_for(layer.receive(channel), timeout=remaining)
+                except asyncio.TimeoutError:
+                    continue
+                if msg.get("type") == "event.message":
+                    self.append(msg.get("event"), msg.get("payload"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("SSE hub receive failed; retrying")
+                joined_at = None
+                await asyncio.sleep(1)
+
+
+_hub: Optional[EventHub] = None
+
+
+def get_hub() -> EventHub:
+    """Hub bound to the running event loop, started on first use."""
+    global _hub
+    loop = asyncio.get_running_loop()
+    if _hub is None or _hub.task is None or _hub.task.done() or _hub.task.get_loop() is not loop:
+        _hub = EventHub()
+        _hub.task = loop.create_task(_hub.pump())
+    return _hub
+
+
+def _frame(event_id: Optional[str], event_type: str, payload) -> str:
+    data = json.dumps({"type": "event", "event": event_type, "payload": payload}, cls=DjangoJSONEncoder)
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event_type}\ndata: {data}\n\n"
+
+
+def _matches(topics: set, event_type: str, payload) -> bool:
+    return not topics or bool(topics & topic_groups_for_event(event_type, payload))
+
+
+async def stream_events(hub: EventHub, last_event_id: Optional[str], topics: set, keepalive: float):
+    yield "retry: 3000\n\n"
+    cursor, reset = hub.resolve(last_event_id)
+    while True:
+        # A slow reader can fall off the ring; tell it to reload instead of skipping silently
+        if not reset and not hub.covers(cursor):
+            cursor, reset = hub.seq, True
+        if reset:
+            yield _frame(hub.format_id(cursor), "stream.reset", {"reason": "history_unavailable"})
+            reset = False
+        entries = hub.after(cursor)
+        if entries:
+            for seq, event_type, payload in entries:
+                cursor = seq
+                if _matches(topics, event_type, payload):
+                    yield _frame(hub.format_id(seq), event_type, payload)
+            continue
+        changed = hub.changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=keepalive)
+        except asyncio.TimeoutError:
+            yield ": keepalive\n\n"
+
+
+def _extract_token(request) -> str:
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if auth.startswith("Bearer "):
+        return auth.split(" ", 1)[1].strip()
+    # EventSource cannot set headers; accept query string or cookie
+    return (request.GET.get("token") or request.COOKIES.get("authToken") or "").strip()
+
+
+async def event_stream(request):  # /events/stream
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    token = _extract_token(request)
+    actor = await sync_to_async(_actor_from_token, thread_sensitive=False)(token) if token else None
+    if not actor:
+        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
+
+    topics = set()
+    for spec in (request.GET.get("topics") or "").split(","):
+        group = parse_topic(spec) if spec.strip() else None
+        if group:
+            topics.add(group)
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("lastEventId")
+    keepalive = float(getattr(settings, "SSE_KEEPALIVE_SECONDS", 15))
+
+    resp = StreamingHttpResponse(
+        stream_events(get_hub(), last_event_id, topics, keepalive),
+        content_type="text/event-stream",
+    )
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+__all__ = ["event_stream", "EventHub", "get_hub", "stream_events"]
@@ -38,10 +38,26 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.process_notification_outbox',
         'schedule': crontab(minute='*/2'),  # Every 2 minutes
     },
+    'process-email-outbox': {
+        'task': 'api.tasks.process_email_outbox',
+        'schedule': 60.0,  # Every minute
+    },
     'auto-advance-orders': {
         'task': 'api.tasks.auto_advance_orders',
         'schedule': 10.0,  # Every 10 seconds
     },
+    'sweep-expired-credentials': {
+        'task': 'api.tasks.sweep_expired_credentials',
+        'schedule': crontab(minute=15),  # Hourly
+    },
+    'purge-report-jobs': {
+        'task': 'api.tasks.purge_report_jobs',
+        'schedule': crontab(minute=45),  # Hourly
+    },
+    'build-ledger-checkpoint': {
+        'task': 'api.tasks.build_ledger_checkpoint',
+        'schedule': crontab(hour=0, minute=20),  # Daily after local midnight
+    },
     'cleanup-old-notifications': {
         'task': 'api.tasks.cleanup_old_notifications',
         'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
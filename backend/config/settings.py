@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from .settings_components import get_database, get_cors, get_jwt, get_email, get_channel_layers
+from .settings_components import get_database, get_cors, get_jwt, get_email, get_channel_layers, get_caches
 try:
     from dotenv import load_dotenv  # type: ignore
 except Exception:
@@ -100,6 +100,7 @@ DATABASES = get_database(BASE_DIR)
 
 ASGI_APPLICATION = "config.asgi.application"
 CHANNEL_LAYERS = get_channel_layers()
+CACHES = get_caches()
 
 # Static files (optional for API-only)
 STATIC_URL = "/static/"
@@ -209,6 +210,10 @@ EMAIL_USE_TLS = _email["EMAIL_USE_TLS"]
 EMAIL_USE_SSL = _email["EMAIL_USE_SSL"]
 ADMINS = _email["ADMINS"]
 EMAIL_SUBJECT_PREFIX = _email["EMAIL_SUBJECT_PREFIX"]
+EMAIL_DISPATCH_MODE = _email["EMAIL_DISPATCH_MODE"]
+EMAIL_DISPATCH_WORKERS = _email["EMAIL_DISPATCH_WORKERS"]
+EMAIL_DISPATCH_MAX_ATTEMPTS = _email["EMAIL_DISPATCH_MAX_ATTEMPTS"]
+EMAIL_DISPATCH_RETRY_BASE_SECONDS = _email["EMAIL_DISPATCH_RETRY_BASE_SECONDS"]
 
 # Frontend base URL for building links in emails (password reset, verification)
 FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL", "http://localhost:8080")
@@ -9,6 +9,13 @@ def _env_bool(key: str, default: bool = False) -> bool:
     return val in {"1", "true", "True", "yes", "on"}
 
 
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)))
+    except Exception:
+        return default
+
+
 def get_database(BASE_DIR: Path):
     """Return the MySQL database configuration used across all environments."""
     DB_NAME = os.getenv("DJANGO_DB_NAME", "technomart")
@@ -141,6 +148,11 @@ def get_email():
         "EMAIL_USE_SSL": _env_bool("DJANGO_EMAIL_USE_SSL", False),
         "ADMINS": _parse_admins(os.getenv("DJANGO_ADMINS", "")),
         "EMAIL_SUBJECT_PREFIX": os.getenv("DJANGO_EMAIL_SUBJECT_PREFIX", "[Canteen]"),
+        # Transactional email dispatch: "celery" (thread-pool fallback without a broker), "thread" or "sync"
+        "EMAIL_DISPATCH_MODE": (os.getenv("DJANGO_EMAIL_DISPATCH", "celery") or "celery").strip().lower(),
+        "EMAIL_DISPATCH_WORKERS": _env_int("DJANGO_EMAIL_DISPATCH_WORKERS", 2),
+        "EMAIL_DISPATCH_MAX_ATTEMPTS": _env_int("DJANGO_EMAIL_DISPATCH_MAX_ATTEMPTS", 5),
+        "EMAIL_DISPATCH_RETRY_BASE_SECONDS": _env_int("DJANGO_EMAIL_DISPATCH_RETRY_BASE_SECONDS", 30),
     }
     return cfg
 
@@ -154,3 +166,27 @@ def get_channel_layers():
             },
         }
     }
+
+
+def get_caches():
+    """Shared Redis cache when a URL is configured, per-process memory otherwise.
+
+    Report caching relies on every worker seeing the same entries and locks;
+    LocMemCache only suits single-process development.
+    """
+    cache_url = os.getenv("DJANGO_CACHE_URL") or os.getenv("REDIS_URL")
+    if cache_url:
+        return {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": cache_url,
+                "KEY_PREFIX": os.getenv("DJANGO_CACHE_KEY_PREFIX", "technomart"),
+                "TIMEOUT": _env_int("DJANGO_CACHE_TIMEOUT", 300),
+            }
+        }
+    return {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "technomart-default",
+        }
+    }
@@ -33,15 +33,39 @@ class AnalyticsService {
   }
 
   /**
-   * Get customer purchase history
+   * Get customer purchase history: per-customer totals, or individual
+   * payments with view=transactions
    * @param {Object} params - Filter parameters
    * @param {string} params.customer - Customer name filter
+   * @param {string} params.view - 'transactions' to list payments
+   * @param {string} params.from - First date (YYYY-MM-DD)
+   * @param {string} params.to - Last date, inclusive (YYYY-MM-DD)
+   * @param {string} params.sort - total | visits | recent | name
+   * @param {number} params.page - Page number
+   * @param {number} params.limit - Page size
    */
   async getCustomerHistory(params = {}) {
     const queryParams = new URLSearchParams(params).toString();
     return apiClient.get(`/reports/customer-history?${queryParams}`);
   }
 
+  /**
+   * Queue a wide-range report to be computed in the background. Poll
+   * getReportJob or listen for the report.job_finished websocket event.
+   * @param {Object} spec - { report: 'sales' | 'categories' | 'items' | 'channels', range?, from?, to? }
+   */
+  async submitReportJob(spec) {
+    return apiClient.post('/reports/jobs', spec);
+  }
+
+  /**
+   * Get a report job's status, with its result once done
+   * @param {string} jobId - Job id returned by submitReportJob
+   */
+  async getReportJob(jobId) {
+    return apiClient.get(`/reports/jobs/${jobId}`);
+  }
+
   /**
    * Get comprehensive dashboard stats (convenience method)
    * @param {string} range - Time range
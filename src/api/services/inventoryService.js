@@ -158,6 +158,23 @@ class InventoryService {
     return { success: true, data: lowStockItems };
   }
 
+  // Bulk receipts/adjustments: lines of { itemId | itemName, qty, type, lotCode, expiryDate, unitCost, reason }
+  async importStock(lines, options = {}) {
+    if (!USE_MOCKS) {
+      const res = await apiClient.post('/inventory/import', {
+        lines,
+        location: options.location,
+        supplier: options.supplier,
+        goodsReceiptId: options.goodsReceiptId,
+        idempotencyKey: options.idempotencyKey,
+      });
+      const data = res?.data || res;
+      return { success: true, data: data?.data || data };
+    }
+    await mockDelay(600);
+    return { success: true, data: { lines: (lines || []).length } };
+  }
+
   async getInventoryActivities(params = {}) {
     if (!USE_MOCKS) {
       const qs = new URLSearchParams();
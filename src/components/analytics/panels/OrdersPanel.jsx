@@ -110,7 +110,7 @@ export default function OrdersPanel() {
     customerData,
     loading: customerLoading,
     error: customerError,
-  } = useCustomerHistory();
+  } = useCustomerHistory({ view: 'transactions' });
 
   const loading = salesLoading || customerLoading;
   const error = salesError || customerError;
@@ -264,10 +264,17 @@ export const useOrderQueue = (params = {}) => {
     if (enableRealtime) {
       rtRef.current = createRealtime({
         path: '/orders',
+        // Order events arrive as small patches; realtime.js rebuilds payload.order
+        orderPatches: true,
         onMessage: (msg) => {
-          // Expecting { type, data }
           const t = msg?.type || '';
-          if (t === 'order_queue_update') {
+          if (t === 'event' && String(msg.event || '').startsWith('order.')) {
+            const o = msg.payload?.order;
+            if (!o?.id) return;
+            setOrderQueue((prev) =>
+              prev.map((x) => (x.id === o.id ? { ...x, ...o } : x))
+            );
+          } else if (t === 'order_queue_update') {
             if (Array.isArray(msg.data)) setOrderQueue(msg.data);
           } else if (t === 'order_update') {
             const o = msg.data;
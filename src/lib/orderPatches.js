@@ -0,0 +1,65 @@
+// Client side of compact order events (socket opened with ?patches=1 or
+// { action: 'options', orderPatches: true }). createRealtime({ orderPatches: true })
+// runs every event through a tracker, so callers normally need nothing from here.
+// Direct usage:
+//   const tracker = createOrderPatchTracker({ requestSnapshot: (id) => rt.send({ action: 'snapshot', orderId: id }) });
+//   onMessage: (msg) => { const order = tracker.handle(msg); if (order) upsert(order); }
+
+const unescape = (part) => part.replace(/~1/g, '/').replace(/~0/g, '~');
+
+export function applyPatch(doc, ops = []) {
+  let root = doc;
+  for (const op of ops) {
+    const parts = op.path.split('/').slice(1).map(unescape);
+    if (parts.length === 0) {
+      root = op.value;
+      continue;
+    }
+    let target = root;
+    for (const part of parts.slice(0, -1)) target = target[part];
+    const last = parts[parts.length - 1];
+    if (op.op === 'remove') {
+      if (Array.isArray(target)) target.splice(Number(last), 1);
+      else delete target[last];
+    } else {
+      target[last] = op.value;
+    }
+  }
+  return root;
+}
+
+export function createOrderPatchTracker({ requestSnapshot } = {}) {
+  const orders = new Map(); // id -> { version, order }
+
+  const accept = (id, version, order) => {
+    orders.set(id, { version, order });
+    return order;
+  };
+
+  return {
+    // Returns the updated order, or null while waiting for a snapshot.
+    handle(msg) {
+      const payload = msg?.payload || {};
+      if (msg?.event === 'order.snapshot' && payload.order) {
+        return accept(String(payload.order.id), payload.version, payload.order);
+      }
+      const patch = payload.orderPatch;
+      if (!patch) return payload.order || null;
+      if (patch.snapshot) return accept(patch.id, patch.version, patch.snapshot);
+      const current = orders.get(patch.id);
+      if (!current || current.version !== patch.baseVersion) {
+        // Missed an event (or never saw this order): resync from the server
+        if (!current || current.version < patch.version) requestSnapshot?.(patch.id);
+        return null;
+      }
+      const next = applyPatch(structuredClone(current.order), patch.ops);
+      return accept(patch.id, patch.version, next);
+    },
+    get(id) {
+      return orders.get(String(id))?.order || null;
+    },
+    forget(id) {
+      orders.delete(String(id));
+    },
+  };
+}
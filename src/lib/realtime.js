@@ -1,7 +1,13 @@
 // Lightweight WebSocket helper with auto-reconnect and fallback hooks
 // Usage: const rt = createRealtime({ path: '/orders', onMessage }); rt.close()
+// Optional topics (e.g. ['station:grill', 'order:<id>', 'event:order.created', 'inventory'])
+// narrow the stream; they are re-sent after every reconnect.
+// orderPatches: true asks the server for compact order patches; they are applied
+// here, so onMessage still sees payload.order (and 'order.snapshot' after a resync).
 
-export function createRealtime({ path = '/', onMessage, onStatusChange } = {}) {
+import { createOrderPatchTracker } from './orderPatches';
+
+export function createRealtime({ path = '/', topics = [], orderPatches = false, onMessage, onStatusChange } = {}) {
   const base = (typeof import.meta !== 'undefined' && import.meta.env && import.meta.env.VITE_WS_URL) || '';
   if (!base) {
     onStatusChange?.('disabled');
@@ -11,6 +17,32 @@ export function createRealtime({ path = '/', onMessage, onStatusChange } = {}) {
   let ws = null;
   let active = true;
   let reconnectAttempts = 0;
+  let subscribed = Array.isArray(topics) ? [...topics] : [];
+  // Missed versions are recovered by asking the server for the full order
+  const tracker = orderPatches
+    ? createOrderPatchTracker({ requestSnapshot: (orderId) => send({ action: 'snapshot', orderId }) })
+    : null;
+
+  const send = (payload) => {
+    try {
+      if (ws && ws.readyState === WebSocket.OPEN) {
+        const data = typeof payload === 'string' ? payload : JSON.stringify(payload);
+        ws.send(data);
+      }
+    } catch {}
+  };
+
+  const deliver = (event) => {
+    if (!tracker || !(event?.payload?.orderPatch || event?.event === 'order.snapshot')) {
+      onMessage?.(event);
+      return;
+    }
+    const order = tracker.handle(event);
+    if (!order) return; // waiting for a snapshot
+    const payload = { ...event.payload, order };
+    delete payload.orderPatch;
+    onMessage?.({ ...event, payload });
+  };
 
   const buildUrl = () => {
     const token = (() => {
@@ -19,7 +51,10 @@ export function createRealtime({ path = '/', onMessage, onStatusChange } = {}) {
     const trimmed = base.endsWith('/') ? base.slice(0, -1) : base;
     const p = path.startsWith('/') ? path : `/${path}`;
     const url = `${trimmed}${p}`;
-    const qs = token ? (url.includes('?') ? `&token=${encodeURIComponent(token)}` : `?token=${encodeURIComponent(token)}`) : '';
+    const params = [];
+    if (token) params.push(`token=${encodeURIComponent(token)}`);
+    if (orderPatches) params.push('patches=1');
+    const qs = params.length ? `${url.includes('?') ? '&' : '?'}${params.join('&')}` : '';
     return `${url}${qs}`;
   };
 
@@ -36,12 +71,20 @@ export function createRealtime({ path = '/', onMessage, onStatusChange } = {}) {
 
     ws.onopen = () => {
       reconnectAttempts = 0;
+      if (subscribed.length) {
+        try { ws.send(JSON.stringify({ action: 'subscribe', topics: subscribed })); } catch {}
+      }
       onStatusChange?.('open');
     };
     ws.onmessage = (evt) => {
       try {
         const data = JSON.parse(evt.data);
-        onMessage?.(data);
+        // The server groups events that arrive within one tick into a batch frame
+        if (data?.type === 'event.batch' && Array.isArray(data.events)) {
+          data.events.forEach(deliver);
+          return;
+        }
+        deliver(data);
       } catch {
         onMessage?.(evt.data);
       }
@@ -71,14 +114,17 @@ export function createRealtime({ path = '/', onMessage, onStatusChange } = {}) {
       try { ws && ws.close(); } catch {}
     },
     isActive: () => active,
-    send(payload) {
-      try {
-        if (ws && ws.readyState === WebSocket.OPEN) {
-          const data = typeof payload === 'string' ? payload : JSON.stringify(payload);
-          ws.send(data);
-        }
-      } catch {}
+    subscribe(next = []) {
+      const added = next.filter((t) => !subscribed.includes(t));
+      subscribed = [...subscribed, ...added];
+      if (added.length) this.send({ action: 'subscribe', topics: added });
+    },
+    unsubscribe(list = subscribed) {
+      const drop = [...list];
+      subscribed = subscribed.filter((t) => !drop.includes(t));
+      this.send({ action: 'unsubscribe', topics: drop });
     },
+    send,
   };
 }
 